@@ -0,0 +1,5 @@
+from flask_app import create_app
+from flask_app.asgi import init_asgi
+
+# Serve with uvicorn (pinned in requirements.txt): uvicorn asgi:app --host 0.0.0.0 --port 5000
+app = init_asgi(create_app())
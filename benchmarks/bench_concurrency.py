@@ -0,0 +1,205 @@
+"""
+Throughput of gunicorn worker profiles under mixed slow-client traffic.
+
+Starts the application under gunicorn twice, with the former Dockerfile
+command (``-w 4``, sync workers, PDF work in the request) and with
+gunicorn.conf.py (gthread workers, PDF work in a process pool), and drives
+each with the same mix for a fixed time:
+
+- slow clients upload a merge a few KiB at a time, like mobile clients
+- fast clients post small merges back to back
+
+and reports completed requests and latency per client kind. Sync workers
+are held by slow uploads for their whole duration, so fast clients queue
+behind them; threaded workers keep serving.
+
+Run: python -m benchmarks.bench_concurrency [--seconds N] [--slow N] [--fast N] [--workers N]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+from benchmarks.bench_merge_memory import make_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = "bench-concurrency"
+CAPTCHA = "12345"
+PROFILES = ("sync", "gthread")
+
+
+def session_cookie():
+    """Signed session holding the join CAPTCHA answer."""
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    return SecureCookieSessionInterface().get_signing_serializer(app).dumps({"join_captcha_text": CAPTCHA})
+
+
+def join_body(documents):
+    """Multipart body of a join request with the given PDF documents."""
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    body.write(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="captcha_answer"\r\n\r\n{CAPTCHA}\r\n'.encode()
+    )
+    for index, data in enumerate(documents):
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="pdf_files"; filename="{index}.pdf"\r\n'
+            f"Content-Type: application/pdf\r\n\r\n".encode()
+        )
+        body.write(data + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}", body.getvalue()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(profile, port, workers, directory):
+    """Start gunicorn with a profile and wait until it answers."""
+    env = dict(
+        os.environ, APP_SECRET_KEY=SECRET_KEY, UPLOAD_FOLDER=os.path.join(directory, "uploads"),
+        PORT=str(port), GUNICORN_WORKERS=str(workers), PYTHONPATH=ROOT,
+        # Every request repeats the same merge; make each one do the PDF work
+        RESULT_CACHE_SIZE="0", READER_CACHE_SIZE="0",
+    )
+    app = 'flask_app:create_app("testing")'
+    if profile == "sync":
+        # An empty config file keeps gunicorn.conf.py out of the baseline
+        empty = os.path.join(directory, "sync.conf.py")
+        open(empty, "w").close()
+        env["PDF_POOL_WORKERS"] = "0"
+        command = ["-c", empty, "-w", str(workers), "-b", f"127.0.0.1:{port}", app]
+    else:
+        env.pop("PDF_POOL_WORKERS", None)
+        command = ["-c", os.path.join(ROOT, "gunicorn.conf.py"), "-b", f"127.0.0.1:{port}", app]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", *command], cwd=directory, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as connection:
+                connection.sendall(b"GET / HTTP/1.0\r\nHost: bench\r\n\r\n")
+                if connection.recv(64).split(b" ", 2)[1:2] == [b"200"]:
+                    return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"gunicorn ({profile}) did not start")
+
+
+def post(port, content_type, body, cookie, chunk=None, delay=0.0):
+    """POST /join, optionally in chunks with a delay between them; returns the status."""
+    head = (
+        f"POST /join HTTP/1.1\r\nHost: bench\r\nConnection: close\r\nCookie: session={cookie}\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+    ).encode()
+    with socket.create_connection(("127.0.0.1", port), timeout=120) as connection:
+        connection.sendall(head)
+        chunk = chunk or len(body)
+        for start in range(0, len(body), chunk):
+            connection.sendall(body[start:start + chunk])
+            if delay:
+                time.sleep(delay)
+        response = b""
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            response += data
+    return int(response.split(b" ", 2)[1])
+
+
+def client(kind, port, request, stop, results):
+    """Send requests until stop is set, recording (kind, seconds, status)."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status = request(port)
+        except OSError:
+            status = 0
+        results.append((kind, time.perf_counter() - start, status))
+
+
+def run_profile(profile, args, directory, cookie):
+    fast_type, fast_body = join_body([make_pdf(args.pages, 16) for _ in range(2)])
+    slow_type, slow_body = join_body([make_pdf(2, 64) for _ in range(2)])
+    port = free_port()
+    server = start_server(profile, port, args.workers, directory)
+    stop = threading.Event()
+    results = []
+    threads = [
+        threading.Thread(target=client, args=("slow", port, lambda port: post(
+            port, slow_type, slow_body, cookie, chunk=args.slow_chunk * 1024, delay=args.slow_delay,
+        ), stop, results))
+        for _ in range(args.slow)
+    ] + [
+        threading.Thread(target=client, args=("fast", port, lambda port: post(
+            port, fast_type, fast_body, cookie,
+        ), stop, results))
+        for _ in range(args.fast)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    rows = []
+    for kind in ("fast", "slow"):
+        times = sorted(seconds for done_kind, seconds, status in results if done_kind == kind and status == 200)
+        failed = sum(1 for done_kind, _, status in results if done_kind == kind and status != 200)
+        p95 = times[int(len(times) * 0.95) - 1] if times else 0.0
+        rows.append((
+            kind, len(times), len(times) / args.seconds,
+            statistics.median(times) if times else 0.0, p95, failed,
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=20, help="duration per profile")
+    parser.add_argument("--slow", type=int, default=8, help="slow uploading clients")
+    parser.add_argument("--fast", type=int, default=4, help="fast merging clients")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers in both profiles")
+    parser.add_argument("--pages", type=int, default=20, help="pages per input of a fast merge")
+    parser.add_argument("--slow-chunk", type=int, default=16, help="KiB a slow client sends at a time")
+    parser.add_argument("--slow-delay", type=float, default=0.25, help="seconds between slow chunks")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    args = parser.parse_args()
+
+    cookie = session_cookie()
+    print(f"{args.slow} slow + {args.fast} fast clients, {args.workers} workers, {args.seconds:.0f} s, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'profile':>8}{'clients':>8}{'done':>7}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'failed':>8}")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            for kind, done, rate, p50, p95, failed in run_profile(profile, args, directory, cookie):
+                print(f"{profile:>8}{kind:>8}{done:>7}{rate:>8.1f}{p50:>8.2f}{p95:>8.2f}{failed:>8}")
+
+
+if __name__ == "__main__":
+    main()
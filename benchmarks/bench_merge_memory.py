@@ -0,0 +1,100 @@
+"""
+Peak memory of merges against the number of inputs.
+
+Compares the in-memory merge (PdfWriter keeps every input until the output
+is written) with the streaming merge used once the inputs exceed
+MERGE_MEMORY_BUDGET (each input is written and released in turn). Every
+merge runs in a fresh process, so its peak RSS is measured in isolation.
+
+Run: python -m benchmarks.bench_merge_memory [--inputs 10 50 200] [--pages N] [--page-kib N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+ENGINES = ("in-memory", "streaming")
+
+
+def make_pdf(pages, page_kib):
+    """Build an uncompressed PDF whose pages carry page_kib KiB of content each."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    kids = []
+    for _ in range(pages):
+        # Random bytes in a comment so the content is not trivially shared
+        content = b"%" + os.urandom(page_kib * 512).hex().encode() + b"\n0 0 m 100 100 l S\n"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        kids.append(len(objects) + 1)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << >> /Contents %d 0 R >>"
+            % (len(objects))
+        )
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+def _merge(paths, output_path, budget, results):
+    """Child process: merge and report (peak RSS in KiB, seconds)."""
+    from flask_app.pdf_ops import merge_pdfs
+
+    start = time.perf_counter()
+    merge_pdfs([(os.path.basename(path), path) for path in paths], output_path, memory_budget=budget)
+    results.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, time.perf_counter() - start))
+
+
+def measure(paths, output_path, budget):
+    """Run one merge in a fresh process."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_merge, args=(paths, output_path, budget, results))
+    process.start()
+    peak, seconds = results.get()
+    process.join()
+    return peak / 1024, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--inputs", type=int, nargs="+", default=[10, 50, 100, 200], help="input counts")
+    parser.add_argument("--pages", type=int, default=4, help="pages per input")
+    parser.add_argument("--page-kib", type=int, default=64, help="content per page in KiB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index in range(max(args.inputs)):
+            path = os.path.join(directory, f"{index}.pdf")
+            with open(path, "wb") as source_file:
+                source_file.write(make_pdf(args.pages, args.page_kib))
+            paths.append(path)
+        input_size = os.path.getsize(paths[0])
+        output_path = os.path.join(directory, "merged.pdf")
+
+        print(f"{args.pages} pages of {args.page_kib} KiB per input ({input_size / 1024:.0f} KiB)")
+        print(f"{'inputs':>8}{'input MB':>10}" + "".join(f"{engine + ' MB':>16}{'s':>7}" for engine in ENGINES))
+        for count in args.inputs:
+            row = f"{count:>8}{count * input_size / (1024 * 1024):>10.1f}"
+            # No budget keeps the in-memory path; one input's size forces streaming
+            for budget in (None, input_size):
+                peak, seconds = measure(paths[:count], output_path, budget)
+                row += f"{peak:>16.1f}{seconds:>7.2f}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for the in-process rate limiter strategies.
+
+Compares the sliding log (MemoryBackend, the original algorithm) with the
+constant-time token bucket and sliding-window-counter backends on:
+
+- hot key: one client hammering one endpoint (long per-key history)
+- scan: many distinct client IPs, one request each (tracked-key growth)
+
+Run: python -m benchmarks.bench_rate_limiter [--requests N] [--ips N]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from flask_app.rate_limiter import (
+    MemoryBackend, RateLimiter, SlidingWindowCounterBackend, TokenBucketBackend,
+)
+
+STRATEGIES = {
+    "sliding-log": lambda max_keys: MemoryBackend(),
+    "token-bucket": lambda max_keys: TokenBucketBackend(max_keys=max_keys),
+    "sliding-window-counter": lambda max_keys: SlidingWindowCounterBackend(max_keys=max_keys),
+}
+
+
+def bench_hot_key(backend, requests, max_requests):
+    """Time `requests` checks for a single IP with a large budget."""
+    limiter = RateLimiter(backend)
+    start = time.perf_counter()
+    for _ in range(requests):
+        limiter.is_limited("203.0.113.7", "download_file", max_requests=max_requests, window_seconds=60)
+    return time.perf_counter() - start
+
+
+def bench_scan(backend, ips):
+    """Time one check for each of `ips` distinct IPs and measure retained memory."""
+    limiter = RateLimiter(backend)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for index in range(ips):
+        ip = f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+        limiter.is_limited(ip, "join_pdfs", max_requests=10, window_seconds=300)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000, help="hot-key checks")
+    parser.add_argument("--ips", type=int, default=100000, help="distinct IPs in the scan")
+    parser.add_argument("--max-keys", type=int, default=100000, help="key cap for compact backends")
+    args = parser.parse_args()
+
+    print(f"{'strategy':<24}{'hot key us/op':>16}{'scan us/op':>14}{'scan memory':>14}")
+    for name, factory in STRATEGIES.items():
+        hot = bench_hot_key(factory(args.max_keys), args.requests, max_requests=args.requests + 1)
+        scan, memory = bench_scan(factory(args.max_keys), args.ips)
+        print(
+            f"{name:<24}{hot / args.requests * 1e6:>16.2f}"
+            f"{scan / args.ips * 1e6:>14.2f}{memory / (1024 * 1024):>12.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import base64
 from datetime import datetime
 from flask import Flask
 from flask_talisman import Talisman
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 talisman = Talisman()
 
@@ -40,6 +41,15 @@ def create_app(config_name="default"):
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
 
+    # Client address from the X-Forwarded-For hops added by trusted proxies;
+    # anything a client put in the header before them is ignored
+    if app.config["TRUSTED_PROXIES"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"])
+
+    # Spool, hash and sniff uploads while they are received
+    from flask_app.uploads import init_uploads
+    init_uploads(app)
+
     # Initialize Talisman for security headers
     is_production = os.getenv("FLASK_ENV") == "production"
     talisman.init_app(
@@ -50,10 +60,37 @@ def create_app(config_name="default"):
         strict_transport_security_max_age=31536000 if is_production else None,
     )
 
-    # Initialize rate limiting (abuse prevention)
-    if config_name != "testing":
-        from flask_app.rate_limiter import init_rate_limiting
-        init_rate_limiting(app)
+    # Initialize rate limiting (abuse prevention, enforced when RATELIMIT_ENABLED)
+    from flask_app.rate_limiter import init_rate_limiting
+    init_rate_limiting(app)
+
+    # Pre-rendered CAPTCHA challenges (refilled in the background)
+    from flask_app.captcha_pool import init_captcha_pool
+    init_captcha_pool(app)
+
+    # Expiry index and time buckets for generated files
+    from flask_app.expiry import init_expiry
+    init_expiry(app)
+
+    # Content-hash cache of merge/split results
+    from flask_app.result_cache import init_result_cache
+    init_result_cache(app)
+
+    # Content-hash cache of parsed input documents
+    from flask_app.reader_cache import init_reader_cache
+    init_reader_cache(app)
+
+    # Process pool for the PDF work of requests
+    from flask_app.pdf_pool import init_pdf_pool
+    init_pdf_pool(app)
+
+    # Outputs of lazy splits, generated on download
+    from flask_app.lazy_split import init_lazy_split
+    init_lazy_split(app)
+
+    # Background job queue for merge/split
+    from flask_app.jobs import init_jobs
+    init_jobs(app)
 
     # Register custom filters
     app.jinja_env.filters["b64encode"] = b64encode
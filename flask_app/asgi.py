@@ -0,0 +1,366 @@
+"""
+ASGI entry point for Flask PDF Tools.
+
+Under a WSGI server a request holds a worker thread (or process) from its
+first byte to its last, so a few hundred mobile clients uploading 10 MB
+PDFs slowly need as many threads. AsgiApp serves the same Flask
+application from an ASGI server (``uvicorn asgi:app``, see asgi.py) and
+keeps the slow parts on the event loop:
+
+- the first UPLOAD_SPOOL_MAX_MEMORY bytes of the request body are received
+  asynchronously, so a small upload in progress costs a coroutine, not a
+  thread; bodies over MAX_CONTENT_LENGTH are refused with 413 before or
+  while they arrive
+- the Flask app then runs in a thread pool (ASGI_THREADS) and reads the rest
+  of a larger body straight from the connection (RequestBody), so uploads
+  are spooled once, by the multipart parser; the PDF work goes on to the
+  process pool of flask_app.pdf_pool when PDF_POOL_WORKERS is set
+- files sent with send_file are handed back unread (through
+  ``wsgi.file_wrapper``) and streamed from the loop, each chunk read in the
+  default executor; other response bodies are iterated in the thread pool.
+  Either stops, and the body is closed, when the client disconnects
+
+Request handling itself is unchanged: every route, hook and error handler
+of the Flask app applies as under a WSGI server.
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+
+# Bytes read from a response file at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestTooLarge(Exception):
+    """The request body exceeds MAX_CONTENT_LENGTH."""
+
+
+class FileResponse:
+    """
+    ``wsgi.file_wrapper``: marks a file response so it is streamed from
+    the event loop instead of being iterated in a request thread.
+    """
+
+    def __init__(self, file, buffer_size=CHUNK_SIZE):
+        self.file = file
+        self.buffer_size = max(buffer_size, CHUNK_SIZE)
+
+    def __iter__(self):
+        while True:
+            data = self.file.read(self.buffer_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if hasattr(self.file, "close"):
+            self.file.close()
+
+
+class RequestBody(io.RawIOBase):
+    """
+    ``wsgi.input``: the request body, received from the event loop as the
+    application reads it.
+    """
+
+    def __init__(self, receive, loop, data=b"", more_body=True, max_content_length=None):
+        """
+        Args:
+            receive: ASGI receive callable
+            loop: Event loop running the connection
+            data (bytes): Body received before the application started
+            more_body (bool): Whether more body messages follow
+            max_content_length (int, optional): Largest body accepted
+        """
+        self._receive = receive
+        self._loop = loop
+        self._data = bytearray(data)
+        self._more_body = more_body
+        self._max_content_length = max_content_length
+        self.received = len(data)
+        self.disconnected = False
+
+    @property
+    def complete(self):
+        """Whether the whole body has been received."""
+        return not self._more_body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._data and self._more_body:
+            self._receive_more()
+        size = min(len(buffer), len(self._data))
+        buffer[:size] = self._data[:size]
+        del self._data[:size]
+        return size
+
+    def _receive_more(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message["type"] == "http.disconnect":
+            self.disconnected = True
+            self._more_body = False
+            raise ClientDisconnected()
+        chunk = message.get("body", b"")
+        self.received += len(chunk)
+        self._more_body = message.get("more_body", False)
+        if self._max_content_length is not None and self.received > self._max_content_length:
+            self._more_body = False
+            raise RequestEntityTooLarge()
+        self._data += chunk
+
+
+def _latin1(value):
+    return value.decode("latin-1") if isinstance(value, bytes) else value
+
+
+def build_environ(scope, body, content_length):
+    """
+    WSGI environ for an ASGI HTTP scope.
+
+    Args:
+        scope (dict): ASGI connection scope
+        body: Binary file object reading the request body
+        content_length (int): Size of the body in bytes, None if not known
+
+    Returns:
+        dict: PEP 3333 environ
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": _latin1(scope.get("query_string", b"")),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # The body ends with the last ASGI message, with or without a length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": FileResponse,
+    }
+    for name, value in scope.get("headers", []):
+        name = _latin1(name).upper().replace("-", "_")
+        value = _latin1(value)
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        if key in environ:
+            # Repeated headers are joined; cookies use their own separator
+            environ[key] += ("; " if key == "HTTP_COOKIE" else ",") + value
+        else:
+            environ[key] = value
+    if content_length is not None:
+        environ["CONTENT_LENGTH"] = str(content_length)
+    return environ
+
+
+def _declared_length(scope):
+    """Content-Length header of a scope, or None."""
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AsgiApp:
+    """ASGI application serving a Flask application."""
+
+    def __init__(self, app, threads=None):
+        """
+        Args:
+            app: Flask application instance
+            threads (int, optional): Threads running requests
+                (ThreadPoolExecutor default if not given)
+        """
+        self.app = app
+        self.max_content_length = app.config.get("MAX_CONTENT_LENGTH")
+        self.spool_max_memory = app.config["UPLOAD_SPOOL_MAX_MEMORY"]
+        self.executor = ThreadPoolExecutor(max_workers=threads or None, thread_name_prefix="asgi-request")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def shutdown(self):
+        """Stop the request threads and the application's PDF pool."""
+        self.executor.shutdown(wait=False)
+        pool = getattr(self.app, "pdf_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        declared = _declared_length(scope)
+        try:
+            if self.max_content_length is not None and declared is not None \
+                    and declared > self.max_content_length:
+                raise RequestTooLarge()
+            body = await self._receive_start(receive, loop)
+        except RequestTooLarge:
+            await self._send_simple(send, 413, b"Request Entity Too Large")
+            return
+        if body is None:
+            # The client went away before the application started
+            return
+
+        try:
+            content_length = body.received if declared is None and body.complete else declared
+            environ = build_environ(scope, body, content_length)
+            status, headers, result = await loop.run_in_executor(self.executor, self._call_app, environ)
+            if body.disconnected:
+                if hasattr(result, "close"):
+                    await loop.run_in_executor(None, result.close)
+                return
+            disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+            try:
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                if isinstance(result, FileResponse):
+                    await self._send_file(result, send, loop, disconnect)
+                else:
+                    await self._send_iterable(result, send, loop, disconnect)
+            finally:
+                disconnect.cancel()
+                if hasattr(result, "close"):
+                    await loop.run_in_executor(None, result.close)
+        finally:
+            body.close()
+
+    async def _receive_start(self, receive, loop):
+        """
+        Receive the body up to UPLOAD_SPOOL_MAX_MEMORY bytes.
+
+        Returns:
+            RequestBody: Body reading the rest from the connection, or None
+            on disconnect
+        """
+        data = bytearray()
+        more = True
+        while more and len(data) < self.spool_max_memory:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            data += message.get("body", b"")
+            if self.max_content_length is not None and len(data) > self.max_content_length:
+                raise RequestTooLarge()
+            more = message.get("more_body", False)
+        return RequestBody(receive, loop, bytes(data), more, self.max_content_length)
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        """Wait for the client to disconnect, dropping body the app left unread."""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    def _call_app(self, environ):
+        """Run the WSGI application; returns (status, headers, iterable)."""
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+            return written.append
+
+        result = self.app(environ, start_response)
+        if not isinstance(result, FileResponse):
+            # start_response may be deferred until the first chunk
+            iterator = iter(result)
+            first = next(iterator, None)
+            chunks = written + ([first] if first is not None else [])
+            result = _Body(chunks, iterator, result)
+        return response["status"], response["headers"], result
+
+    async def _send_file(self, result, send, loop, disconnect):
+        while not disconnect.done():
+            data = await loop.run_in_executor(None, result.file.read, result.buffer_size)
+            if not data:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+
+    async def _send_iterable(self, result, send, loop, disconnect):
+        for data in result.ready:
+            if data:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+        while not disconnect.done():
+            data = await loop.run_in_executor(self.executor, next, result.iterator, None)
+            if data is None:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            if data:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+
+    @staticmethod
+    async def _send_simple(send, status, body):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class _Body:
+    """Response body: chunks already produced, then the rest of an iterator."""
+
+    def __init__(self, ready, iterator, result):
+        self.ready = ready
+        self.iterator = iterator
+        self._result = result
+
+    def close(self):
+        if hasattr(self._result, "close"):
+            self._result.close()
+
+
+def init_asgi(app):
+    """
+    Wrap the application for an ASGI server.
+
+    Args:
+        app: Flask application instance
+
+    Returns:
+        AsgiApp: ASGI application; the Flask app stays usable under WSGI
+    """
+    app.asgi_app = AsgiApp(app, threads=app.config["ASGI_THREADS"])
+    return app.asgi_app
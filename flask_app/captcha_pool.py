@@ -0,0 +1,247 @@
+"""
+Pre-rendered CAPTCHA pool for Flask PDF Tools.
+
+Rendering a CAPTCHA (glyph warping, noise, PNG encoding) is the most
+expensive part of serving the home page. The pool keeps a bounded stock of
+ready-made (text, PNG bytes) challenges that a background thread refills
+whenever the stock drops below a low watermark, so requests only pop one.
+
+Each challenge is handed out exactly once. When the pool runs dry the
+challenge is rendered inline on the request thread (a "miss").
+
+Issued challenges are remembered under a random token for a short time so
+the PNG can be fetched from ``/captcha/<token>.png`` instead of being
+inlined into the page as a base64 data URI.
+"""
+
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask_app.utils import generate_captcha_text, render_captcha_png
+
+
+class CaptchaPool:
+    """
+    Bounded pool of pre-rendered CAPTCHA challenges.
+
+    The refill worker is started lazily on first use so that every
+    (forked) gunicorn worker process gets its own thread.
+    """
+
+    def __init__(self, size=32, low_watermark=8, text_length=5, issued_ttl=600, max_issued=4096):
+        """
+        Initialize an empty pool.
+
+        Args:
+            size (int): Maximum number of pre-rendered challenges kept
+            low_watermark (int): Refill is triggered below this stock level
+            text_length (int): Number of characters per challenge
+            issued_ttl (int): Seconds an issued image stays fetchable by token
+            max_issued (int): Maximum number of issued images remembered
+        """
+        self.size = max(0, size)
+        self.low_watermark = min(max(0, low_watermark), self.size)
+        self.text_length = text_length
+        self.issued_ttl = issued_ttl
+        self.max_issued = max_issued
+
+        # Format: {token: (expires_at, png_bytes)}
+        self._issued = OrderedDict()
+
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+
+        self._hits = 0
+        self._misses = 0
+        self._refills = 0
+        self._rendered = 0
+        self._refill_seconds_total = 0.0
+        self._refill_seconds_last = 0.0
+
+    def _render(self):
+        """Render a fresh challenge."""
+        text = generate_captcha_text(self.text_length)
+        return text, render_captcha_png(text)
+
+    def take(self):
+        """
+        Hand out a single-use challenge.
+
+        Returns:
+            tuple: (captcha text, PNG bytes)
+        """
+        self._ensure_worker()
+
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+            stock = len(self._items)
+            if item is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        if stock < self.low_watermark or item is None:
+            self._refill_needed.set()
+
+        if item is None:
+            item = self._render()
+        return item
+
+    def issue(self):
+        """
+        Hand out a challenge whose image is served by token.
+
+        Returns:
+            tuple: (token, captcha text)
+        """
+        text, png = self.take()
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        with self._lock:
+            self._issued[token] = (now + self.issued_ttl, png)
+            while self._issued:
+                oldest_token, (expires_at, _) = next(iter(self._issued.items()))
+                if len(self._issued) <= self.max_issued and expires_at > now:
+                    break
+                del self._issued[oldest_token]
+        return token, text
+
+    def get_image(self, token):
+        """
+        Get the PNG bytes of an issued challenge.
+
+        Args:
+            token (str): Token returned by issue()
+
+        Returns:
+            bytes or None: PNG bytes, or None if unknown or expired
+        """
+        with self._lock:
+            entry = self._issued.get(token)
+            if entry is None:
+                return None
+            expires_at, png = entry
+            if expires_at <= time.time():
+                del self._issued[token]
+                return None
+            return png
+
+    def fill(self):
+        """
+        Top the pool up to its configured size.
+
+        Returns:
+            int: Number of challenges rendered
+        """
+        start = time.perf_counter()
+        rendered = 0
+        while not self._stopped.is_set():
+            with self._lock:
+                if len(self._items) >= self.size:
+                    break
+            item = self._render()
+            with self._lock:
+                if len(self._items) >= self.size:
+                    break
+                self._items.append(item)
+            rendered += 1
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if rendered:
+                self._refills += 1
+                self._rendered += rendered
+                self._refill_seconds_total += elapsed
+                self._refill_seconds_last = elapsed
+        return rendered
+
+    def start(self):
+        """Start the background refill thread (idempotent per process)."""
+        self._ensure_worker()
+
+    def stop(self):
+        """Stop the background refill thread."""
+        self._stopped.set()
+        self._refill_needed.set()
+        if self._worker and self._worker.is_alive():
+            self._worker.join(timeout=5)
+
+    def _ensure_worker(self):
+        """Start the refill thread if this process does not have one yet."""
+        if self.size == 0 or self._stopped.is_set():
+            return
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            # Challenges inherited across fork() were rendered for the parent
+            # and may also be handed out by siblings; drop them.
+            if self._worker_pid not in (None, pid):
+                self._items.clear()
+            self._worker_pid = pid
+            self._worker = threading.Thread(
+                target=self._run, name="captcha-pool-refill", daemon=True
+            )
+            self._refill_needed.set()
+            self._worker.start()
+
+    def _run(self):
+        """Refill loop executed by the background thread."""
+        while not self._stopped.is_set():
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.fill()
+            except Exception as e:
+                logging.error(f"CAPTCHA pool refill failed: {e}")
+                self._stopped.wait(1)
+
+    def stats(self):
+        """
+        Get pool counters.
+
+        Returns:
+            dict: Stock level, hits, misses and refill latency figures
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "available": len(self._items),
+                "issued": len(self._issued),
+                "hits": self._hits,
+                "misses": self._misses,
+                "refills": self._refills,
+                "rendered": self._rendered,
+                "refill_seconds_total": self._refill_seconds_total,
+                "refill_seconds_last": self._refill_seconds_last,
+                "refill_seconds_per_image": (
+                    self._refill_seconds_total / self._rendered if self._rendered else 0.0
+                ),
+            }
+
+
+def init_captcha_pool(app):
+    """
+    Attach a CAPTCHA pool to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.captcha_pool = CaptchaPool(
+        size=app.config["CAPTCHA_POOL_SIZE"],
+        low_watermark=app.config["CAPTCHA_POOL_LOW_WATERMARK"],
+        issued_ttl=app.config["CAPTCHA_IMAGE_TTL"],
+    )
+    return app.captcha_pool
@@ -1,6 +1,9 @@
 import os
 import logging
 from dotenv import load_dotenv
+from flask_app.expiry import ExpiryIndex
+from flask_app.jobs import prune_job_dirs
+from flask_app.storage import create_storage
 from flask_app.utils import cleanup_uploads
 
 load_dotenv()
@@ -8,6 +11,12 @@ load_dotenv()
 # Read configuration from environment variables
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 CLEANUP_INTERVAL = int(os.getenv("CLEANUP_INTERVAL", 3600))
+CLEANUP_BUCKET_SECONDS = int(os.getenv("CLEANUP_BUCKET_SECONDS", 300))
+RESULT_STORAGE_URL = os.getenv("RESULT_STORAGE_URL", "file://")
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 3600))
+# Loose top-level files predate the expiry buckets; scanning for them lists
+# and stats the whole folder, so it only runs while old files may remain
+CLEANUP_LEGACY_FILES = os.getenv("CLEANUP_LEGACY_FILES", "false").lower() == "true"
 
 if __name__ == "__main__":
     """
@@ -15,6 +24,7 @@ if __name__ == "__main__":
     
     Run manually: python -m flask_app.cleanup
     Or schedule with cron: 0 * * * * cd /path && python -m flask_app.cleanup
+    (or set CLEANUP_SWEEPER=true to sweep inside the application instead)
     """
     logging.basicConfig(
         level=logging.INFO,
@@ -23,8 +33,18 @@ if __name__ == "__main__":
     
     if os.path.exists(UPLOAD_FOLDER):
         try:
-            cleanup_uploads(UPLOAD_FOLDER, CLEANUP_INTERVAL)
-            logging.info(f"Cleanup completed for folder: {UPLOAD_FOLDER}")
+            storage = create_storage(RESULT_STORAGE_URL, UPLOAD_FOLDER, ttl=CLEANUP_INTERVAL)
+            index = ExpiryIndex(
+                UPLOAD_FOLDER, ttl=CLEANUP_INTERVAL, bucket_seconds=CLEANUP_BUCKET_SECONDS, storage=storage
+            )
+            removed = index.sweep()
+            if CLEANUP_LEGACY_FILES:
+                cleanup_uploads(UPLOAD_FOLDER, CLEANUP_INTERVAL)
+            jobs_removed = prune_job_dirs(os.path.join(UPLOAD_FOLDER, "jobs"), JOB_RESULT_TTL)
+            logging.info(
+                f"Cleanup completed for folder: {UPLOAD_FOLDER} "
+                f"({removed} buckets, {jobs_removed} job directories removed)"
+            )
         except Exception as e:
             logging.error(f"Error during cleanup: {e}")
     else:
@@ -20,7 +20,58 @@ class Config:
     
     SECRET_KEY = _secret_key
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+    CLEANUP_INTERVAL = int(os.getenv("CLEANUP_INTERVAL", 3600))
+    CLEANUP_BUCKET_SECONDS = int(os.getenv("CLEANUP_BUCKET_SECONDS", 300))
+    CLEANUP_SWEEPER = os.getenv("CLEANUP_SWEEPER", "false").lower() == "true"
+    RESULT_STORAGE_URL = os.getenv("RESULT_STORAGE_URL", "file://")
+    # In-memory cache of merge/split results per worker, in MB (0 = disabled)
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 64))
+    # In-memory cache of parsed input documents per worker, in MB (0 = disabled)
+    READER_CACHE_SIZE = int(os.getenv("READER_CACHE_SIZE", 32))
+    # Let nginx (x-accel) or Apache/lighttpd (x-sendfile) send files, or "off"
+    FILE_OFFLOAD = os.getenv("FILE_OFFLOAD", "off").lower()
+    FILE_OFFLOAD_PREFIX = os.getenv("FILE_OFFLOAD_PREFIX", "/protected-uploads/")
+    # Uploads larger than this (MB) are spooled to temporary files
+    UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", 1)) * 1024 * 1024
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 10)) * 1024 * 1024
+    MERGE_MAX_FILES = int(os.getenv("MERGE_MAX_FILES", 200))
+    # Parsed input a merge may hold at once, in MB (0 = no limit); larger
+    # merges release each input once written, and larger inputs are refused.
+    # Keep it below MAX_CONTENT_LENGTH, or merges are never streamed
+    MERGE_MEMORY_BUDGET = int(os.getenv("MERGE_MEMORY_BUDGET", 8)) * 1024 * 1024
+    # Flate-encode streams that inputs store uncompressed when writing outputs
+    COMPRESS_CONTENT_STREAMS = os.getenv("COMPRESS_CONTENT_STREAMS", "false").lower() == "true"
+    JOIN_STREAM_RESPONSE = os.getenv("JOIN_STREAM_RESPONSE", "true").lower() == "true"
+    JOIN_SPOOL_MAX_MEMORY = int(os.getenv("JOIN_SPOOL_MAX_MEMORY", 8)) * 1024 * 1024
+    # Store the source and build split outputs on their first download
+    SPLIT_LAZY = os.getenv("SPLIT_LAZY", "false").lower() == "true"
+    # In-memory cache of generated lazy split outputs per worker, in MB
+    SPLIT_PAGE_CACHE_SIZE = int(os.getenv("SPLIT_PAGE_CACHE_SIZE", 8))
+    # Processes writing split pages concurrently (0 = one per CPU); applies
+    # to queued splits, and to request splits only without PDF_POOL_WORKERS
+    SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", 1)) or os.cpu_count() or 1
+    # Processes per app worker running the PDF work of requests (0 = in the
+    # request thread); gunicorn.conf.py derives it from the CPU count
+    PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", 0))
+    # Threads running requests under the ASGI entry point (0 = executor default)
+    ASGI_THREADS = int(os.getenv("ASGI_THREADS", 0))
+    ASYNC_JOBS = os.getenv("ASYNC_JOBS", "false").lower() == "true"
+    JOB_BACKEND = os.getenv("JOB_BACKEND", "process")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    # Pending jobs per app worker process (the server allows this many per worker)
+    JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", 16))
+    JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", 5))
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 3600))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted
+    # (0 = use the connecting address; 1 behind the nginx of docker-compose)
+    TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_STORAGE_URL = os.getenv("RATELIMIT_STORAGE_URL", "memory://")
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "sliding-log")
+    RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", 100000))
+    CAPTCHA_POOL_SIZE = int(os.getenv("CAPTCHA_POOL_SIZE", 32))
+    CAPTCHA_POOL_LOW_WATERMARK = int(os.getenv("CAPTCHA_POOL_LOW_WATERMARK", 8))
+    CAPTCHA_IMAGE_TTL = int(os.getenv("CAPTCHA_IMAGE_TTL", 600))
     TALISMAN_FORCE_HTTPS = os.getenv("FLASK_ENV") == "production"
     TALISMAN_CSP = {
         "default-src": ["'self'"],
@@ -36,3 +87,7 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024
+    JOB_BACKEND = "thread"
+    RATELIMIT_ENABLED = False
+    CAPTCHA_POOL_SIZE = 4
+    CAPTCHA_POOL_LOW_WATERMARK = 2
@@ -0,0 +1,349 @@
+"""
+Expiry index for generated files in Flask PDF Tools.
+"""
+
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from flask_app.storage import LocalStorage, create_storage
+
+INDEX_FILENAME = ".expiry.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    session TEXT,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_expires ON files (expires);
+CREATE INDEX IF NOT EXISTS files_session ON files (session);
+"""
+
+
+class ExpiryIndex:
+    """
+    Time-bucketed output storage with an on-disk expiry index.
+    """
+
+    def __init__(self, root, ttl=3600, bucket_seconds=300, storage=None):
+        """
+        Args:
+            root (str): Folder holding the buckets and the index
+            ttl (int): Seconds a generated file is kept
+            bucket_seconds (int): Width of one expiry bucket in seconds
+            storage (ResultStorage, optional): Where registered files are
+                kept (defaults to the buckets themselves)
+        """
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.db_path = os.path.join(self.root, INDEX_FILENAME)
+        self.storage = storage if storage is not None else LocalStorage(self.root)
+
+        self._schema_ready = False
+        self._sweeper_enabled = False
+        self._sweeper = None
+        self._sweeper_pid = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+        # session -> {"bucket", "expires", "files": {name: size}}, oldest first
+        self._manifest = OrderedDict()
+        self._manifest_lock = threading.Lock()
+
+    def _connect(self):
+        """Open a connection to the index, creating the schema on first use."""
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        if not self._schema_ready:
+            connection.executescript(_SCHEMA)
+            self._schema_ready = True
+        return connection
+
+    def _query(self, sql, params):
+        """Run a read-only query; an index that does not exist yet is empty."""
+        try:
+            connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=10)
+        except sqlite3.OperationalError:
+            return []
+        with closing(connection):
+            try:
+                return connection.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                return []
+
+    def new_bucket(self, now=None):
+        """
+        Return the bucket for files written now, creating its directory.
+
+        Buckets are named by the epoch second at which they expire, so a
+        file is removed at most bucket_seconds after its own expiry.
+
+        Returns:
+            str: Bucket name
+        """
+        now = time.time() if now is None else now
+        expires = now + self.ttl
+        bucket = str(int(-(-expires // self.bucket_seconds) * self.bucket_seconds))
+        os.makedirs(self.bucket_path(bucket), exist_ok=True)
+        return bucket
+
+    def bucket_path(self, bucket):
+        """Absolute directory of a bucket."""
+        return os.path.join(self.root, bucket)
+
+    def output_dir(self, bucket, session=None):
+        """
+        Return the local directory outputs are written to, creating it.
+
+        Args:
+            bucket (str): Bucket returned by new_bucket()
+            session (str, optional): Split session owning the directory
+
+        Returns:
+            str: Absolute directory path
+        """
+        path = self._file_dir(bucket, session)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _file_dir(self, bucket, session):
+        """Directory holding the files of a session (or loose files) in a bucket."""
+        if session:
+            return os.path.join(self.bucket_path(bucket), session)
+        return self.bucket_path(bucket)
+
+    def register(self, bucket, filenames, session=None, now=None):
+        """
+        Record files written into a bucket and hand them to the storage.
+
+        Args:
+            bucket (str): Bucket returned by new_bucket()
+            filenames (list): Names of the files inside output_dir(bucket, session)
+            session (str, optional): Split session the files belong to
+
+        Raises:
+            StorageError: A file could not be stored
+        """
+        expires = float(bucket)
+        directory = self._file_dir(bucket, session)
+        files = {}
+        for name in filenames:
+            path = os.path.join(directory, name)
+            files[name] = os.path.getsize(path)
+            self.storage.put(self.storage.key(bucket, session, name), path, expires)
+
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO files (name, bucket, session, expires) VALUES (?, ?, ?, ?)",
+                [(name, bucket, session, expires) for name in filenames],
+            )
+
+        if session:
+            with self._manifest_lock:
+                entry = self._manifest.setdefault(
+                    session, {"bucket": bucket, "expires": expires, "files": {}}
+                )
+                entry["files"].update(files)
+            self._prune_manifest(time.time() if now is None else now)
+        self._ensure_sweeper()
+
+    def manifest(self, session, now=None):
+        """
+        Return the in-memory manifest entry of a split session.
+
+        Only sessions registered by this process are known.
+
+        Args:
+            session (str): Split session identifier
+
+        Returns:
+            dict or None: {"bucket", "expires", "files": {name: size}}
+        """
+        now = time.time() if now is None else now
+        with self._manifest_lock:
+            entry = self._manifest.get(session)
+            if entry is None or entry["expires"] <= now:
+                return None
+            return {**entry, "files": dict(entry["files"])}
+
+    def _prune_manifest(self, now):
+        """Drop expired sessions from the front of the manifest."""
+        with self._manifest_lock:
+            while self._manifest:
+                session, entry = next(iter(self._manifest.items()))
+                if entry["expires"] > now:
+                    break
+                del self._manifest[session]
+
+    def lookup(self, filename, now=None):
+        """
+        Resolve a registered file to its storage key.
+
+        Args:
+            filename (str): Name of the file
+
+        Returns:
+            str or None: Storage key, or None if unknown or expired
+        """
+        now = time.time() if now is None else now
+        # Split outputs are named "<session>_..."
+        session = filename.split("_", 1)[0]
+        entry = self.manifest(session, now)
+        if entry is not None and filename in entry["files"]:
+            return self.storage.key(entry["bucket"], session, filename)
+
+        rows = self._query(
+            "SELECT bucket, session FROM files WHERE name = ? AND expires > ?", (filename, now)
+        )
+        if rows:
+            bucket, session = rows[0]
+            return self.storage.key(bucket, session, filename)
+        # Written by another node into shared storage
+        return self.storage.find(filename, now) if self.storage.shared else None
+
+    def session_files(self, session, now=None):
+        """
+        List the files of a split session.
+
+        Args:
+            session (str): Split session identifier
+
+        Returns:
+            list: (filename, storage key) pairs in no particular order
+        """
+        now = time.time() if now is None else now
+        entry = self.manifest(session, now)
+        if entry is not None:
+            return [(name, self.storage.key(entry["bucket"], session, name)) for name in entry["files"]]
+
+        rows = self._query("SELECT name, bucket FROM files WHERE session = ? AND expires > ?", (session, now))
+        if rows:
+            return [(name, self.storage.key(bucket, session, name)) for name, bucket in rows]
+        return self.storage.find_session(session, now) if self.storage.shared else []
+
+    def expire_session(self, session, bucket=None):
+        """
+        Delete all files of a split session before their bucket expires.
+
+        Args:
+            session (str): Split session identifier
+            bucket (str, optional): Bucket of the session, for sessions
+                whose files were never registered
+        """
+        with self._manifest_lock:
+            entry = self._manifest.pop(session, None)
+        if entry is not None:
+            rows = [(name, entry["bucket"]) for name in entry["files"]]
+        else:
+            rows = self._query("SELECT name, bucket FROM files WHERE session = ?", (session,))
+
+        buckets = {bucket for _, bucket in rows}
+        if bucket is not None:
+            buckets.add(bucket)
+        for bucket in buckets:
+            shutil.rmtree(self._file_dir(bucket, session), ignore_errors=True)
+        if not self.storage.expires_with_buckets:
+            self.storage.delete([self.storage.key(bucket, session, name) for name, bucket in rows])
+
+        if os.path.exists(self.db_path):
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM files WHERE session = ?", (session,))
+
+    def sweep(self, now=None):
+        """
+        Delete expired buckets and their index rows.
+
+        Only the top level of the root folder is listed; files inside live
+        buckets are never touched. Storage backends that keep objects
+        outside the buckets are told which keys expired.
+
+        Returns:
+            int: Number of bucket directories removed
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.isdigit() and int(name) <= now:
+                    shutil.rmtree(self.bucket_path(name), ignore_errors=True)
+                    removed += 1
+
+        if not self.storage.expires_with_buckets:
+            expired = self._query("SELECT name, bucket, session FROM files WHERE expires <= ?", (now,))
+            self.storage.delete([self.storage.key(bucket, session, name) for name, bucket, session in expired])
+            self.storage.expire(now)
+
+        if os.path.exists(self.db_path):
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM files WHERE expires <= ?", (now,))
+        self._prune_manifest(now)
+        return removed
+
+    def start_sweeper(self):
+        """Sweep in a background thread once per bucket period."""
+        with self._lock:
+            self._sweeper_enabled = True
+        self._ensure_sweeper()
+
+    def stop_sweeper(self):
+        """Stop the background sweeper thread."""
+        self._stopped.set()
+        if self._sweeper is not None and self._sweeper.is_alive():
+            self._sweeper.join(timeout=5)
+
+    def _ensure_sweeper(self):
+        """Start the sweeper thread if enabled and this process has none yet."""
+        if not self._sweeper_enabled or self._stopped.is_set():
+            return
+        pid = os.getpid()
+        with self._lock:
+            if self._sweeper is not None and self._sweeper_pid == pid and self._sweeper.is_alive():
+                return
+            self._sweeper_pid = pid
+            self._sweeper = threading.Thread(target=self._run, name="upload-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _run(self):
+        """Sweep loop executed by the background thread."""
+        while not self._stopped.wait(self.bucket_seconds):
+            try:
+                removed = self.sweep()
+                if removed:
+                    logging.info(f"Removed {removed} expired upload buckets")
+            except Exception as e:
+                logging.error(f"Error sweeping upload folder: {e}")
+
+
+def init_expiry(app):
+    """
+    Attach the expiry index for generated files to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    storage = create_storage(
+        app.config["RESULT_STORAGE_URL"], app.config["UPLOAD_FOLDER"], ttl=app.config["CLEANUP_INTERVAL"]
+    )
+    if app.config["FILE_OFFLOAD"] != "off" and not isinstance(storage, LocalStorage):
+        # Only files on local disk can be handed to the front-end server
+        scheme = app.config["RESULT_STORAGE_URL"].split(":", 1)[0]
+        logging.warning(
+            f"FILE_OFFLOAD={app.config['FILE_OFFLOAD']} has no effect with {scheme}:// result storage; "
+            f"downloads are sent by the app"
+        )
+    app.expiry_index = ExpiryIndex(
+        app.config["UPLOAD_FOLDER"],
+        ttl=app.config["CLEANUP_INTERVAL"],
+        bucket_seconds=app.config["CLEANUP_BUCKET_SECONDS"],
+        storage=storage,
+    )
+    if app.config["CLEANUP_SWEEPER"]:
+        app.expiry_index.start_sweeper()
+    return app.expiry_index
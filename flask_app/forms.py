@@ -1,7 +1,11 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField
-from wtforms import SubmitField, StringField
-from wtforms.validators import DataRequired, ValidationError
+from wtforms import SubmitField, StringField, SelectField
+from wtforms.validators import DataRequired, Length, Optional, ValidationError
+
+from flask_app.split_spec import (
+    MAX_SPEC_LENGTH, SPLIT_MODE_CHUNKS, SPLIT_MODE_OUTLINE, SPLIT_MODE_PAGES, SPLIT_MODE_RANGES,
+)
 
 
 def validate_pdf_files(form, field):
@@ -35,5 +39,30 @@ class JoinPDFsForm(FlaskForm):
 class SplitPDFForm(FlaskForm):
     """Form for splitting a PDF file."""
     pdf_file = FileField("Upload a PDF", validators=[DataRequired(), validate_pdf_file])
+    split_mode = SelectField(
+        "Split into",
+        choices=[
+            (SPLIT_MODE_PAGES, "One file per page"),
+            (SPLIT_MODE_CHUNKS, "Every N pages"),
+            (SPLIT_MODE_RANGES, "Page ranges"),
+            (SPLIT_MODE_OUTLINE, "One file per bookmark"),
+        ],
+        default=SPLIT_MODE_PAGES,
+    )
+    split_spec = StringField(
+        "Pages per file or ranges (e.g. 1-3,4-10,11-)",
+        validators=[Optional(), Length(max=MAX_SPEC_LENGTH)],
+    )
+    captcha_answer = StringField("Enter CAPTCHA", validators=[DataRequired()])
+    submit = SubmitField("Split PDF")
+
+
+class ExtractPDFForm(FlaskForm):
+    """Form for extracting and reordering pages of a PDF file."""
+    pdf_file = FileField("Upload a PDF", validators=[DataRequired(), validate_pdf_file])
+    pages = StringField(
+        "Pages in output order (e.g. 3,1-2,10-5)",
+        validators=[DataRequired(), Length(max=MAX_SPEC_LENGTH)],
+    )
     captcha_answer = StringField("Enter CAPTCHA", validators=[DataRequired()])
-    submit = SubmitField("Split PDF")
\ No newline at end of file
+    submit = SubmitField("Extract Pages")
@@ -0,0 +1,486 @@
+"""
+Background job queue for Flask PDF Tools.
+
+Merge and split requests can be queued instead of being processed inside
+the request. The POST returns a job id immediately; the work runs on a
+local worker pool and its state is polled through ``/jobs/<id>``.
+
+Job state lives in memory of the process that accepted the job and is
+mirrored to ``<UPLOAD_FOLDER>/jobs/<id>/status.json`` so that any gunicorn
+worker can answer status requests. Expired job directories are removed from
+``jobs/`` whichever process created them (see prune_job_dirs), so jobs of
+exited or recycled workers do not accumulate.
+
+The queue depth is bounded per process: with several app workers, up to
+JOB_QUEUE_DEPTH jobs may be pending in each of them.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask_app.pdf_dedup import WriteStats
+from flask_app.pdf_ops import merge_pdfs, split_pdf_pages
+from flask_app.preflight import check_sources
+from flask_app.split_spec import SPLIT_MODE_PAGES
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Minimum seconds between status.json rewrites for progress-only updates
+PROGRESS_PERSIST_INTERVAL = 0.5
+
+# Minimum seconds between scans of the jobs directory for expired jobs
+JOBS_DIR_SCAN_INTERVAL = 60
+
+# Set in every pool worker by the backend initializer
+_progress_queue = None
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue has reached its maximum depth."""
+
+
+def _init_worker(progress_queue):
+    """Pool worker initializer: remember where to report progress."""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def report_progress(job_id, done, total):
+    """
+    Report job progress from inside a pool worker.
+
+    Args:
+        job_id (str): Job identifier
+        done (int): Units of work completed
+        total (int or None): Total units of work, if known
+    """
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, done, total))
+
+
+def run_merge_job(job_id, sources, output_path, memory_budget=None, compress_streams=False):
+    """Job function: merge sources into output_path."""
+    report_progress(job_id, 0, len(sources))
+    check_sources(sources)
+    stats = WriteStats()
+    pages = merge_pdfs(
+        sources, output_path,
+        progress=lambda done, total: report_progress(job_id, done, total),
+        memory_budget=memory_budget, compress_streams=compress_streams, stats=stats,
+    )
+    return {
+        "files": [os.path.basename(output_path)], "pages": pages, "progress_total": len(sources),
+        "bytes_saved": stats.bytes_saved,
+    }
+
+
+def run_split_job(job_id, source_path, output_dir, session_id, base_name, filename, workers=1,
+                  mode=SPLIT_MODE_PAGES, spec="", compress_streams=False):
+    """Job function: split source_path into one file per page or page range."""
+    report_progress(job_id, 0, None)
+    check_sources([(filename, source_path)])
+    pages_written = []
+
+    def progress(done, total):
+        pages_written[:] = [total]
+        report_progress(job_id, done, total)
+
+    stats = WriteStats()
+    output_files = split_pdf_pages(
+        source_path, output_dir, session_id, base_name, filename=filename,
+        progress=progress, workers=workers, mode=mode, spec=spec,
+        compress_streams=compress_streams, stats=stats,
+    )
+    total = pages_written[0] if pages_written else len(output_files)
+    return {"files": output_files, "pages": total, "progress_total": total, "bytes_saved": stats.bytes_saved}
+
+
+def prune_job_dirs(jobs_dir, result_ttl, keep=(), now=None):
+    """
+    Remove expired job directories, whichever process created them.
+
+    A job expires result_ttl seconds after its ``finished_at``. Jobs still
+    queued or running are left alone however long they wait; a directory
+    without a readable status.json expires once it has not changed for
+    result_ttl.
+
+    Args:
+        jobs_dir (str): Directory holding per-job inputs and status files
+        result_ttl (int): Seconds finished jobs are kept
+        keep (iterable): Job ids to leave alone (tracked by the caller)
+        now (float, optional): Current time
+
+    Returns:
+        int: Number of job directories removed
+    """
+    cutoff = (time.time() if now is None else now) - result_ttl
+    keep = set(keep)
+    try:
+        entries = list(os.scandir(jobs_dir))
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for entry in entries:
+        if entry.name in keep or not JOB_ID_PATTERN.match(entry.name) or not entry.is_dir():
+            continue
+        status_path = os.path.join(entry.path, "status.json")
+        try:
+            changed_at = os.stat(status_path).st_mtime
+            with open(status_path) as status_file:
+                status = json.load(status_file)
+        except (OSError, ValueError):
+            try:
+                changed_at = entry.stat().st_mtime
+            except OSError:
+                continue
+            status = {}
+        if status.get("status") in (JOB_QUEUED, JOB_RUNNING):
+            continue
+        finished_at = status.get("finished_at")
+        if (finished_at if finished_at is not None else changed_at) < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class JobBackend:
+    """
+    Interface for executing job functions.
+
+    Implementations must call ``_init_worker(self.progress_queue)`` in every
+    worker and return concurrent.futures.Future objects from submit().
+    Job functions return a dict; an optional ``progress_total`` entry sets
+    the final progress figure.
+    """
+
+    progress_queue = None
+
+    def submit(self, fn, *args):
+        """Schedule fn(*args) and return a Future."""
+        raise NotImplementedError
+
+    def shutdown(self, wait=True):
+        """Release worker resources."""
+        raise NotImplementedError
+
+
+class ProcessPoolBackend(JobBackend):
+    """Run jobs on a local process pool (no external broker)."""
+
+    def __init__(self, max_workers=None, mp_context="spawn"):
+        """
+        Args:
+            max_workers (int, optional): Pool size (defaults to CPU count)
+            mp_context (str): multiprocessing start method
+        """
+        self._context = multiprocessing.get_context(mp_context)
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.progress_queue = self._context.Queue()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    initargs=(self.progress_queue,),
+                )
+            return self._executor.submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+class ThreadPoolBackend(JobBackend):
+    """Run jobs on a thread pool inside the current process."""
+
+    def __init__(self, max_workers=None):
+        """
+        Args:
+            max_workers (int, optional): Number of worker threads
+        """
+        self.progress_queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="pdf-job",
+            initializer=_init_worker,
+            initargs=(self.progress_queue,),
+        )
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class Job:
+    """State of a single queued operation."""
+
+    def __init__(self, job_id, kind, work_dir):
+        self.id = job_id
+        self.kind = kind
+        self.work_dir = work_dir
+        self.input_dir = os.path.join(work_dir, "input")
+        self.status = JOB_QUEUED
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        # Structured details of the error, e.g. per-file pre-flight reports
+        self.error_details = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.persisted_at = 0.0
+        # Called with the result in the accepting process before the job is done
+        self.on_result = None
+
+    def to_dict(self):
+        """Serialize the job for status responses."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+            "error_details": self.error_details,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Track jobs and dispatch them to a backend with a bounded queue.
+
+    The bound applies to the jobs of this manager, i.e. per app worker
+    process.
+    """
+
+    def __init__(self, backend, jobs_dir, max_queue_depth=16, result_ttl=3600):
+        """
+        Args:
+            backend (JobBackend): Executor for job functions
+            jobs_dir (str): Directory holding per-job inputs and status files
+            max_queue_depth (int): Maximum queued plus running jobs of
+                this manager
+            result_ttl (int): Seconds finished jobs are kept
+        """
+        self.backend = backend
+        self.jobs_dir = jobs_dir
+        self.max_queue_depth = max_queue_depth
+        self.result_ttl = result_ttl
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._next_scan = 0.0
+
+    def create(self, kind):
+        """
+        Reserve a queue slot and a working directory for a new job.
+
+        Args:
+            kind (str): Operation name (e.g., 'join', 'split')
+
+        Returns:
+            Job: The new job, not yet started
+
+        Raises:
+            JobQueueFull: Too many jobs are queued or running
+        """
+        self._prune()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status in (JOB_QUEUED, JOB_RUNNING))
+            if active >= self.max_queue_depth:
+                raise JobQueueFull()
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, kind, os.path.join(self.jobs_dir, job_id))
+            self._jobs[job_id] = job
+
+        os.makedirs(job.input_dir, exist_ok=True)
+        self._persist(job, force=True)
+        return job
+
+    def start(self, job, fn, *args):
+        """
+        Submit a created job to the backend.
+
+        Args:
+            job (Job): Job returned by create()
+            fn (callable): Job function, called as fn(job.id, *args)
+        """
+        self._ensure_listener()
+        future = self.backend.submit(fn, job.id, *args)
+        future.add_done_callback(lambda f: self._finish(job, f))
+
+    def discard(self, job):
+        """Forget a job that could not be started."""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def get(self, job_id):
+        """
+        Look up a job's status.
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            dict or None: Serialized job, or None if unknown
+        """
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+
+        # Accepted by another worker process
+        try:
+            with open(os.path.join(self.jobs_dir, job_id, "status.json")) as status_file:
+                return json.load(status_file)
+        except (OSError, ValueError):
+            return None
+
+    def _finish(self, job, future):
+        """Record the outcome of a job (runs in an executor thread)."""
+        error = future.exception()
+        if error is None and job.on_result is not None:
+            try:
+                job.on_result(future.result())
+            except Exception as e:
+                error = e
+        with self._lock:
+            if error is None:
+                job.status = JOB_DONE
+                job.result = dict(future.result() or {})
+                # Progress messages may still be in flight; the result is final
+                job.total = job.result.pop("progress_total", job.total)
+                if job.total is not None:
+                    job.done = job.total
+            else:
+                job.status = JOB_FAILED
+                job.error = str(error)
+                job.error_details = getattr(error, "reports", None)
+            job.finished_at = time.time()
+
+        if error is not None:
+            logging.error(f"Job {job.id} ({job.kind}) failed: {error}")
+        shutil.rmtree(job.input_dir, ignore_errors=True)
+        self._persist(job, force=True)
+
+    def _ensure_listener(self):
+        """Start the progress listener thread if needed."""
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="pdf-job-progress", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        """Apply progress messages reported by workers."""
+        while True:
+            message = self.backend.progress_queue.get()
+            if message is None:
+                break
+            job_id, done, total = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                    continue
+                job.status = JOB_RUNNING
+                job.done = done
+                if total is not None:
+                    job.total = total
+            self._persist(job, force=done == 0)
+
+    def _persist(self, job, force=False):
+        """Mirror job state to its status.json file."""
+        now = time.time()
+        with self._lock:
+            if not force and now - job.persisted_at < PROGRESS_PERSIST_INTERVAL:
+                return
+            job.persisted_at = now
+            data = job.to_dict()
+
+        status_path = os.path.join(job.work_dir, "status.json")
+        tmp_path = f"{status_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as status_file:
+                json.dump(data, status_file)
+            os.replace(tmp_path, status_path)
+        except OSError as e:
+            logging.warning(f"Could not persist status of job {job.id}: {e}")
+
+    def _prune(self):
+        """Drop finished jobs older than result_ttl, then those of other processes."""
+        now = time.time()
+        cutoff = now - self.result_ttl
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+            scan = now >= self._next_scan
+            if scan:
+                self._next_scan = now + JOBS_DIR_SCAN_INTERVAL
+            tracked = list(self._jobs)
+        for job in expired:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+        if scan:
+            prune_job_dirs(self.jobs_dir, self.result_ttl, keep=tracked, now=now)
+
+    def shutdown(self, wait=True):
+        """Stop the backend and the progress listener."""
+        self.backend.shutdown(wait=wait)
+        if self._listener is not None and self._listener.is_alive():
+            self.backend.progress_queue.put(None)
+            self._listener.join(timeout=5)
+
+
+def init_jobs(app):
+    """
+    Attach a job manager to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    if app.config["JOB_BACKEND"] == "thread":
+        backend = ThreadPoolBackend(max_workers=app.config["JOB_WORKERS"])
+    else:
+        backend = ProcessPoolBackend(max_workers=app.config["JOB_WORKERS"])
+
+    app.job_manager = JobManager(
+        backend,
+        jobs_dir=os.path.join(app.config["UPLOAD_FOLDER"], "jobs"),
+        max_queue_depth=app.config["JOB_QUEUE_DEPTH"],
+        result_ttl=app.config["JOB_RESULT_TTL"],
+    )
+    return app.job_manager
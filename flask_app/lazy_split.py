@@ -0,0 +1,193 @@
+"""
+Lazy split for Flask PDF Tools.
+"""
+
+import json
+import os
+import shutil
+from contextlib import closing
+from io import BytesIO
+
+from flask_app.pdf_ops import extract_pages, split_output_filename
+from flask_app.result_cache import CachedPage, ResultCache, page_key
+
+SOURCE_SUFFIX = ".source.pdf"
+MANIFEST_SUFFIX = ".split.json"
+
+
+def is_internal_file(filename):
+    """Whether filename is the stored source or manifest of a lazy split."""
+    return filename.endswith((SOURCE_SUFFIX, MANIFEST_SUFFIX))
+
+
+class LazySplit:
+    """Manifest of a split session whose outputs are built on download."""
+
+    def __init__(self, session_id, source, digest, outputs, source_key=None):
+        """
+        Args:
+            session_id (str): Split session identifier
+            source (str): Filename of the stored source in the session
+            digest (str): Content hash of the source
+            outputs (list): (filename, first, last) per output, in order
+            source_key (str, optional): Storage key of the source
+        """
+        self.session_id = session_id
+        self.source = source
+        self.digest = digest
+        self.outputs = outputs
+        self.source_key = source_key
+        self._ranges = {name: (first, last) for name, first, last in outputs}
+
+    @property
+    def files(self):
+        """Output filenames in output order."""
+        return [name for name, _, _ in self.outputs]
+
+    @property
+    def pages(self):
+        """Total number of pages over all outputs."""
+        return sum(last - first + 1 for _, first, last in self.outputs)
+
+    def page_range(self, filename):
+        """(first, last) of an output, or None if filename is not one."""
+        return self._ranges.get(filename)
+
+    def to_dict(self):
+        return {
+            "session": self.session_id,
+            "source": self.source,
+            "digest": self.digest,
+            "outputs": [list(output) for output in self.outputs],
+        }
+
+    @classmethod
+    def from_dict(cls, data, source_key=None):
+        return cls(
+            data["session"], data["source"], data["digest"],
+            [tuple(output) for output in data["outputs"]], source_key=source_key,
+        )
+
+    @classmethod
+    def create(cls, expiry_index, bucket, session_id, base_name, source, ranges, digest):
+        """
+        Store the source and manifest of a new lazy split session.
+
+        Args:
+            expiry_index (ExpiryIndex): Index the session is registered in
+            bucket (str): Bucket returned by expiry_index.new_bucket()
+            session_id (str): Split session identifier
+            base_name (str): Sanitized base name of the source document
+            source: Path or seekable binary file object of the document
+            ranges (list): (first, last) page ranges, see pdf_ops.plan_split
+            digest (str): Content hash of the source
+
+        Returns:
+            LazySplit: The registered session
+        """
+        output_dir = expiry_index.output_dir(bucket, session_id)
+        source_name = f"{session_id}_{base_name}{SOURCE_SUFFIX}"
+        with open(os.path.join(output_dir, source_name), "wb") as target:
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, "rb") as source_file:
+                    shutil.copyfileobj(source_file, target)
+            else:
+                source.seek(0)
+                shutil.copyfileobj(source, target)
+                source.seek(0)
+
+        outputs = [
+            (split_output_filename(session_id, base_name, first, last), first, last)
+            for first, last in ranges
+        ]
+        split = cls(session_id, source_name, digest, outputs)
+        manifest_name = f"{session_id}_{base_name}{MANIFEST_SUFFIX}"
+        with open(os.path.join(output_dir, manifest_name), "w", encoding="utf-8") as manifest_file:
+            json.dump(split.to_dict(), manifest_file)
+
+        expiry_index.register(bucket, [source_name, manifest_name], session=session_id)
+        split.source_key = expiry_index.storage.key(bucket, session_id, source_name)
+        return split
+
+    @classmethod
+    def load(cls, expiry_index, session_id):
+        """
+        Load the manifest of a lazy split session.
+
+        Returns:
+            LazySplit or None: None for unknown, expired or eager sessions
+        """
+        files = dict(expiry_index.session_files(session_id))
+        manifest_key = next((key for name, key in files.items() if name.endswith(MANIFEST_SUFFIX)), None)
+        if manifest_key is None:
+            return None
+        try:
+            with closing(expiry_index.storage.open(manifest_key)) as manifest_file:
+                data = json.loads(manifest_file.read())
+        except FileNotFoundError:
+            return None
+        return cls.from_dict(data, source_key=files.get(data["source"]))
+
+    def render(self, filename, storage, page_cache=None, reader_cache=None, compress_streams=False, pool=None):
+        """
+        Build one output, or take it from the page cache.
+
+        Args:
+            filename (str): Output filename
+            storage (ResultStorage): Storage holding the source
+            page_cache (ResultCache, optional): Recently generated outputs
+            reader_cache (ReaderCache, optional): Cache of parsed documents
+            compress_streams (bool): Flate-encode unfiltered streams
+            pool (PdfPool, optional): Pool the output is built in
+
+        Returns:
+            bytes or None: PDF data, or None if filename is not an output
+
+        Raises:
+            FileNotFoundError: The stored source is gone
+            PageWriteError: The output could not be written
+        """
+        page_range = self.page_range(filename)
+        if page_range is None:
+            return None
+        if self.source_key is None:
+            raise FileNotFoundError(self.source)
+
+        key = page_key(self.digest, *page_range)
+        cached = page_cache.get(key) if page_cache is not None and page_cache.enabled else None
+        if cached is not None:
+            return cached.data
+
+        source = storage.local_path(self.source_key)
+        if source is None:
+            with closing(storage.open(self.source_key)) as source_file:
+                source = BytesIO(source_file.read())
+        elif not os.path.exists(source):
+            raise FileNotFoundError(source)
+
+        output = BytesIO()
+        options = dict(
+            filename=self.source, reader_cache=reader_cache, digest=self.digest, compress_streams=compress_streams
+        )
+        if pool is not None:
+            pool.write(output, extract_pages, pool.source(source), *page_range, **options)
+        else:
+            extract_pages(source, *page_range, output, **options)
+        data = output.getvalue()
+        if page_cache is not None and page_cache.enabled:
+            page_cache.put(key, CachedPage(data))
+        return data
+
+
+def init_lazy_split(app):
+    """
+    Attach the cache of generated lazy split outputs to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.page_cache = ResultCache(
+        max_bytes=app.config["SPLIT_PAGE_CACHE_SIZE"] * 1024 * 1024,
+        ttl=app.config["CLEANUP_INTERVAL"],
+    )
+    return app.page_cache
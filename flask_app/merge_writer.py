@@ -0,0 +1,269 @@
+"""
+Streaming PDF writer for bounded-memory merges.
+"""
+
+from collections import deque
+from io import BytesIO
+
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject, create_string_object
+
+from flask_app.pdf_dedup import WriteStats, compress_data, compressible, stream_digest
+
+PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+# Reserved object numbers, written last
+PAGES_OBJECT = 1
+CATALOG_OBJECT = 2
+# Page keys that point into the source document's page or structure tree
+PAGE_EXCLUDED_KEYS = ("/Parent", "/StructParents")
+
+
+class StreamingPdfWriter:
+    """Write pages of several documents to one PDF, one document at a time."""
+
+    def __init__(self, stream, compress_streams=False, stats=None):
+        """
+        Args:
+            stream: Writable binary file object; written sequentially
+            compress_streams (bool): Flate-encode unfiltered streams
+            stats (WriteStats, optional): Receives the bytes saved
+        """
+        self._stream = stream
+        self._compress_streams = compress_streams
+        self.stats = stats if stats is not None else WriteStats()
+        # Stream digest -> object number, over all documents
+        self._streams = {}
+        self._position = 0
+        # Byte offset of each object, indexed by object number - 1
+        self._offsets = [None, None]
+        self._kids = []
+        # Bookmarks as (title, destination, children), serialized
+        self._outline = []
+        # Named destination -> serialized destination array
+        self._dests = {}
+        self._write(PDF_HEADER)
+
+    @property
+    def pages(self):
+        """Number of pages written so far."""
+        return len(self._kids)
+
+    def add_document(self, reader):
+        """
+        Write all pages of a document and everything they reference.
+
+        Args:
+            reader (PdfReader): Parsed source document; not modified and no
+                longer needed once this returns
+
+        Returns:
+            int: Number of pages added
+        """
+        # (idnum, generation) in the source -> object number in the output
+        numbers = {}
+        pending = deque()
+        # Streams being hashed, whose number is not known yet
+        hashing = set()
+
+        def renumber(reference):
+            key = (reference.idnum, reference.generation)
+            number = numbers.get(key)
+            if number is not None:
+                return number
+            obj = reference.get_object()
+            digest = None
+            if isinstance(obj, StreamObject):
+                # Number what the stream refers to first, so equal streams
+                # of different documents hash equal
+                hashing.add(key)
+                digest = stream_digest(
+                    obj, lambda ref: None if (ref.idnum, ref.generation) in hashing else renumber(ref)
+                )
+                hashing.discard(key)
+                number = self._streams.get(digest) if digest is not None else None
+                if number is not None:
+                    self.stats.add_duplicate(len(obj._data))
+                    numbers[key] = number
+                    return number
+            number = numbers[key] = self._allocate()
+            if digest is not None:
+                self._streams[digest] = number
+            pending.append((number, obj, False))
+            return number
+
+        added = 0
+        for page in reader.pages:
+            # Pages carry their inherited attributes after flattening, so
+            # they are written from the page objects, not their references
+            number = self._allocate()
+            if page.indirect_reference is not None:
+                numbers[(page.indirect_reference.idnum, page.indirect_reference.generation)] = number
+            pending.append((number, page, True))
+            self._kids.append(number)
+            added += 1
+
+        self._outline.extend(self._collect_outline(reader.outline, numbers))
+        for name, dest in reader.named_destinations.items():
+            array = self._destination(dest, numbers)
+            if array is not None:
+                self._dests.setdefault(name, array)
+
+        while pending:
+            number, obj, is_page = pending.popleft()
+            if isinstance(obj, IndirectObject):
+                obj = obj.get_object()
+            body = BytesIO()
+            if is_page:
+                self._serialize_page(obj, body, renumber)
+            else:
+                self._serialize(obj, body, renumber)
+            self._write_object(number, body.getvalue())
+        return added
+
+    def close(self):
+        """Write the outline, page tree, catalog, cross-reference table and trailer."""
+        kids = b" ".join(b"%d 0 R" % number for number in self._kids)
+        self._write_object(
+            PAGES_OBJECT, b"<< /Type /Pages /Kids [ %s ] /Count %d >>" % (kids, len(self._kids))
+        )
+        catalog = [b"/Type /Catalog /Pages %d 0 R" % PAGES_OBJECT]
+        if self._outline:
+            root = self._allocate()
+            first, last, count = self._write_outline(self._outline, root)
+            self._write_object(
+                root, b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>" % (first, last, count)
+            )
+            catalog.append(b"/Outlines %d 0 R" % root)
+        if self._dests:
+            names = b" ".join(
+                _serialize_direct(create_string_object(name)) + b" " + array
+                for name, array in sorted(self._dests.items())
+            )
+            catalog.append(b"/Names << /Dests << /Names [ %s ] >> >>" % names)
+        self._write_object(CATALOG_OBJECT, b"<< %s >>" % b" ".join(catalog))
+
+        xref = self._position
+        table = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1)]
+        table.extend(b"%010d 00000 n \n" % offset for offset in self._offsets)
+        table.append(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets) + 1, CATALOG_OBJECT, xref)
+        )
+        self._write(b"".join(table))
+
+    def _collect_outline(self, items, numbers):
+        """Serialize an outline as returned by PdfReader.outline while its pages are numbered."""
+        entries = []
+        for item in items:
+            if isinstance(item, list):
+                # A nested list holds the children of the item before it
+                children = self._collect_outline(item, numbers)
+                (entries[-1][2] if entries else entries).extend(children)
+                continue
+            entries.append((_serialize_direct(create_string_object(item.title)), self._destination(item, numbers), []))
+        return entries
+
+    @staticmethod
+    def _destination(dest, numbers):
+        """Destination array pointing at the output page, or None if the page was not written."""
+        page = dest.raw_get("/Page")
+        if not isinstance(page, IndirectObject):
+            return None
+        number = numbers.get((page.idnum, page.generation))
+        if number is None:
+            return None
+        return b"[%d 0 R %s ]" % (number, b" ".join(_serialize_direct(item) for item in dest.dest_array[1:]))
+
+    def _write_outline(self, entries, parent):
+        """
+        Write one level of outline items and their children.
+
+        Returns:
+            tuple: (first object number, last object number, open item count)
+        """
+        numbers = [self._allocate() for _ in entries]
+        count = len(entries)
+        for index, (title, dest, children) in enumerate(entries):
+            body = [b"/Title %s /Parent %d 0 R" % (title, parent)]
+            if index > 0:
+                body.append(b"/Prev %d 0 R" % numbers[index - 1])
+            if index < len(entries) - 1:
+                body.append(b"/Next %d 0 R" % numbers[index + 1])
+            if dest is not None:
+                body.append(b"/Dest %s" % dest)
+            if children:
+                first, last, descendants = self._write_outline(children, numbers[index])
+                body.append(b"/First %d 0 R /Last %d 0 R /Count %d" % (first, last, descendants))
+                count += descendants
+            self._write_object(numbers[index], b"<< %s >>" % b" ".join(body))
+        return numbers[0], numbers[-1], count
+
+    def _allocate(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _write(self, data):
+        self._stream.write(data)
+        self._position += len(data)
+
+    def _write_object(self, number, body):
+        self._offsets[number - 1] = self._position
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+    def _serialize_page(self, page, out, renumber):
+        out.write(b"<<\n/Parent %d 0 R\n" % PAGES_OBJECT)
+        for key, value in page.items():
+            if key in PAGE_EXCLUDED_KEYS:
+                continue
+            key.write_to_stream(out, None)
+            out.write(b" ")
+            self._serialize(value, out, renumber)
+            out.write(b"\n")
+        out.write(b">>")
+
+    def _serialize(self, obj, out, renumber):
+        """Write a direct object, rewriting indirect references."""
+        if isinstance(obj, IndirectObject):
+            out.write(b"%d 0 R" % renumber(obj))
+        elif isinstance(obj, StreamObject):
+            # Raw, still encoded stream bytes; /Length is recomputed
+            data = obj._data
+            compressed = compress_data(data) if self._compress_streams and compressible(obj) else None
+            if compressed is not None:
+                self.stats.compressed_bytes += len(data) - len(compressed)
+                data = compressed
+                out.write(b"<<\n/Filter /FlateDecode\n")
+            else:
+                out.write(b"<<\n")
+            for key, value in obj.items():
+                if key == "/Length":
+                    continue
+                key.write_to_stream(out, None)
+                out.write(b" ")
+                self._serialize(value, out, renumber)
+                out.write(b"\n")
+            out.write(b"/Length %d\n>>\nstream\n" % len(data))
+            out.write(data)
+            out.write(b"\nendstream")
+        elif isinstance(obj, DictionaryObject):
+            out.write(b"<<\n")
+            for key, value in obj.items():
+                key.write_to_stream(out, None)
+                out.write(b" ")
+                self._serialize(value, out, renumber)
+                out.write(b"\n")
+            out.write(b">>")
+        elif isinstance(obj, ArrayObject):
+            out.write(b"[")
+            for item in obj:
+                out.write(b" ")
+                self._serialize(item, out, renumber)
+            out.write(b" ]")
+        else:
+            obj.write_to_stream(out, None)
+
+
+def _serialize_direct(obj):
+    """Bytes of a direct object without references."""
+    out = BytesIO()
+    obj.write_to_stream(out, None)
+    return out.getvalue()
@@ -0,0 +1,216 @@
+"""
+Shared-resource deduplication for Flask PDF Tools.
+"""
+
+import hashlib
+import zlib
+from io import BytesIO
+
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, EncodedStreamObject, IndirectObject, NameObject, NullObject, StreamObject,
+)
+
+
+class WriteStats:
+    """Bytes saved while writing the outputs of one operation."""
+
+    def __init__(self):
+        self.duplicates = 0
+        self.deduplicated_bytes = 0
+        self.compressed_bytes = 0
+
+    @property
+    def bytes_saved(self):
+        return self.deduplicated_bytes + self.compressed_bytes
+
+    def add_duplicate(self, size):
+        self.duplicates += 1
+        self.deduplicated_bytes += size
+
+    def add(self, other):
+        """Add the figures of another WriteStats, e.g. from a pool worker."""
+        self.duplicates += other.duplicates
+        self.deduplicated_bytes += other.deduplicated_bytes
+        self.compressed_bytes += other.compressed_bytes
+
+    def __str__(self):
+        return (
+            f"{self.bytes_saved} bytes saved ({self.duplicates} duplicate streams, "
+            f"{self.compressed_bytes} bytes by compression)"
+        )
+
+
+def _write_canonical(obj, out, reference_id):
+    """Write obj with sorted keys and references replaced; False if impossible."""
+    if isinstance(obj, IndirectObject):
+        number = reference_id(obj) if reference_id else None
+        if number is None:
+            return False
+        out.write(b"%d R" % number)
+    elif isinstance(obj, DictionaryObject):
+        out.write(b"<<")
+        for key in sorted(obj):
+            out.write(key.encode("utf-8", "surrogateescape") + b" ")
+            if not _write_canonical(obj.raw_get(key), out, reference_id):
+                return False
+        out.write(b">>")
+    elif isinstance(obj, ArrayObject):
+        out.write(b"[")
+        for item in obj:
+            if not _write_canonical(item, out, reference_id):
+                return False
+            out.write(b" ")
+        out.write(b"]")
+    else:
+        obj.write_to_stream(out, None)
+    return True
+
+
+def stream_digest(stream, reference_id=None):
+    """
+    Content hash of a stream object.
+
+    Args:
+        stream (StreamObject): Stream to hash
+        reference_id (callable, optional): Maps an IndirectObject in the
+            stream dictionary to the number of the object it stands for in
+            the output, or None if that is not known
+
+    Returns:
+        bytes or None: Digest, or None if the stream cannot be compared
+    """
+    data = stream._data
+    if not isinstance(data, bytes):
+        return None
+    out = BytesIO()
+    for key in sorted(stream):
+        if key == "/Length":
+            continue
+        out.write(key.encode("utf-8", "surrogateescape") + b" ")
+        if not _write_canonical(stream.raw_get(key), out, reference_id):
+            return None
+    digest = hashlib.sha256(out.getvalue())
+    digest.update(b"stream")
+    digest.update(data)
+    return digest.digest()
+
+
+def compressible(stream):
+    """Whether a stream is stored unfiltered and may be Flate-encoded."""
+    return (
+        "/Filter" not in stream
+        and stream.get("/Type") != "/Metadata"
+        and isinstance(stream._data, bytes)
+    )
+
+
+def compress_data(data):
+    """Flate-encoded data, or None if encoding does not make it smaller."""
+    compressed = zlib.compress(data)
+    return compressed if len(compressed) < len(data) else None
+
+
+def _rewrite_references(obj, replaced, writer):
+    """Point references to duplicates inside a direct object at their copy."""
+    if isinstance(obj, DictionaryObject):
+        items = [(key, obj.raw_get(key)) for key in obj]
+        for key, value in items:
+            if isinstance(value, IndirectObject) and value.pdf is writer and value.idnum in replaced:
+                obj[key] = IndirectObject(replaced[value.idnum], 0, writer)
+            else:
+                _rewrite_references(value, replaced, writer)
+    elif isinstance(obj, ArrayObject):
+        for index, value in enumerate(obj):
+            if isinstance(value, IndirectObject) and value.pdf is writer and value.idnum in replaced:
+                obj[index] = IndirectObject(replaced[value.idnum], 0, writer)
+            else:
+                _rewrite_references(value, replaced, writer)
+
+
+def deduplicate_writer(writer, stats=None):
+    """
+    Write identical streams of a PdfWriter once.
+
+    Duplicates are replaced by null objects, which keeps the numbering of
+    the writer intact, and references to them are rewritten. Pages must
+    already be added to the writer.
+
+    Args:
+        writer (PdfWriter): Writer about to be written
+        stats (WriteStats, optional): Receives the bytes saved
+    """
+    objects = writer._objects
+    replaced = {}
+
+    def canonical(idnum):
+        while idnum in replaced:
+            idnum = replaced[idnum]
+        return idnum
+
+    def reference_id(reference):
+        return canonical(reference.idnum) if reference.pdf is writer else None
+
+    # Deduplicating streams can make the streams referencing them identical
+    while True:
+        first_seen = {}
+        found = {}
+        for index, obj in enumerate(objects):
+            idnum = index + 1
+            if not isinstance(obj, StreamObject) or idnum in replaced:
+                continue
+            digest = stream_digest(obj, reference_id)
+            if digest is None:
+                continue
+            original = first_seen.setdefault(digest, idnum)
+            if original != idnum:
+                found[idnum] = original
+        if not found:
+            break
+        for idnum, original in found.items():
+            if stats is not None:
+                stats.add_duplicate(len(objects[idnum - 1]._data))
+            objects[idnum - 1] = NullObject()
+            replaced[idnum] = original
+
+    if replaced:
+        replaced = {idnum: canonical(idnum) for idnum in replaced}
+        for obj in objects:
+            _rewrite_references(obj, replaced, writer)
+
+
+def compress_writer_streams(writer, stats=None):
+    """
+    Flate-encode the unfiltered streams of a PdfWriter.
+
+    Args:
+        writer (PdfWriter): Writer about to be written
+        stats (WriteStats, optional): Receives the bytes saved
+    """
+    objects = writer._objects
+    for index, obj in enumerate(objects):
+        if not isinstance(obj, StreamObject) or not compressible(obj):
+            continue
+        compressed = compress_data(obj._data)
+        if compressed is None:
+            continue
+        encoded = EncodedStreamObject()
+        encoded.update(obj)
+        encoded[NameObject("/Filter")] = NameObject("/FlateDecode")
+        encoded._data = compressed
+        objects[index] = encoded
+        if stats is not None:
+            stats.compressed_bytes += len(obj._data) - len(compressed)
+
+
+def optimize_writer(writer, compress_streams=False, stats=None):
+    """
+    Deduplicate, and optionally compress, the streams of a PdfWriter.
+
+    Args:
+        writer (PdfWriter): Writer about to be written
+        compress_streams (bool): Flate-encode unfiltered streams
+        stats (WriteStats, optional): Receives the bytes saved
+    """
+    deduplicate_writer(writer, stats)
+    if compress_streams:
+        compress_writer_streams(writer, stats)
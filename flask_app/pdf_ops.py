@@ -0,0 +1,647 @@
+"""
+PDF merge and split operations for Flask PDF Tools.
+
+These functions hold all PyPDF2 work and do not depend on Flask, so they
+can run inside request handlers as well as in background job workers.
+Exceptions keep their constructor arguments in ``args`` so they survive
+pickling across process boundaries.
+
+Sources given as paths are read through a memory map (MappedFile): PyPDF2
+would otherwise read the whole file into memory, while a map only faults in
+the pages the parser touches and shares them, through the page cache, with
+every process reading the same file.
+
+Every output goes through the shared-resource deduplication of
+flask_app.pdf_dedup; functions taking a ``stats`` WriteStats add the bytes
+it saved to it.
+"""
+
+import io
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.errors import PdfReadError
+
+from flask_app.merge_writer import StreamingPdfWriter
+from flask_app.pdf_dedup import WriteStats, optimize_writer
+from flask_app.split_spec import SPLIT_MODE_PAGES, parse_selection, resolve_ranges
+
+# Below this page count a split is not worth dispatching to the process pool
+PARALLEL_SPLIT_MIN_PAGES = 8
+
+SPLIT_OUTPUT_RANGE_PATTERN = re.compile(r"_pages?_(\d+)(?:-(\d+))?\.pdf$")
+
+_split_pool = None
+_split_pool_workers = None
+_split_pool_pid = None
+_split_pool_lock = threading.Lock()
+
+
+class PdfOperationError(Exception):
+    """Base class for errors raised by PDF operations."""
+
+
+class InvalidPdfError(PdfOperationError):
+    """A source document could not be parsed as a PDF."""
+
+    def __init__(self, filename, reason=""):
+        super().__init__(filename, reason)
+        self.filename = filename
+        self.reason = reason
+
+    def __str__(self):
+        return f"Invalid PDF: {self.filename}"
+
+
+class PdfSourceError(PdfOperationError):
+    """A source document could not be read for another reason."""
+
+    def __init__(self, filename, reason=""):
+        super().__init__(filename, reason)
+        self.filename = filename
+        self.reason = reason
+
+    def __str__(self):
+        return f"Error reading PDF: {self.filename}"
+
+
+class EmptyPdfError(PdfOperationError):
+    """A source document has no pages."""
+
+    def __str__(self):
+        return "PDF has no pages."
+
+
+class MergeBudgetError(PdfOperationError):
+    """A source document alone is larger than the merge memory budget."""
+
+    def __init__(self, filename, size, budget):
+        super().__init__(filename, size, budget)
+        self.filename = filename
+        self.size = size
+        self.budget = budget
+
+    def __str__(self):
+        return f"File too large to merge: {self.filename}"
+
+
+class PageWriteError(PdfOperationError):
+    """A single output page could not be written."""
+
+    def __init__(self, page_number, reason=""):
+        super().__init__(page_number, reason)
+        self.page_number = page_number
+        self.reason = reason
+
+    def __str__(self):
+        return f"Error splitting page {self.page_number}."
+
+
+class MappedFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over a memory map of a whole file.
+
+    Unlike a bare mmap, seek() returns the new position and closing the
+    file releases the map.
+    """
+
+    mode = "rb"
+
+    def __init__(self, fileno, name=None):
+        """
+        Args:
+            fileno (int): Open file descriptor; the map keeps its own
+                duplicate, so the caller may close it
+            name (str, optional): Path of the mapped file
+        """
+        super().__init__()
+        self.name = name
+        self._size = os.fstat(fileno).st_size
+        # Empty files cannot be mapped
+        self._map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if self._size else None
+        self._position = 0
+
+    @classmethod
+    def open(cls, path):
+        """Map the file at path."""
+        with open(path, "rb") as source_file:
+            return cls(source_file.fileno(), name=os.fspath(path))
+
+    def __len__(self):
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        self._checkClosed()
+        end = self._size if size is None or size < 0 else min(self._size, self._position + size)
+        if end <= self._position:
+            return b""
+        data = self._map[self._position:end]
+        self._position = end
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def write(self, data):
+        raise io.UnsupportedOperation("MappedFile is read-only")
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def tell(self):
+        self._checkClosed()
+        return self._position
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        super().close()
+
+
+def split_output_filename(session_id, base_name, first_page, last_page=None):
+    """Build the output filename for a split page or page range."""
+    if last_page is None or last_page == first_page:
+        return f"{session_id}_{base_name}_page_{first_page}.pdf"
+    return f"{session_id}_{base_name}_pages_{first_page}-{last_page}.pdf"
+
+
+def split_output_range(filename):
+    """
+    Recover the (first, last) page range from a split output filename.
+
+    Returns:
+        tuple or None: Page range, or None if the name is not a split output
+    """
+    match = SPLIT_OUTPUT_RANGE_PATTERN.search(filename)
+    if not match:
+        return None
+    first = int(match.group(1))
+    return first, int(match.group(2) or first)
+
+
+@contextmanager
+def _open_reader(source, reader_cache=None, digest=None):
+    """Parse a source, or borrow its reader from the parsed-document cache."""
+    if reader_cache is None or digest is None:
+        if isinstance(source, (str, os.PathLike)):
+            with MappedFile.open(source) as mapped:
+                yield PdfReader(mapped)
+        else:
+            yield PdfReader(source)
+    else:
+        with reader_cache.reader(digest, source) as reader:
+            yield reader
+
+
+def _source_size(source):
+    """Size in bytes of a path or seekable binary file object."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(0)
+    return size
+
+
+@contextmanager
+def _open_output(output):
+    """Open an output path for writing, or use a file object as is."""
+    if isinstance(output, (str, os.PathLike)):
+        try:
+            with open(output, "wb") as output_file:
+                yield output_file
+        except BaseException:
+            # Do not leave a truncated document behind
+            os.remove(output)
+            raise
+    else:
+        yield output
+
+
+def merge_pdfs(sources, output, progress=None, reader_cache=None, digests=None, memory_budget=None,
+               compress_streams=False, stats=None):
+    """
+    Merge PDF documents in order.
+
+    Pages are appended from parsed readers, so documents already parsed by
+    an earlier request can come from the reader cache.
+
+    Without a memory budget, or when all sources together fit in it, every
+    reader is kept until the output is written by PdfWriter. Larger merges
+    go through StreamingPdfWriter: each source is parsed, written out and
+    released before the next one, so memory stays bounded by the largest
+    source. Both carry over bookmarks and named destinations.
+
+    Args:
+        sources (list): (filename, path or binary file object) pairs
+        output: Output path or writable binary file object
+        progress (callable, optional): Called as progress(done, total)
+            after each source has been appended
+        reader_cache (ReaderCache, optional): Cache of parsed documents,
+            see flask_app.reader_cache
+        digests (list, optional): Content hash of each source, used as
+            reader cache keys
+        memory_budget (int, optional): Bytes of parsed input a merge may
+            hold at once; input size is used as the estimate
+        compress_streams (bool): Flate-encode unfiltered streams
+        stats (WriteStats, optional): Receives the bytes saved
+
+    Returns:
+        int: Number of pages in the merged document
+
+    Raises:
+        InvalidPdfError: A source is not a valid PDF
+        PdfSourceError: A source could not be read
+        MergeBudgetError: A single source exceeds the memory budget
+    """
+    if memory_budget:
+        sizes = [_source_size(source) for _, source in sources]
+        for (filename, _), size in zip(sources, sizes):
+            if size > memory_budget:
+                raise MergeBudgetError(filename, size, memory_budget)
+        if sum(sizes) > memory_budget:
+            return _merge_streaming(sources, output, progress, reader_cache, digests, compress_streams, stats)
+
+    writer = PdfWriter()
+    # Readers stay borrowed until the output is written
+    with ExitStack() as readers:
+        total = len(sources)
+        for done, (filename, source) in enumerate(sources, start=1):
+            digest = digests[done - 1] if digests else None
+            try:
+                writer.append(readers.enter_context(_open_reader(source, reader_cache, digest)))
+            except PdfReadError as e:
+                raise InvalidPdfError(filename, str(e)) from e
+            except Exception as e:
+                raise PdfSourceError(filename, str(e)) from e
+            if progress:
+                progress(done, total)
+
+        optimize_writer(writer, compress_streams, stats)
+        with _open_output(output) as stream:
+            writer.write(stream)
+        return len(writer.pages)
+
+
+def _merge_streaming(sources, output, progress=None, reader_cache=None, digests=None, compress_streams=False,
+                     stats=None):
+    """Merge one source at a time, releasing each reader once written."""
+    with _open_output(output) as stream:
+        writer = StreamingPdfWriter(stream, compress_streams, stats)
+        total = len(sources)
+        for done, (filename, source) in enumerate(sources, start=1):
+            digest = digests[done - 1] if digests else None
+            try:
+                with _open_reader(source, reader_cache, digest) as reader:
+                    writer.add_document(reader)
+            except PdfReadError as e:
+                raise InvalidPdfError(filename, str(e)) from e
+            except Exception as e:
+                raise PdfSourceError(filename, str(e)) from e
+            if progress:
+                progress(done, total)
+        writer.close()
+        return writer.pages
+
+
+def _get_split_pool(workers):
+    """Return the process pool for parallel splits, creating it on first use."""
+    global _split_pool, _split_pool_workers, _split_pool_pid
+    with _split_pool_lock:
+        if _split_pool is None or _split_pool_workers != workers or _split_pool_pid != os.getpid():
+            if _split_pool is not None and _split_pool_pid == os.getpid():
+                _split_pool.shutdown(wait=False)
+            _split_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _split_pool_workers = workers
+            _split_pool_pid = os.getpid()
+        return _split_pool
+
+
+def _partition(items, parts):
+    """Partition items into at most `parts` contiguous, similarly sized groups."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    groups = []
+    start = 0
+    for index in range(parts):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(items[start:end])
+        start = end
+    return groups
+
+
+def _range_length(page_range):
+    """Number of pages in a (first, last) range."""
+    return page_range[1] - page_range[0] + 1
+
+
+def write_pages(reader, page_numbers, output, compress_streams=False, stats=None):
+    """
+    Write pages of reader (1-based, in the given order) to one output.
+
+    The pages go through a single writer, so objects they share in the
+    source (fonts, images) are written once, and so are identical copies
+    of the same stream.
+    """
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    optimize_writer(writer, compress_streams, stats)
+    writer.write(output)
+
+
+def write_page_range(reader, first, last, output, compress_streams=False, stats=None):
+    """Write pages first to last (1-based, inclusive) of reader to output."""
+    write_pages(reader, range(first, last + 1), output, compress_streams, stats)
+
+
+def _write_ranges(reader, ranges, output_dir, session_id, base_name, progress=None, total=None,
+                  compress_streams=False, stats=None):
+    """Write each (first, last) page range of reader to its own file."""
+    output_files = []
+    done = 0
+    for first, last in ranges:
+        try:
+            output_filename = split_output_filename(session_id, base_name, first, last)
+            with open(os.path.join(output_dir, output_filename), "wb") as output_file:
+                write_page_range(reader, first, last, output_file, compress_streams, stats)
+        except Exception as e:
+            raise PageWriteError(first, str(e)) from e
+
+        output_files.append(output_filename)
+        done += last - first + 1
+        if progress:
+            progress(done, total)
+    return output_files
+
+
+def _write_ranges_task(source_path, ranges, output_dir, session_id, base_name, compress_streams=False):
+    """Pool task: open the source once and write the given page ranges."""
+    stats = WriteStats()
+    with MappedFile.open(source_path) as source:
+        reader = PdfReader(source)
+        output_files = _write_ranges(
+            reader, ranges, output_dir, session_id, base_name,
+            compress_streams=compress_streams, stats=stats,
+        )
+    return output_files, stats
+
+
+def _split_parallel(source, ranges, output_dir, session_id, base_name, workers, progress=None,
+                    compress_streams=False, stats=None):
+    """Write output ranges concurrently, one contiguous group per worker."""
+    temp_path = None
+    if isinstance(source, (str, os.PathLike)):
+        source_path = os.fspath(source)
+    else:
+        # Workers need the source bytes; persist uploads once next to the output
+        source.seek(0)
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf", dir=output_dir)
+        with os.fdopen(fd, "wb") as temp_file:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                temp_file.write(chunk)
+        source_path = os.path.abspath(temp_path)
+
+    try:
+        pool = _get_split_pool(workers)
+        groups = _partition(ranges, workers)
+        futures = {
+            pool.submit(
+                _write_ranges_task, source_path, group,
+                os.path.abspath(output_dir), session_id, base_name, compress_streams,
+            ): index
+            for index, group in enumerate(groups)
+        }
+
+        total = sum(_range_length(page_range) for page_range in ranges)
+        results = {}
+        errors = []
+        done = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index], group_stats = future.result()
+            except PageWriteError as e:
+                errors.append(e)
+                continue
+            except Exception as e:
+                errors.append(PageWriteError(groups[index][0][0], str(e)))
+                continue
+            if stats is not None:
+                stats.add(group_stats)
+            done += sum(_range_length(page_range) for page_range in groups[index])
+            if progress:
+                progress(done, total)
+
+        if errors:
+            # Report the first failing page, as the serial loop would
+            raise min(errors, key=lambda error: error.page_number)
+
+        return [filename for index in sorted(results) for filename in results[index]]
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+
+def split_pdf_pages(source, output_dir, session_id, base_name, filename="", progress=None, workers=1,
+                    mode=SPLIT_MODE_PAGES, spec="", reader_cache=None, digest=None, compress_streams=False,
+                    stats=None):
+    """
+    Split a PDF document into one file per page or page range.
+
+    The source is parsed once; every output is built from that reader.
+
+    Args:
+        source: Path or binary file object of the document
+        output_dir (str): Directory the output files are written to
+        session_id (str): Unique prefix for this split operation
+        base_name (str): Sanitized base name of the source document
+        filename (str): Original filename, used in error messages
+        progress (callable, optional): Called as progress(done, total)
+            with the number of pages written so far
+        workers (int): Number of processes writing outputs concurrently;
+            1 writes serially in the calling process
+        mode (str): Split mode, see flask_app.split_spec
+        spec (str): Mode-specific specification (chunk size, ranges)
+        reader_cache (ReaderCache, optional): Cache of parsed documents,
+            see flask_app.reader_cache
+        digest (str, optional): Content hash of the source, used as the
+            reader cache key
+        compress_streams (bool): Flate-encode unfiltered streams
+        stats (WriteStats, optional): Receives the bytes saved over all
+            outputs
+
+    Returns:
+        list: Output filenames in output order
+
+    Raises:
+        InvalidPdfError: The source is not a valid PDF
+        EmptyPdfError: The source has no pages
+        SplitSpecError: The mode or spec does not fit the document
+        PageWriteError: An output could not be written
+    """
+    with ExitStack() as stack:
+        try:
+            reader = stack.enter_context(_open_reader(source, reader_cache, digest))
+            total_pages = len(reader.pages)
+        except PdfReadError as e:
+            raise InvalidPdfError(filename, str(e)) from e
+
+        if not total_pages:
+            raise EmptyPdfError()
+
+        ranges = resolve_ranges(mode, spec, reader, total_pages)
+        total = sum(_range_length(page_range) for page_range in ranges)
+
+        if workers > 1 and len(ranges) > 1 and total >= PARALLEL_SPLIT_MIN_PAGES:
+            return _split_parallel(
+                source, ranges, output_dir, session_id, base_name, workers, progress, compress_streams, stats
+            )
+
+        return _write_ranges(
+            reader, ranges, output_dir, session_id, base_name, progress, total, compress_streams, stats
+        )
+
+
+def plan_split(source, filename="", mode=SPLIT_MODE_PAGES, spec="", reader_cache=None, digest=None):
+    """
+    Resolve the page ranges a split would write, without writing them.
+
+    Args:
+        source: Path or binary file object of the document
+        filename (str): Original filename, used in error messages
+        mode (str): Split mode, see flask_app.split_spec
+        spec (str): Mode-specific specification (chunk size, ranges)
+        reader_cache (ReaderCache, optional): Cache of parsed documents
+        digest (str, optional): Content hash of the source
+
+    Returns:
+        list: (first, last) page ranges in output order
+
+    Raises:
+        InvalidPdfError: The source is not a valid PDF
+        EmptyPdfError: The source has no pages
+        SplitSpecError: The mode or spec does not fit the document
+    """
+    with ExitStack() as stack:
+        try:
+            reader = stack.enter_context(_open_reader(source, reader_cache, digest))
+            total_pages = len(reader.pages)
+        except PdfReadError as e:
+            raise InvalidPdfError(filename, str(e)) from e
+
+        if not total_pages:
+            raise EmptyPdfError()
+        return resolve_ranges(mode, spec, reader, total_pages)
+
+
+def extract_pages(source, first, last, output, filename="", reader_cache=None, digest=None,
+                  compress_streams=False, stats=None):
+    """
+    Write one page range of a document to output.
+
+    Args:
+        source: Path or binary file object of the document
+        first (int): First page, 1-based
+        last (int): Last page, inclusive
+        output: Writable binary file object
+        filename (str): Original filename, used in error messages
+        reader_cache (ReaderCache, optional): Cache of parsed documents
+        digest (str, optional): Content hash of the source
+        compress_streams (bool): Flate-encode unfiltered streams
+        stats (WriteStats, optional): Receives the bytes saved
+
+    Raises:
+        InvalidPdfError: The source is not a valid PDF
+        PageWriteError: The range could not be written
+    """
+    with ExitStack() as stack:
+        try:
+            reader = stack.enter_context(_open_reader(source, reader_cache, digest))
+            total_pages = len(reader.pages)
+        except PdfReadError as e:
+            raise InvalidPdfError(filename, str(e)) from e
+
+        if not 1 <= first <= last <= total_pages:
+            raise PageWriteError(first, f"pages {first}-{last} outside 1-{total_pages}")
+        try:
+            write_page_range(reader, first, last, output, compress_streams, stats)
+        except Exception as e:
+            raise PageWriteError(first, str(e)) from e
+
+
+def select_pages(source, spec, output, filename="", reader_cache=None, digest=None, compress_streams=False,
+                 stats=None):
+    """
+    Write a selection of pages, in the selected order, to one document.
+
+    The source is parsed once and all pages go through one writer, so a
+    subset or reordering needs neither a split nor a merge.
+
+    Args:
+        source: Path or binary file object of the document
+        spec (str): Page selection, see flask_app.split_spec.parse_selection
+        output: Output path or writable binary file object
+        filename (str): Original filename, used in error messages
+        reader_cache (ReaderCache, optional): Cache of parsed documents
+        digest (str, optional): Content hash of the source
+        compress_streams (bool): Flate-encode unfiltered streams
+        stats (WriteStats, optional): Receives the bytes saved
+
+    Returns:
+        int: Number of pages written
+
+    Raises:
+        InvalidPdfError: The source is not a valid PDF
+        EmptyPdfError: The source has no pages
+        SplitSpecError: The selection does not fit the document
+        PageWriteError: The output could not be written
+    """
+    with ExitStack() as stack:
+        try:
+            reader = stack.enter_context(_open_reader(source, reader_cache, digest))
+            total_pages = len(reader.pages)
+        except PdfReadError as e:
+            raise InvalidPdfError(filename, str(e)) from e
+
+        if not total_pages:
+            raise EmptyPdfError()
+        page_numbers = parse_selection(spec, total_pages)
+        try:
+            with _open_output(output) as stream:
+                write_pages(reader, page_numbers, stream, compress_streams, stats)
+        except Exception as e:
+            raise PageWriteError(page_numbers[0], str(e)) from e
+        return len(page_numbers)
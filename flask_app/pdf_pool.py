@@ -0,0 +1,178 @@
+"""
+Process pool for request-time PDF work.
+
+Parsing and writing PDFs with PyPDF2 is CPU-bound and holds the GIL, so
+under a threaded (gthread) or gevent gunicorn worker one merge would stall
+every other request of that worker, including slow uploads and downloads
+that only wait on the network. With PDF_POOL_WORKERS set, routes hand the
+PyPDF2 calls (merge, split, split planning, extract, lazy split pages) to a
+small process pool owned by each web worker and only wait for the result;
+the web worker's threads are left with request I/O. gunicorn.conf.py sizes
+the pool from the CPU count.
+
+Arguments have to cross a process boundary, so:
+
+- inputs are passed as paths (see PdfPool.source): spooled uploads roll
+  over to their named temporary file and memory maps pass the path of the
+  mapped file, so a merge of many uploads sends the pool a list of names
+  and each input is memory-mapped by the pool worker, as in the caller
+- outputs written to a file object are written to a buffer in the pool
+  worker and copied back (see PdfPool.write); output paths are written by
+  the pool worker directly
+- a ``reader_cache`` argument is replaced by a parsed-document cache of the
+  pool worker, and a ``stats`` WriteStats is filled in from the worker's copy
+
+Routes run splits in the pool with ``workers=1``: the pool already spreads
+requests over the CPUs, and a pool process starting a process pool of its
+own for SPLIT_WORKERS would oversubscribe them.
+
+Without PDF_POOL_WORKERS (the default, and in tests) the functions run in
+the calling thread with their arguments unchanged.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from flask_app.reader_cache import ReaderCache
+
+# Parsed-document cache of a pool worker, set by the pool initializer
+_worker_reader_cache = None
+
+
+def _init_pool_worker(reader_cache_bytes, ttl):
+    """Pool worker initializer: create the worker's parsed-document cache."""
+    global _worker_reader_cache
+    _worker_reader_cache = ReaderCache(max_bytes=reader_cache_bytes, ttl=ttl)
+
+
+def _run_task(fn, args, kwargs, returns_output):
+    """Pool task: call fn, returning (result, stats, output data)."""
+    if kwargs.get("reader_cache") is True:
+        kwargs["reader_cache"] = _worker_reader_cache
+    output = None
+    if returns_output:
+        output = BytesIO()
+        args = args + (output,)
+    result = fn(*args, **kwargs)
+    return result, kwargs.get("stats"), output.getvalue() if output is not None else None
+
+
+class PdfPool:
+    """Per-process pool running PDF operations out of the request thread."""
+
+    def __init__(self, workers=0, reader_cache_bytes=0, ttl=3600):
+        """
+        Args:
+            workers (int): Pool processes; 0 runs operations in the caller
+            reader_cache_bytes (int): Size of each pool worker's
+                parsed-document cache (0 disables it)
+            ttl (int): Seconds a parsed document stays cached
+        """
+        self.workers = workers
+        self._reader_cache_bytes = reader_cache_bytes
+        self._ttl = ttl
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_executor(self):
+        """Return the process pool, creating it on first use in this process."""
+        with self._lock:
+            # A pool inherited from a parent process (fork) cannot be used
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_pool_worker,
+                    initargs=(self._reader_cache_bytes, self._ttl),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def source(self, source):
+        """
+        Input for run() or write(): a path, or a stream of the document.
+
+        Open files and memory maps cannot be sent to another process, so
+        when the pool is enabled streams are replaced by the path of the
+        file holding them: uploads (flask_app.uploads.UploadSpool) are
+        written to their named temporary file, which lives as long as the
+        request; streams without a file, already held in memory, are copied.
+        """
+        if not self.enabled or isinstance(source, (str, os.PathLike)):
+            return source
+        if hasattr(source, "file_path"):
+            return source.file_path()
+        path = getattr(source, "name", None)
+        if isinstance(path, str) and os.path.isfile(path):
+            return os.path.abspath(path)
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return BytesIO(data)
+
+    def _call(self, fn, args, kwargs, returns_output):
+        stats = kwargs.get("stats")
+        if kwargs.get("reader_cache") is not None:
+            kwargs = dict(kwargs, reader_cache=True)
+        result, worker_stats, data = self._get_executor().submit(
+            _run_task, fn, args, kwargs, returns_output
+        ).result()
+        if stats is not None and worker_stats is not None:
+            stats.add(worker_stats)
+        return result, data
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs) in the pool and wait for its result.
+
+        fn must be a module-level function; exceptions it raises are
+        re-raised here.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        result, _ = self._call(fn, args, kwargs, False)
+        return result
+
+    def write(self, output, fn, *args, **kwargs):
+        """
+        Call fn(*args, output, **kwargs) in the pool, for functions that
+        take a writable output as their last positional argument.
+
+        Args:
+            output: Writable binary file object; receives what fn wrote
+        """
+        if not self.enabled:
+            return fn(*args, output, **kwargs)
+        result, data = self._call(fn, args, kwargs, True)
+        output.write(data)
+        return result
+
+    def shutdown(self, wait=True):
+        """Stop the pool processes of this process."""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def init_pdf_pool(app):
+    """
+    Attach the PDF operation pool to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.pdf_pool = PdfPool(
+        workers=app.config["PDF_POOL_WORKERS"],
+        reader_cache_bytes=app.config["READER_CACHE_SIZE"] * 1024 * 1024,
+        ttl=app.config["CLEANUP_INTERVAL"],
+    )
+    return app.pdf_pool
@@ -0,0 +1,290 @@
+"""
+Pre-flight validation of PDF inputs for Flask PDF Tools.
+"""
+
+import os
+import re
+from contextlib import contextmanager
+
+from PyPDF2 import PasswordType, PdfReader
+from PyPDF2.errors import PdfReadError
+
+from flask_app.pdf_ops import InvalidPdfError, MappedFile
+
+HEADER_WINDOW = 1024
+TAIL_WINDOW = 4096
+OBJECT_WINDOW = 4096
+# Incremental updates followed when locating the page tree
+MAX_XREF_SECTIONS = 16
+
+HEADER_PATTERN = re.compile(rb"%PDF-(\d\.\d)?")
+STARTXREF_PATTERN = re.compile(rb"startxref\s*(\d+)\s*$")
+SUBSECTION_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+XREF_ENTRY_PATTERN = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+OBJECT_HEADER_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+
+
+def _reference(name):
+    return re.compile(rb"/" + name + rb"\s+(\d+)\s+(\d+)\s+R")
+
+
+ROOT_PATTERN = _reference(b"Root")
+PAGES_PATTERN = _reference(b"Pages")
+PREV_PATTERN = re.compile(rb"/Prev\s+(\d+)")
+COUNT_PATTERN = re.compile(rb"/Count\s+(\d+)")
+ENCRYPT_PATTERN = re.compile(rb"/Encrypt\b")
+
+
+class PreflightError(InvalidPdfError):
+    """One or more sources failed the pre-flight check."""
+
+    def __init__(self, reports):
+        failed = [report for report in reports if report["error"]]
+        super().__init__(failed[0]["filename"], failed[0]["error"])
+        # Rebuild from the reports when unpickled in another process
+        self.args = (reports,)
+        self.reports = reports
+        self.failed = failed
+
+    def __str__(self):
+        if len(self.failed) == 1:
+            return f"Invalid PDF: {self.filename}"
+        return f"Invalid PDFs: {', '.join(report['filename'] for report in self.failed)}"
+
+
+class PreflightReport:
+    """Outcome of the pre-flight check of one source."""
+
+    def __init__(self, filename, size=0):
+        self.filename = filename
+        self.size = size
+        self.version = None
+        self.encrypted = False
+        self.pages = None
+        self.error = None
+        self.warnings = []
+
+    def to_dict(self):
+        return {
+            "filename": self.filename,
+            "size": self.size,
+            "version": self.version,
+            "encrypted": self.encrypted,
+            "pages": self.pages,
+            "error": self.error,
+            "warnings": self.warnings,
+        }
+
+
+@contextmanager
+def _open_source(source):
+    """Yield a seekable binary stream of a path or file object."""
+    if isinstance(source, (str, os.PathLike)):
+        with MappedFile.open(source) as mapped:
+            yield mapped
+    else:
+        try:
+            yield source
+        finally:
+            source.seek(0)
+
+
+def _read_at(stream, offset, size):
+    stream.seek(offset)
+    return stream.read(size)
+
+
+def _find_eof_marker(stream, size):
+    """Offset of the last %%EOF marker, searching backwards from the end."""
+    end = size
+    while end > 0:
+        start = max(0, end - TAIL_WINDOW)
+        # Overlap the chunks so that a marker across a boundary is found
+        window = _read_at(stream, start, end - start + 4)
+        position = window.rfind(b"%%EOF")
+        if position >= 0:
+            return start + position
+        end = start
+    return None
+
+
+def _read_object(stream, offset):
+    """Read the start of the indirect object at offset, up to endobj."""
+    window = _read_at(stream, offset, OBJECT_WINDOW)
+    if not OBJECT_HEADER_PATTERN.match(window):
+        return None
+    end = window.find(b"endobj")
+    return window if end < 0 else window[:end]
+
+
+def _read_xref_section(stream, offset, size):
+    """
+    Read a classic xref table at offset.
+
+    Returns:
+        tuple or None: ({first: (count, entries offset)}, trailer bytes), or
+        None if there is no classic table at offset (e.g. an xref stream)
+    """
+    header = _read_at(stream, offset, 4)
+    if header != b"xref":
+        return None
+    subsections = {}
+    position = offset + 4
+    while position < size:
+        window = _read_at(stream, position, 64)
+        stripped = window.lstrip()
+        if stripped.startswith(b"trailer"):
+            position += len(window) - len(stripped)
+            trailer = _read_at(stream, position, OBJECT_WINDOW)
+            end = trailer.find(b"startxref")
+            return subsections, trailer if end < 0 else trailer[:end]
+        match = SUBSECTION_PATTERN.match(window)
+        if not match:
+            return None
+        first, count = int(match.group(1)), int(match.group(2))
+        position += match.end()
+        subsections[first] = (count, position)
+        # Entries are 20 bytes each: "oooooooooo ggggg n" plus a two-byte EOL
+        position += 20 * count
+    return None
+
+
+def _object_offset(sections, stream, number):
+    """Offset of an in-use object in the newest section listing it."""
+    for subsections, _ in sections:
+        for first, (count, entries) in subsections.items():
+            if first <= number < first + count:
+                entry = XREF_ENTRY_PATTERN.match(_read_at(stream, entries + 20 * (number - first), 20))
+                if entry and entry.group(3) == b"n":
+                    return int(entry.group(1))
+                return None
+    return None
+
+
+def _declared_pages(stream, startxref, size):
+    """/Count of the page tree root, or None if it cannot be located cheaply."""
+    sections = []
+    offset = startxref
+    while offset is not None and len(sections) < MAX_XREF_SECTIONS:
+        section = _read_xref_section(stream, offset, size)
+        if section is None:
+            break
+        sections.append(section)
+        previous = PREV_PATTERN.search(section[1])
+        offset = int(previous.group(1)) if previous else None
+    if not sections:
+        return None
+
+    roots = (ROOT_PATTERN.search(trailer) for _, trailer in sections)
+    root = next((match for match in roots if match), None)
+    if root is None:
+        return None
+    catalog_offset = _object_offset(sections, stream, int(root.group(1)))
+    catalog = _read_object(stream, catalog_offset) if catalog_offset is not None else None
+    pages_ref = PAGES_PATTERN.search(catalog) if catalog else None
+    if pages_ref is None:
+        return None
+    pages_offset = _object_offset(sections, stream, int(pages_ref.group(1)))
+    pages = _read_object(stream, pages_offset) if pages_offset is not None else None
+    count = COUNT_PATTERN.search(pages) if pages else None
+    return int(count.group(1)) if count else None
+
+
+def _trailer(stream, startxref, size):
+    """Trailer dictionary bytes of the newest section (classic or stream)."""
+    section = _read_xref_section(stream, startxref, size)
+    if section is not None:
+        return section[1]
+    # Cross-reference stream: the trailer entries are in the stream dictionary
+    xref_object = _read_object(stream, startxref)
+    if xref_object is None:
+        return None
+    end = xref_object.find(b"stream")
+    return xref_object if end < 0 else xref_object[:end]
+
+
+def preflight_pdf(source, filename=""):
+    """
+    Check that a source looks like a PDF PyPDF2 can open.
+
+    Args:
+        source: Path or seekable binary file object
+        filename (str): Name used in the report
+
+    Returns:
+        PreflightReport: Findings; ``error`` is set if the source would fail
+    """
+    with _open_source(source) as stream:
+        stream.seek(0, os.SEEK_END)
+        report = PreflightReport(filename, stream.tell())
+        if not report.size:
+            report.error = "empty file"
+            return report
+
+        header = HEADER_PATTERN.search(_read_at(stream, 0, HEADER_WINDOW))
+        if header is None:
+            report.error = "no %PDF- header"
+            return report
+        if header.group(1):
+            report.version = header.group(1).decode("ascii")
+
+        eof = _find_eof_marker(stream, report.size)
+        if eof is None:
+            report.error = "no %%EOF marker"
+            return report
+        start = max(0, eof - TAIL_WINDOW)
+        startxref = STARTXREF_PATTERN.search(_read_at(stream, start, eof - start))
+        if startxref is None:
+            report.error = "startxref not found"
+            return report
+
+        offset = int(startxref.group(1))
+        trailer = _trailer(stream, offset, report.size) if offset < report.size else None
+        if trailer is None:
+            # PdfReader searches for the table itself in this case
+            report.warnings.append("startxref does not point to a cross-reference table")
+            return report
+
+        report.encrypted = bool(ENCRYPT_PATTERN.search(trailer))
+        if report.encrypted:
+            _check_encrypted(stream, report)
+        else:
+            try:
+                report.pages = _declared_pages(stream, offset, report.size)
+            except (OSError, ValueError):
+                report.pages = None
+        return report
+
+
+def _check_encrypted(stream, report):
+    """Encrypted files need a full parse to try the empty password."""
+    try:
+        stream.seek(0)
+        reader = PdfReader(stream)
+        if reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+            report.error = "password protected"
+            return
+        report.pages = len(reader.pages)
+    except PdfReadError as e:
+        report.error = str(e) or "unreadable encryption"
+    except Exception as e:
+        report.error = f"unsupported encryption: {e}"
+
+
+def check_sources(sources):
+    """
+    Pre-flight every source before any of them is parsed.
+
+    Args:
+        sources (list): (filename, path or binary file object) pairs
+
+    Returns:
+        list: Report dicts, one per source, in order
+
+    Raises:
+        PreflightError: At least one source failed; carries all reports
+    """
+    reports = [preflight_pdf(source, filename).to_dict() for filename, source in sources]
+    if any(report["error"] for report in reports):
+        raise PreflightError(reports)
+    return reports
@@ -1,69 +1,487 @@
 """
 Rate limiting middleware for Flask PDF Tools.
 
-Prevents abuse by limiting:
-- File upload requests (max 5 per minute per IP)
-- CAPTCHA validation attempts (max 10 per minute per IP)
-- Download requests (max 20 per minute per IP)
+Prevents abuse by limiting, per IP, the endpoints listed in RATE_LIMITS:
+- Merge, split and extract requests, weighted by upload size and page count
+- Download requests
 """
 
+import logging
+import math
+import threading
 import time
+import uuid
 from collections import defaultdict
 from functools import wraps
-from flask import request, flash, redirect, url_for
+from urllib.parse import urlparse
+from flask import request, flash, redirect, url_for, current_app, g
 
 
-class RateLimiter:
+class RateLimitBackend:
     """
-    Simple in-memory rate limiter based on IP address.
+    Storage interface for rate limit counters.
 
-    Production note: For distributed systems, use Redis-based rate limiting.
-    This implementation is suitable for single-server deployments.
+    Backends implement a sliding window per (endpoint, ip) pair. ``hit``
+    must check and record atomically so that concurrent workers sharing a
+    backend cannot exceed the limit together.
+    """
+
+    def hit(self, endpoint, ip, max_requests, window_seconds, cost=1):
+        """
+        Record a request unless it would exceed the limit.
+
+        Args:
+            endpoint (str): Endpoint identifier
+            ip (str): Client IP address
+            max_requests (int): Maximum requests allowed in window
+            window_seconds (int): Time window in seconds
+            cost (int): Units of budget this request consumes
+
+        Returns:
+            bool: True if rate limited (nothing was recorded)
+        """
+        raise NotImplementedError
+
+    def count(self, endpoint, ip, max_requests, window_seconds):
+        """
+        Count units recorded for (endpoint, ip) within the window.
+
+        Args:
+            endpoint (str): Endpoint identifier
+            ip (str): Client IP address
+            max_requests (int): Configured limit (needed by token buckets)
+            window_seconds (int): Time window in seconds
+
+        Returns:
+            int: Units used in the current window
+        """
+        raise NotImplementedError
+
+    def reset(self, ip=None, endpoint=None):
+        """Reset counters; see RateLimiter.reset()."""
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    In-process sliding-log backend.
+
+    Counters are per process: with several gunicorn workers each one
+    enforces the limit on its own. Within a process, a lock makes the
+    check and the record of ``hit`` atomic across request threads.
     """
 
     def __init__(self):
         """Initialize rate limiter with empty tracking."""
         # Format: {endpoint: {ip: [(timestamp, count), ...]}}
         self._requests = defaultdict(lambda: defaultdict(list))
+        self._lock = threading.Lock()
 
-    def is_limited(self, ip, endpoint, max_requests=5, window_seconds=60):
-        """
-        Check if IP has exceeded rate limit for endpoint.
+    def _prune(self, endpoint, ip, window_seconds):
+        """Drop entries outside the window and return the remaining list (lock held)."""
+        window_start = time.time() - window_seconds
+        requests = self._requests[endpoint][ip]
+        requests[:] = [(ts, count) for ts, count in requests if ts > window_start]
+        return requests
+
+    def hit(self, endpoint, ip, max_requests, window_seconds, cost=1):
+        with self._lock:
+            requests = self._prune(endpoint, ip, window_seconds)
+
+            # Check if limit exceeded
+            total_requests = sum(count for _, count in requests)
+
+            if total_requests + cost > max_requests:
+                return True
+
+            # Record this request
+            now = time.time()
+            if requests and requests[-1][0] == now:
+                # Same timestamp, increment count
+                requests[-1] = (now, requests[-1][1] + cost)
+            else:
+                # New timestamp
+                requests.append((now, cost))
+
+            return False
+
+    def count(self, endpoint, ip, max_requests, window_seconds):
+        with self._lock:
+            requests = self._prune(endpoint, ip, window_seconds)
+            return sum(count for _, count in requests)
+
+    def reset(self, ip=None, endpoint=None):
+        with self._lock:
+            if ip and endpoint:
+                self._requests[endpoint][ip].clear()
+            elif ip:
+                for ep in self._requests:
+                    self._requests[ep][ip].clear()
+            elif endpoint:
+                self._requests[endpoint].clear()
+            else:
+                self._requests.clear()
+
+
+class _TokenBucketState:
+    """Per-key token bucket state."""
 
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _WindowCounterState:
+    """Per-key sliding-window-counter state."""
+
+    __slots__ = ("window", "current", "previous")
+
+    def __init__(self, window):
+        self.window = window
+        self.current = 0
+        self.previous = 0
+
+
+class _CompactBackend(RateLimitBackend):
+    """
+    Base for constant-time in-process backends.
+
+    Keeps one small ``__slots__`` object per (endpoint, ip) in per-endpoint
+    dicts ordered by last use. Keys idle for longer than their window are
+    evicted by an amortized sweep, and the number of tracked keys is capped
+    at max_keys (least recently used keys are dropped first).
+    """
+
+    def __init__(self, max_keys=100000, sweep_interval=60):
+        """
         Args:
-            ip (str): Client IP address
-            endpoint (str): Endpoint identifier (e.g., 'join_pdfs')
-            max_requests (int): Maximum requests allowed in window
-            window_seconds (int): Time window in seconds
+            max_keys (int): Maximum number of (endpoint, ip) keys tracked
+            sweep_interval (int): Seconds between idle-key sweeps
+        """
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # Format: {endpoint: {ip: state}}, each inner dict in LRU order
+        self._states = {}
+        self._windows = {}
+        self._size = 0
+        self._next_sweep = time.time() + sweep_interval
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _new_state(self, now, window_seconds):
+        raise NotImplementedError
+
+    def _is_idle(self, state, now, window_seconds):
+        """Whether the state no longer affects any decision."""
+        raise NotImplementedError
+
+    def _consume(self, state, now, max_requests, window_seconds, cost):
+        """Try to take cost units; return True if limited."""
+        raise NotImplementedError
+
+    def _used(self, state, now, max_requests, window_seconds):
+        """Units used in the current window."""
+        raise NotImplementedError
+
+    def sweep(self, now=None):
+        """
+        Evict keys that have been idle for longer than their window.
 
         Returns:
-            bool: True if rate limited (request should be rejected)
+            int: Number of keys evicted
         """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._sweep(now)
+
+    def _sweep(self, now):
+        evicted = 0
+        for endpoint, states in list(self._states.items()):
+            window_seconds = self._windows[endpoint]
+            idle = [ip for ip, state in states.items() if self._is_idle(state, now, window_seconds)]
+            for ip in idle:
+                del states[ip]
+            evicted += len(idle)
+            if not states:
+                del self._states[endpoint]
+        self._size -= evicted
+        self._next_sweep = now + self.sweep_interval
+        return evicted
+
+    def _evict_one(self, endpoint):
+        """Drop the least recently used key, preferring the given endpoint."""
+        states = self._states.get(endpoint)
+        if not states:
+            states = max(self._states.values(), key=len)
+        del states[next(iter(states))]
+        self._size -= 1
+
+    def _state(self, endpoint, ip, now, window_seconds):
+        """Fetch or create the state for a key, enforcing the key cap."""
+        self._windows[endpoint] = window_seconds
+        states = self._states.get(endpoint)
+        if states is not None:
+            state = states.pop(ip, None)
+            if state is not None:
+                # Re-insert to mark as most recently used
+                states[ip] = state
+                return state
+
+        if now >= self._next_sweep or self._size >= self.max_keys:
+            self._sweep(now)
+        while self._size >= self.max_keys:
+            self._evict_one(endpoint)
+
+        state = self._new_state(now, window_seconds)
+        self._states.setdefault(endpoint, {})[ip] = state
+        self._size += 1
+        return state
+
+    def hit(self, endpoint, ip, max_requests, window_seconds, cost=1):
         now = time.time()
-        window_start = now - window_seconds
+        with self._lock:
+            state = self._state(endpoint, ip, now, window_seconds)
+            return self._consume(state, now, max_requests, window_seconds, cost)
 
-        # Get request history for this IP/endpoint
-        requests = self._requests[endpoint][ip]
+    def count(self, endpoint, ip, max_requests, window_seconds):
+        now = time.time()
+        with self._lock:
+            state = self._states.get(endpoint, {}).get(ip)
+            if state is None:
+                return 0
+            return self._used(state, now, max_requests, window_seconds)
 
-        # Remove old requests outside the window
-        requests[:] = [(ts, count) for ts, count in requests if ts > window_start]
+    def reset(self, ip=None, endpoint=None):
+        with self._lock:
+            endpoints = [endpoint] if endpoint is not None else list(self._states)
+            for ep in endpoints:
+                states = self._states.get(ep)
+                if states is None:
+                    continue
+                if ip is None:
+                    self._size -= len(states)
+                    del self._states[ep]
+                elif states.pop(ip, None) is not None:
+                    self._size -= 1
+
+
+class TokenBucketBackend(_CompactBackend):
+    """
+    Token bucket: capacity max_requests, refilled at max_requests per window.
+
+    Allows short bursts up to the capacity while enforcing the average rate.
+    """
 
-        # Check if limit exceeded
-        total_requests = sum(count for _, count in requests)
+    def _new_state(self, now, window_seconds):
+        return _TokenBucketState(None, now)
 
-        if total_requests >= max_requests:
-            return True
+    def _is_idle(self, state, now, window_seconds):
+        # A bucket untouched for a whole window has refilled completely
+        return state.updated + window_seconds <= now
 
-        # Record this request
-        if requests and requests[-1][0] == now:
-            # Same timestamp, increment count
-            requests[-1] = (now, requests[-1][1] + 1)
+    def _refill(self, state, now, max_requests, window_seconds):
+        if state.tokens is None:
+            state.tokens = float(max_requests)
         else:
-            # New timestamp
-            requests.append((now, 1))
+            rate = max_requests / window_seconds
+            state.tokens = min(float(max_requests), state.tokens + (now - state.updated) * rate)
+        state.updated = now
 
+    def _consume(self, state, now, max_requests, window_seconds, cost):
+        self._refill(state, now, max_requests, window_seconds)
+        if state.tokens < cost:
+            return True
+        state.tokens -= cost
         return False
 
+    def _used(self, state, now, max_requests, window_seconds):
+        if state.tokens is None:
+            return 0
+        self._refill(state, now, max_requests, window_seconds)
+        return max(0, math.ceil(max_requests - state.tokens))
+
+
+class SlidingWindowCounterBackend(_CompactBackend):
+    """
+    Sliding-window counter: two fixed-window counters per key.
+
+    The previous window's count is weighted by how much of it still
+    overlaps the sliding window, approximating a sliding log in O(1).
+    """
+
+    def _new_state(self, now, window_seconds):
+        return _WindowCounterState(int(now // window_seconds))
+
+    def _is_idle(self, state, now, window_seconds):
+        # Counts older than the previous window no longer matter
+        return state.window < int(now // window_seconds) - 1
+
+    def _roll(self, state, now, window_seconds):
+        window = int(now // window_seconds)
+        if window != state.window:
+            state.previous = state.current if window == state.window + 1 else 0
+            state.current = 0
+            state.window = window
+
+    def _estimate(self, state, now, window_seconds):
+        elapsed = (now % window_seconds) / window_seconds
+        return state.previous * (1.0 - elapsed) + state.current
+
+    def _consume(self, state, now, max_requests, window_seconds, cost):
+        self._roll(state, now, window_seconds)
+        if self._estimate(state, now, window_seconds) + cost > max_requests:
+            return True
+        state.current += cost
+        return False
+
+    def _used(self, state, now, max_requests, window_seconds):
+        self._roll(state, now, window_seconds)
+        return math.ceil(self._estimate(state, now, window_seconds))
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Shared sliding-window backend for any Redis-protocol server.
+
+    Each (endpoint, ip) pair is a sorted set of request members scored by
+    timestamp. The set is counted under WATCH and the request added in a
+    MULTI/EXEC that is retried if another worker changed the set meanwhile,
+    so concurrent workers admit exactly the limit in total.
+    """
+
+    def __init__(self, client, prefix="ratelimit"):
+        """
+        Args:
+            client: redis-py compatible client (redis.Redis, fakeredis.FakeRedis)
+            prefix (str): Key prefix for all counters
+        """
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix="ratelimit"):
+        """
+        Create a backend from a redis:// URL.
+
+        Raises:
+            RuntimeError: The redis package is not installed
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "RATELIMIT_STORAGE_URL points to Redis but the 'redis' package is not installed."
+            ) from e
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    def _key(self, endpoint, ip):
+        return f"{self.prefix}:{endpoint}:{ip}"
+
+    def hit(self, endpoint, ip, max_requests, window_seconds, cost=1):
+        key = self._key(endpoint, ip)
+        now = time.time()
+        request_id = uuid.uuid4().hex
+        members = {f"{now}:{request_id}:{unit}": now for unit in range(cost)}
+
+        def check_and_add(pipe):
+            # Count without writing: a write to the watched key would abort the transaction
+            total_requests = pipe.zcount(key, f"({now - window_seconds}", "+inf")
+            if total_requests + cost > max_requests:
+                return True
+            pipe.multi()
+            pipe.zremrangebyscore(key, "-inf", now - window_seconds)
+            pipe.zadd(key, members)
+            pipe.pexpire(key, int(window_seconds * 1000))
+            return False
+
+        return self.client.transaction(check_and_add, key, value_from_callable=True)
+
+    def count(self, endpoint, ip, max_requests, window_seconds):
+        key = self._key(endpoint, ip)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zremrangebyscore(key, "-inf", time.time() - window_seconds)
+        pipe.zcard(key)
+        _, total_requests = pipe.execute()
+        return total_requests
+
+    def reset(self, ip=None, endpoint=None):
+        pattern = self._key(endpoint or "*", ip or "*")
+        keys = list(self.client.scan_iter(match=pattern))
+        if keys:
+            self.client.delete(*keys)
+
+
+MEMORY_STRATEGIES = {
+    "sliding-log": MemoryBackend,
+    "token-bucket": TokenBucketBackend,
+    "sliding-window-counter": SlidingWindowCounterBackend,
+}
+
+
+def create_backend(url, strategy="sliding-log", max_keys=100000):
+    """
+    Create a rate limit backend from a storage URL.
+
+    Args:
+        url (str): ``memory://`` or ``redis://host:port/db``
+        strategy (str): Algorithm for memory storage, one of MEMORY_STRATEGIES
+        max_keys (int): Maximum tracked keys for the compact strategies
+
+    Returns:
+        RateLimitBackend: Configured backend
+    """
+    scheme = urlparse(url or "memory://").scheme
+    if scheme == "memory":
+        if strategy not in MEMORY_STRATEGIES:
+            raise ValueError(f"Unknown rate limit strategy: {strategy}")
+        backend_class = MEMORY_STRATEGIES[strategy]
+        if backend_class is MemoryBackend:
+            return MemoryBackend()
+        return backend_class(max_keys=max_keys)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unsupported rate limit storage: {url}")
+
+
+class RateLimiter:
+    """
+    Rate limiter based on IP address.
+
+    Counters live in a pluggable backend: MemoryBackend (default) suits
+    single-process deployments, RedisBackend shares limits between all
+    gunicorn workers and containers.
+    """
+
+    def __init__(self, backend=None):
+        """
+        Initialize rate limiter.
+
+        Args:
+            backend (RateLimitBackend, optional): Counter storage
+                (defaults to MemoryBackend)
+        """
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def is_limited(self, ip, endpoint, max_requests=5, window_seconds=60, cost=1):
+        """
+        Check if IP has exceeded rate limit for endpoint.
+
+        Args:
+            ip (str): Client IP address
+            endpoint (str): Endpoint identifier (e.g., 'join_pdfs')
+            max_requests (int): Maximum requests allowed in window
+            window_seconds (int): Time window in seconds
+            cost (int): Units of budget this request consumes
+
+        Returns:
+            bool: True if rate limited (request should be rejected)
+        """
+        return self.backend.hit(endpoint, ip, max_requests, window_seconds, cost)
+
     def get_remaining(self, ip, endpoint, max_requests=5, window_seconds=60):
         """
         Get remaining requests for IP/endpoint.
@@ -77,13 +495,7 @@ class RateLimiter:
         Returns:
             int: Number of remaining requests in current window
         """
-        now = time.time()
-        window_start = now - window_seconds
-
-        requests = self._requests[endpoint][ip]
-        requests[:] = [(ts, count) for ts, count in requests if ts > window_start]
-
-        total_requests = sum(count for _, count in requests)
+        total_requests = self.backend.count(endpoint, ip, max_requests, window_seconds)
         return max(0, max_requests - total_requests)
 
     def reset(self, ip=None, endpoint=None):
@@ -94,15 +506,7 @@ class RateLimiter:
             ip (str, optional): Reset only this IP (all endpoints)
             endpoint (str, optional): Reset only this endpoint (all IPs)
         """
-        if ip and endpoint:
-            self._requests[endpoint][ip].clear()
-        elif ip:
-            for ep in self._requests:
-                self._requests[ep][ip].clear()
-        elif endpoint:
-            self._requests[endpoint].clear()
-        else:
-            self._requests.clear()
+        self.backend.reset(ip=ip, endpoint=endpoint)
 
 
 # Global rate limiter instance
@@ -146,25 +550,15 @@ def rate_limit(endpoint, max_requests=5, window_seconds=60):
 
 def get_client_ip():
     """
-    Get client IP address, respecting proxy headers.
+    Get client IP address.
+
+    Behind reverse proxies, TRUSTED_PROXIES makes ProxyFix set the address
+    from the last hops of X-Forwarded-For, which the proxies append; the
+    header itself is never read here, as clients can send any value in it.
 
     Returns:
         str: Client IP address
     """
-    # Check for IP behind reverse proxy
-    if request.headers.get("X-Forwarded-For"):
-        # X-Forwarded-For can contain multiple IPs, get the first
-        return request.headers.get("X-Forwarded-For").split(",")[0].strip()
-
-    if request.headers.get("CF-Connecting-IP"):
-        # Cloudflare
-        return request.headers.get("CF-Connecting-IP")
-
-    if request.headers.get("X-Real-IP"):
-        # Nginx
-        return request.headers.get("X-Real-IP")
-
-    # Direct connection
     return request.remote_addr or "0.0.0.0"
 
 
@@ -175,6 +569,13 @@ def init_rate_limiting(app):
     Args:
         app: Flask application instance
     """
+    # Select counter storage (shared Redis or per-process memory)
+    _rate_limiter.backend = create_backend(
+        app.config["RATELIMIT_STORAGE_URL"],
+        strategy=app.config["RATELIMIT_STRATEGY"],
+        max_keys=app.config["RATELIMIT_MAX_KEYS"],
+    )
+
     # Store rate limiter in app for testing/management
     app.rate_limiter = _rate_limiter
 
@@ -183,21 +584,152 @@ def init_rate_limiting(app):
 
 
 # Rate limit configuration (adjust based on your needs)
+#
+# max_requests is a budget of cost units per window. Every request costs one
+# unit; endpoints with a "cost" entry also pay one unit per bytes_per_unit
+# uploaded beyond free_bytes (charged before the request runs) and one unit
+# per pages_per_unit pages processed beyond free_pages (charged once the page
+# count is known). Jobs within both free tiers cost one unit, so a client
+# gets max_requests of them per window.
 RATE_LIMITS = {
     "join_pdfs": {
         "max_requests": 10,
         "window_seconds": 300,  # 5 minutes
-        "description": "Join/merge PDF files"
+        "description": "Join/merge PDF files",
+        "cost": {
+            "free_bytes": 2 * 1024 * 1024, "bytes_per_unit": 2 * 1024 * 1024,
+            "free_pages": 50, "pages_per_unit": 50,
+        },
     },
     "split_pdf": {
         "max_requests": 10,
         "window_seconds": 300,  # 5 minutes
-        "description": "Split PDF files"
+        "description": "Split PDF files",
+        "cost": {
+            "free_bytes": 2 * 1024 * 1024, "bytes_per_unit": 2 * 1024 * 1024,
+            "free_pages": 50, "pages_per_unit": 50,
+        },
+    },
+    "extract_pdf": {
+        "max_requests": 10,
+        "window_seconds": 300,  # 5 minutes
+        "description": "Extract or reorder PDF pages",
+        "cost": {
+            "free_bytes": 2 * 1024 * 1024, "bytes_per_unit": 2 * 1024 * 1024,
+            "free_pages": 50, "pages_per_unit": 50,
+        },
     },
     "download_file": {
         "max_requests": 30,
         "window_seconds": 60,  # 1 minute
         "description": "Download files"
     },
+    "download_archive": {
+        "max_requests": 10,
+        "window_seconds": 300,  # 5 minutes
+        "description": "Download split archives",
+        "cost": {"free_pages": 50, "pages_per_unit": 50},
+    },
 }
 
+
+def upload_cost(limit, content_length):
+    """
+    Units charged before a request runs.
+
+    Args:
+        limit (dict): RATE_LIMITS entry
+        content_length (int): Request body size in bytes
+
+    Returns:
+        int: One unit plus one per bytes_per_unit uploaded beyond
+        free_bytes, capped at the budget
+    """
+    cost = 1
+    cost_config = limit.get("cost", {})
+    bytes_per_unit = cost_config.get("bytes_per_unit")
+    if bytes_per_unit and content_length:
+        cost += max(0, content_length - cost_config.get("free_bytes", 0)) // bytes_per_unit
+    # A request may never cost more than the whole budget
+    return min(cost, limit["max_requests"])
+
+
+def page_cost(limit, pages):
+    """
+    Units charged for the pages a request processed.
+
+    Args:
+        limit (dict): RATE_LIMITS entry
+        pages (int): Number of pages read or written
+
+    Returns:
+        int: One unit per pages_per_unit pages beyond free_pages
+    """
+    cost_config = limit.get("cost", {})
+    pages_per_unit = cost_config.get("pages_per_unit")
+    if not pages_per_unit or not pages:
+        return 0
+    return max(0, pages - cost_config.get("free_pages", 0)) // pages_per_unit
+
+
+def record_pages(pages):
+    """Record the page count of the current request for page-based cost."""
+    g.rate_limit_pages = pages
+
+
+def _limit_for_request():
+    """Return (endpoint, RATE_LIMITS entry) for the current request, if limited."""
+    if not current_app.config["RATELIMIT_ENABLED"] or not request.endpoint:
+        return None, None
+    # Blueprint endpoints are prefixed ("main.join_pdfs")
+    endpoint = request.endpoint.rpartition(".")[2]
+    return endpoint, RATE_LIMITS.get(endpoint)
+
+
+def enforce_rate_limits():
+    """before_request hook: charge the upfront cost and reject if over budget."""
+    endpoint, limit = _limit_for_request()
+    if limit is None:
+        return None
+
+    ip = get_client_ip()
+    cost = upload_cost(limit, request.content_length)
+    if _rate_limiter.is_limited(ip, endpoint, limit["max_requests"], limit["window_seconds"], cost):
+        logging.warning(
+            f"Rate limit exceeded for {endpoint} (cost {cost})",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash("Too many requests. Please wait before trying again.", "error")
+        return redirect(url_for("main.home"))
+    return None
+
+
+def charge_page_cost(response):
+    """after_request hook: charge units for pages recorded with record_pages()."""
+    endpoint, limit = _limit_for_request()
+    pages = g.pop("rate_limit_pages", None)
+    if limit is None or not pages:
+        return response
+
+    cost = page_cost(limit, pages)
+    if cost:
+        ip = get_client_ip()
+        # The work is already done: take what is left of the budget so the
+        # next request from this client is limited
+        remaining = _rate_limiter.get_remaining(ip, endpoint, limit["max_requests"], limit["window_seconds"])
+        if remaining:
+            _rate_limiter.is_limited(
+                ip, endpoint, limit["max_requests"], limit["window_seconds"], min(cost, remaining)
+            )
+    return response
+
+
+def apply_rate_limits(blueprint):
+    """
+    Apply RATE_LIMITS to every matching endpoint of a blueprint.
+
+    Args:
+        blueprint: Flask blueprint whose endpoints are limited
+    """
+    blueprint.before_request(enforce_rate_limits)
+    blueprint.after_request(charge_page_cost)
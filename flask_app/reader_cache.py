@@ -0,0 +1,226 @@
+"""
+Parsed-document cache for Flask PDF Tools.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+from flask_app.pdf_ops import MappedFile
+
+# Rough in-memory cost of one resolved PDF object beyond the source bytes
+PARSED_OBJECT_SIZE = 512
+
+
+class ParsedDocument:
+    """
+    A PdfReader over a memory map of the source file, or a copy of its bytes.
+
+    The map stays open, and a deleted spool file on disk, until close().
+    """
+
+    def __init__(self, stream):
+        """
+        Args:
+            stream: MappedFile or BytesIO owned by the document
+
+        Raises:
+            PdfReadError: The source is not a valid PDF
+        """
+        self.stream = stream
+        self.source_size = _source_size(stream)
+        try:
+            self.reader = PdfReader(stream)
+        except BaseException:
+            stream.close()
+            raise
+
+    @classmethod
+    def load(cls, source):
+        """Map a source that is a file on disk, otherwise copy it into memory."""
+        path = _source_path(source)
+        if path is not None:
+            return cls(MappedFile.open(path))
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return cls(BytesIO(data))
+
+    @property
+    def size(self):
+        """Approximate memory use; grows as the reader resolves objects."""
+        return self.source_size + PARSED_OBJECT_SIZE * len(self.reader.resolved_objects)
+
+    def close(self):
+        """Release the map or copy of the source."""
+        self.stream.close()
+
+
+def _source_path(source):
+    """Path of a source backed by a file on disk, or None."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        # Buffered writes must reach the file before it is mapped
+        source.flush()
+        return name
+    return None
+
+
+def _source_size(source):
+    """Size of a path or seekable binary file object in bytes."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    # mmap.seek() returns None, so ask tell() for the end offset
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+class ReaderCache:
+    """
+    Size-bounded LRU cache of parsed PDF documents keyed by content hash.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=3600):
+        """
+        Args:
+            max_bytes (int): Total approximate size of parsed documents
+                (0 disables caching)
+            ttl (int): Seconds an entry stays valid
+        """
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = ttl
+
+        # Format: {digest: (expires_at, ParsedDocument, size when stored)}
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @contextmanager
+    def reader(self, digest, source):
+        """
+        Use the parsed reader of a document, parsing it on a miss.
+
+        The reader is held exclusively until the block exits and then
+        returned to the cache. Sources larger than the whole cache are
+        parsed directly and not kept.
+
+        Args:
+            digest (str): Content hash of the source
+            source: Path or seekable binary file object of the document
+
+        Yields:
+            PdfReader: Parsed document
+
+        Raises:
+            PdfReadError: The source is not a valid PDF
+        """
+        document = self._take(digest)
+        if document is None:
+            if not self.enabled or _source_size(source) > self.max_bytes:
+                path = _source_path(source)
+                if path is None:
+                    yield PdfReader(source)
+                    return
+                with MappedFile.open(path) as mapped:
+                    yield PdfReader(mapped)
+                return
+            document = ParsedDocument.load(source)
+        try:
+            yield document.reader
+        finally:
+            self._put(digest, document)
+
+    def _take(self, digest):
+        """Remove and return a live entry, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= now:
+                self._discard(digest)
+                self._misses += 1
+                return None
+            self._discard(digest, close=False)
+            self._hits += 1
+            return entry[1]
+
+    def _put(self, digest, document):
+        """Store a document, evicting least recently used entries to make room."""
+        size = document.size
+        if size > self.max_bytes:
+            document.close()
+            return
+        with self._lock:
+            # A concurrent request may have returned its own copy meanwhile
+            self._discard(digest)
+            self._entries[digest] = (time.time() + self.ttl, document, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry[1].close()
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, digest, close=True):
+        """Remove an entry, closing its document unless it is handed out; caller holds the lock."""
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._size -= entry[2]
+            if close:
+                entry[1].close()
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Entry count, approximate size and hit/miss/eviction figures
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+def init_reader_cache(app):
+    """
+    Attach a parsed-document cache to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.reader_cache = ReaderCache(
+        max_bytes=app.config["READER_CACHE_SIZE"] * 1024 * 1024,
+        ttl=app.config["CLEANUP_INTERVAL"],
+    )
+    return app.reader_cache
@@ -0,0 +1,220 @@
+"""
+Content-hash result cache for Flask PDF Tools.
+
+Users often merge or split the very same documents (templates, standard
+forms). Uploads are hashed while they are read, and the finished output is
+kept in memory under a key built from the input hashes and the operation
+parameters. A repeated request is answered from the cache without parsing
+anything with PyPDF2.
+
+Merge keys use the ordered list of input hashes; split keys use the input
+hash plus split mode and spec. Split entries store each output with its
+page range, so the filenames of a hit can carry a fresh session id and the
+caller's base name. The cache is per process, bounded by total size with
+least-recently-used eviction, and entries expire after CLEANUP_INTERVAL.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hash a binary stream from its start and rewind it.
+
+    Args:
+        stream: Seekable binary file object
+
+    Returns:
+        str: BLAKE2b hex digest of the stream contents
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def merge_key(input_hashes):
+    """Cache key of merging inputs with the given hashes, in order."""
+    return _key("merge", *input_hashes)
+
+
+def split_key(input_hash, mode, spec):
+    """Cache key of splitting one input with the given mode and spec."""
+    return _key("split", input_hash, mode, spec)
+
+
+def page_key(input_hash, first, last):
+    """Cache key of one generated output (page range) of a lazy split."""
+    return _key("page", input_hash, first, last)
+
+
+def _key(*parts):
+    digest = hashlib.blake2b(digest_size=32)
+    for part in parts:
+        # Length-prefix every part so that different splits cannot collide
+        encoded = str(part).encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class CachedMerge:
+    """A cached merge result."""
+
+    def __init__(self, data, pages):
+        self.data = data
+        self.pages = pages
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+class CachedSplit:
+    """A cached split result: ((first, last), bytes) per output, in order."""
+
+    def __init__(self, outputs, pages):
+        self.outputs = outputs
+        self.pages = pages
+
+    @property
+    def size(self):
+        return sum(len(data) for _, data in self.outputs)
+
+
+class CachedPage:
+    """A generated output of a lazy split."""
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of merge and split results.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=3600):
+        """
+        Args:
+            max_bytes (int): Total size of cached outputs (0 disables caching)
+            ttl (int): Seconds an entry stays valid
+        """
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = ttl
+
+        # Format: {key: (expires_at, CachedMerge or CachedSplit)}
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._rejected = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """
+        Look up a result.
+
+        Returns:
+            CachedMerge, CachedSplit or None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        """
+        Store a result, evicting least recently used entries to make room.
+
+        Results larger than the whole cache are not stored.
+
+        Returns:
+            bool: True if the result was stored
+        """
+        size = result.size
+        with self._lock:
+            if size > self.max_bytes:
+                self._rejected += 1
+                return False
+            self._discard(key)
+            self._entries[key] = (time.time() + self.ttl, result)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self._evictions += 1
+            return True
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, key):
+        """Remove an entry; caller holds the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1].size
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Entry count, size and hit/miss/eviction figures
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "rejected": self._rejected,
+            }
+
+
+def init_result_cache(app):
+    """
+    Attach a result cache to the application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.result_cache = ResultCache(
+        max_bytes=app.config["RESULT_CACHE_SIZE"] * 1024 * 1024,
+        ttl=app.config["CLEANUP_INTERVAL"],
+    )
+    return app.result_cache
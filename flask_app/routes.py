@@ -1,35 +1,211 @@
 import os
 import logging
+import re
+import tempfile
 import uuid
 from datetime import datetime
-from flask import Blueprint, render_template, request, send_file, flash, redirect, url_for, session, current_app
-from werkzeug.utils import secure_filename
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
-from PyPDF2.errors import PdfReadError
+from io import BytesIO
+from urllib.parse import quote
+from flask import (
+    Blueprint, render_template, request, send_file, flash, redirect, url_for, session, current_app,
+    abort, make_response, jsonify, Response,
+)
+from werkzeug.utils import secure_filename, send_file as werkzeug_send_file
 
-from flask_app.forms import JoinPDFsForm, SplitPDFForm
-from flask_app.utils import generate_captcha_text, generate_captcha_image, allowed_file
+from flask_app.forms import ExtractPDFForm, JoinPDFsForm, SplitPDFForm
+from flask_app.jobs import JOB_DONE, JobQueueFull, run_merge_job, run_split_job
+from flask_app.lazy_split import LazySplit, is_internal_file
+from flask_app.pdf_dedup import WriteStats
+from flask_app.pdf_ops import (
+    EmptyPdfError, InvalidPdfError, MergeBudgetError, PageWriteError, PdfSourceError, merge_pdfs,
+    plan_split, select_pages, split_output_filename, split_output_range, split_pdf_pages,
+)
+from flask_app.preflight import PreflightError, check_sources
+from flask_app.rate_limiter import apply_rate_limits, record_pages
+from flask_app.result_cache import CachedMerge, CachedSplit, merge_key, split_key
+from flask_app.split_spec import SPLIT_MODE_PAGES, SplitSpecError
+from flask_app.uploads import UploadRejected, parser_input, upload_digest
+from flask_app.utils import allowed_file, render_captcha_png, iter_zip_stream
 
 main = Blueprint("main", __name__)
+apply_rate_limits(main)
 
 # Configuration constants
-MAX_FILES_TO_MERGE = 20
 MAX_FILENAME_LENGTH = 100
 
+# Split session IDs are the first 12 characters of a UUID4 string
+SPLIT_SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{3}$")
+PAGE_NUMBER_PATTERN = re.compile(r"_pages?_(\d+)(?:-\d+)?\.pdf$")
+
 
 @main.route("/", methods=["GET"])
 def home():
     """Render home page with CAPTCHA challenges."""
-    session["join_captcha_text"] = generate_captcha_text()
-    session["split_captcha_text"] = generate_captcha_text()
+    join_token, join_text = current_app.captcha_pool.issue()
+    split_token, split_text = current_app.captcha_pool.issue()
+    extract_token, extract_text = current_app.captcha_pool.issue()
+    session["join_captcha_text"] = join_text
+    session["join_captcha_token"] = join_token
+    session["split_captcha_text"] = split_text
+    session["split_captcha_token"] = split_token
+    session["extract_captcha_text"] = extract_text
+    session["extract_captcha_token"] = extract_token
 
     return render_template(
         "home.html",
         form=JoinPDFsForm(),
         split_form=SplitPDFForm(),
-        join_captcha_image=generate_captcha_image(session["join_captcha_text"]),
-        split_captcha_image=generate_captcha_image(session["split_captcha_text"]),
+        extract_form=ExtractPDFForm(),
+        join_captcha_token=join_token,
+        split_captcha_token=split_token,
+        extract_captcha_token=extract_token,
+    )
+
+
+@main.route("/captcha/<token>.png", methods=["GET"])
+def captcha_image(token):
+    """Serve the PNG of a CAPTCHA challenge issued to this session."""
+    text = None
+    for form_name in ("join", "split", "extract"):
+        if session.get(f"{form_name}_captcha_token") == token:
+            text = session.get(f"{form_name}_captcha_text")
+            break
+    if text is None:
+        abort(404)
+
+    png = current_app.captcha_pool.get_image(token)
+    if png is None:
+        # Issued by another worker process (or expired): render from the session
+        png = render_captcha_png(text)
+
+    response = make_response(png)
+    response.headers["Content-Type"] = "image/png"
+    response.headers["Cache-Control"] = (
+        f"private, max-age={current_app.config['CAPTCHA_IMAGE_TTL']}, immutable"
+    )
+    response.set_etag(token)
+    return response
+
+
+@main.errorhandler(UploadRejected)
+def upload_rejected(error):
+    """Report an upload that failed the PDF sniff while it was being received."""
+    logging.warning(
+        f"Rejected upload '{error.filename}': {error.reason}",
+        extra={"user_ip": request.remote_addr}
+    )
+    flash(f"Invalid PDF: {error.filename}", "error")
+    return redirect(url_for("main.home"))
+
+
+def _wants_async():
+    """Whether this request should be queued as a background job."""
+    return current_app.config["ASYNC_JOBS"] or request.args.get("async") == "1"
+
+
+def _job_accepted(job):
+    """Build the 202 response for a queued job."""
+    status_url = url_for("main.job_status", job_id=job.id)
+    response = jsonify({**job.to_dict(), "status_url": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+def _job_queue_full():
+    """Build the 503 backpressure response when the job queue is full."""
+    logging.warning(
+        "Job queue full, rejecting request",
+        extra={"user_ip": request.remote_addr}
     )
+    response = jsonify({"error": "Server is busy. Please try again later."})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(current_app.config["JOB_RETRY_AFTER"])
+    return response
+
+
+def _merged_output_filename(prefix="merged"):
+    """Generate a unique filename for a merged (or extracted) document."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    return f"{prefix}_{timestamp}_{unique_id}.pdf"
+
+
+def _enqueue_join(files):
+    """Persist uploads and queue a merge job."""
+    manager = current_app.job_manager
+    try:
+        job = manager.create("join")
+    except JobQueueFull:
+        return _job_queue_full()
+
+    try:
+        sources = []
+        for index, file in enumerate(files):
+            input_path = os.path.abspath(os.path.join(job.input_dir, f"{index}.pdf"))
+            # Form validation may have consumed the stream
+            file.stream.seek(0)
+            file.save(input_path)
+            sources.append((file.filename, input_path))
+
+        expiry_index = current_app.expiry_index
+        bucket = expiry_index.new_bucket()
+        output_path = os.path.join(expiry_index.output_dir(bucket), _merged_output_filename())
+        job.on_result = lambda result: expiry_index.register(bucket, result["files"])
+        manager.start(
+            job, run_merge_job, sources, output_path, current_app.config["MERGE_MEMORY_BUDGET"],
+            current_app.config["COMPRESS_CONTENT_STREAMS"],
+        )
+    except Exception as e:
+        manager.discard(job)
+        logging.error(
+            f"Error queueing merge job: {str(e)}",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash("Failed to merge PDFs.", "error")
+        return redirect(url_for("main.home"))
+
+    logging.info(
+        f"Queued merge job {job.id} for {len(files)} PDFs",
+        extra={"user_ip": request.remote_addr}
+    )
+    return _job_accepted(job)
+
+
+def _enqueue_split(file, session_id, base_name, mode, spec):
+    """Persist the upload and queue a split job."""
+    manager = current_app.job_manager
+    try:
+        job = manager.create("split")
+    except JobQueueFull:
+        return _job_queue_full()
+
+    try:
+        source_path = os.path.abspath(os.path.join(job.input_dir, "source.pdf"))
+        file.stream.seek(0)
+        file.save(source_path)
+        expiry_index = current_app.expiry_index
+        bucket = expiry_index.new_bucket()
+        output_dir = expiry_index.output_dir(bucket, session_id)
+        job.on_result = lambda result: expiry_index.register(bucket, result["files"], session=session_id)
+        manager.start(
+            job, run_split_job, source_path, output_dir, session_id, base_name, file.filename,
+            current_app.config["SPLIT_WORKERS"], mode, spec, current_app.config["COMPRESS_CONTENT_STREAMS"],
+        )
+    except Exception as e:
+        manager.discard(job)
+        logging.error(
+            f"Error queueing split job: {str(e)}",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash("Failed to split the PDF.", "error")
+        return redirect(url_for("main.home"))
+
+    logging.info(
+        f"Queued split job {job.id}: {file.filename}",
+        extra={"user_ip": request.remote_addr}
+    )
+    return _job_accepted(job)
 
 
 @main.route("/join", methods=["POST"])
@@ -49,8 +225,9 @@ def join_pdfs():
             flash("Upload at least two PDF files.", "error")
             return redirect(url_for("main.home"))
         
-        if len(files) > MAX_FILES_TO_MERGE:
-            flash(f"Maximum {MAX_FILES_TO_MERGE} files allowed.", "error")
+        max_files = current_app.config["MERGE_MAX_FILES"]
+        if len(files) > max_files:
+            flash(f"Maximum {max_files} files allowed.", "error")
             return redirect(url_for("main.home"))
 
         # Validate each file
@@ -59,59 +236,125 @@ def join_pdfs():
                 flash(f"Invalid file type: {file.filename}", "error")
                 return redirect(url_for("main.home"))
 
-        merger = None
+        if _wants_async():
+            return _enqueue_join(files)
+
+        sources = [(file.filename, parser_input(file)) for file in files]
+        output_filename = _merged_output_filename()
+        cache = current_app.result_cache
+        readers = current_app.reader_cache
+        budget = current_app.config["MERGE_MEMORY_BUDGET"]
+        compress = current_app.config["COMPRESS_CONTENT_STREAMS"]
+        stats = WriteStats()
+        pool = current_app.pdf_pool
+        digests = [upload_digest(file) for file in files]
+        cache_key = merge_key(digests) if cache.enabled else None
+        cached = cache.get(cache_key) if cache_key else None
         try:
-            merger = PdfMerger()
-            
-            # Merge all files
-            for file in files:
-                try:
-                    merger.append(file)
-                except PdfReadError as e:
-                    logging.error(
-                        f"Invalid PDF file '{file.filename}': {str(e)}",
-                        extra={"user_ip": request.remote_addr}
-                    )
-                    flash(f"Invalid PDF: {file.filename}", "error")
-                    return redirect(url_for("main.home"))
-                except Exception as e:
-                    logging.error(
-                        f"Error reading PDF '{file.filename}': {str(e)}",
-                        extra={"user_ip": request.remote_addr}
-                    )
-                    flash(f"Error reading PDF: {file.filename}", "error")
-                    return redirect(url_for("main.home"))
+            if cached is None:
+                # Reject broken inputs before any of them is parsed
+                check_sources(sources)
+
+            # With file offload the merged PDF goes to disk so the front-end
+            # server can send it
+            if current_app.config["JOIN_STREAM_RESPONSE"] and current_app.config["FILE_OFFLOAD"] == "off":
+                if cached is not None:
+                    record_pages(cached.pages)
+                    output = BytesIO(cached.data)
+                else:
+                    # Write merged PDF to a spooled buffer and stream it back;
+                    # nothing is left behind in UPLOAD_FOLDER
+                    spool_limit = current_app.config["JOIN_SPOOL_MAX_MEMORY"]
+                    output = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+                    try:
+                        pages = pool.write(
+                            output, merge_pdfs, [(name, pool.source(source)) for name, source in sources],
+                            reader_cache=readers, digests=digests, memory_budget=budget,
+                            compress_streams=compress, stats=stats,
+                        )
+                        record_pages(pages)
+                        size = output.tell()
+                        output.seek(0)
+                        if size <= spool_limit:
+                            # Still in memory: hand over a BytesIO so the server's
+                            # sendfile() probe does not roll the spool to disk
+                            in_memory = BytesIO(output.read())
+                            output.close()
+                            output = in_memory
+                            if cache_key:
+                                cache.put(cache_key, CachedMerge(in_memory.getvalue(), pages))
+                    except Exception:
+                        output.close()
+                        raise
 
-            # Generate unique output filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            output_filename = f"merged_{timestamp}_{unique_id}.pdf"
-            output_path = os.path.join(current_app.config["UPLOAD_FOLDER"], output_filename)
+                logging.info(
+                    f"Successfully merged {len(files)} PDFs{' (cached)' if cached else f', {stats}'}: "
+                    f"{output_filename}",
+                    extra={"user_ip": request.remote_addr}
+                )
 
-            # Write merged PDF
-            merger.write(output_path)
+                return send_file(
+                    output,
+                    mimetype="application/pdf",
+                    as_attachment=True,
+                    download_name=output_filename,
+                )
+
+            expiry_index = current_app.expiry_index
+            bucket = expiry_index.new_bucket()
+            output_path = os.path.join(expiry_index.output_dir(bucket), output_filename)
+
+            if cached is not None:
+                with open(output_path, "wb") as output_file:
+                    output_file.write(cached.data)
+                record_pages(cached.pages)
+            else:
+                # Write merged PDF
+                pages = pool.run(
+                    merge_pdfs, [(name, pool.source(source)) for name, source in sources], output_path,
+                    reader_cache=readers, digests=digests, memory_budget=budget,
+                    compress_streams=compress, stats=stats,
+                )
+                record_pages(pages)
+                if cache_key and os.path.getsize(output_path) <= cache.max_bytes:
+                    with open(output_path, "rb") as output_file:
+                        cache.put(cache_key, CachedMerge(output_file.read(), pages))
+            expiry_index.register(bucket, [output_filename])
             
             logging.info(
-                f"Successfully merged {len(files)} PDFs: {output_filename}",
+                f"Successfully merged {len(files)} PDFs{' (cached)' if cached else f', {stats}'}: "
+                f"{output_filename}",
                 extra={"user_ip": request.remote_addr}
             )
             
-            return send_file(output_path, as_attachment=True)
-            
+            return _send_result(expiry_index.storage.key(bucket, None, output_filename), output_filename)
+
+        except PreflightError as e:
+            return _preflight_failed(e)
+        except InvalidPdfError as e:
+            logging.error(
+                f"Invalid PDF file '{e.filename}': {e.reason}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash(f"Invalid PDF: {e.filename}", "error")
+        except PdfSourceError as e:
+            logging.error(
+                f"Error reading PDF '{e.filename}': {e.reason}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash(f"Error reading PDF: {e.filename}", "error")
+        except MergeBudgetError as e:
+            logging.warning(
+                f"PDF '{e.filename}' exceeds the merge memory budget: {e.size} > {e.budget} bytes",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash(str(e), "error")
         except Exception as e:
             logging.error(
                 f"Error merging PDFs: {str(e)}",
                 extra={"user_ip": request.remote_addr}
             )
             flash("Failed to merge PDFs.", "error")
-            return redirect(url_for("main.home"))
-        finally:
-            # Ensure merger is closed
-            if merger:
-                try:
-                    merger.close()
-                except Exception as e:
-                    logging.warning(f"Error closing merger: {str(e)}")
 
     return redirect(url_for("main.home"))
 
@@ -131,56 +374,89 @@ def split_pdf():
             flash("Invalid file type or no file uploaded.", "error")
             return redirect(url_for("main.home"))
 
-        try:
-            reader = PdfReader(file)
-            
-            # Validate PDF has pages
-            if not reader.pages:
-                flash("PDF has no pages.", "error")
-                return redirect(url_for("main.home"))
+        # Generate unique session ID for this split operation
+        session_id = str(uuid.uuid4())[:12]
+        base_name = os.path.splitext(secure_filename(file.filename))[0]
+        # Truncate base_name to prevent overly long filenames
+        base_name = base_name[:MAX_FILENAME_LENGTH]
 
-            # Generate unique session ID for this split operation
-            session_id = str(uuid.uuid4())[:12]
-            base_name = os.path.splitext(secure_filename(file.filename))[0]
-            # Truncate base_name to prevent overly long filenames
-            base_name = base_name[:MAX_FILENAME_LENGTH]
-            
-            output_files = []
+        mode = form.split_mode.data or SPLIT_MODE_PAGES
+        spec = form.split_spec.data or ""
 
-            # Split pages
-            for page_number, page in enumerate(reader.pages, start=1):
-                try:
-                    writer = PdfWriter()
-                    writer.add_page(page)
-                    
-                    # Use session ID to ensure uniqueness
-                    output_filename = f"{session_id}_{base_name}_page_{page_number}.pdf"
-                    output_path = os.path.join(current_app.config["UPLOAD_FOLDER"], output_filename)
-                    
-                    with open(output_path, "wb") as output_file:
-                        writer.write(output_file)
-                    
-                    output_files.append(output_filename)
-                    
-                except Exception as e:
-                    logging.error(
-                        f"Error writing page {page_number}: {str(e)}",
-                        extra={"user_ip": request.remote_addr}
-                    )
-                    flash(f"Error splitting page {page_number}.", "error")
-                    return redirect(url_for("main.home"))
+        if _wants_async():
+            return _enqueue_split(file, session_id, base_name, mode, spec)
+
+        cache = current_app.result_cache
+        readers = current_app.reader_cache
+        digest = upload_digest(file)
+        cache_key = split_key(digest, mode, spec) if cache.enabled else None
+        cached = cache.get(cache_key) if cache_key else None
+
+        expiry_index = current_app.expiry_index
+        bucket = expiry_index.new_bucket()
+        lazy = cached is None and current_app.config["SPLIT_LAZY"]
+        stats = WriteStats()
+        pool = current_app.pdf_pool
+        failure = None
+        try:
+            output_dir = expiry_index.output_dir(bucket, session_id)
+            if cached is not None:
+                output_files = _write_cached_split(cached, output_dir, session_id, base_name)
+                record_pages(cached.pages)
+            elif lazy:
+                # Only resolve the outputs; pages are built when downloaded
+                check_sources([(file.filename, parser_input(file))])
+                ranges = pool.run(
+                    plan_split, pool.source(parser_input(file)), filename=file.filename, mode=mode, spec=spec,
+                    reader_cache=readers, digest=digest,
+                )
+                split = LazySplit.create(
+                    expiry_index, bucket, session_id, base_name, parser_input(file), ranges, digest
+                )
+                record_pages(split.pages)
+                output_files = split.files
+            else:
+                check_sources([(file.filename, parser_input(file))])
+                # A split in the PDF pool stays in its pool process rather
+                # than starting a process pool of its own
+                workers = 1 if pool.enabled else current_app.config["SPLIT_WORKERS"]
+                output_files = pool.run(
+                    split_pdf_pages, pool.source(parser_input(file)), output_dir, session_id, base_name,
+                    filename=file.filename, workers=workers,
+                    mode=mode, spec=spec, reader_cache=readers, digest=digest,
+                    compress_streams=current_app.config["COMPRESS_CONTENT_STREAMS"], stats=stats,
+                )
+                record_pages(_split_output_pages(output_files))
+                if cache_key:
+                    _cache_split(cache, cache_key, output_dir, output_files)
+            if not lazy:
+                expiry_index.register(bucket, output_files, session=session_id)
 
             logging.info(
-                f"Successfully split PDF into {len(output_files)} pages: {file.filename}",
+                f"Successfully split PDF into {len(output_files)} files ({mode}"
+                f"{', cached' if cached else ''}{', lazy' if lazy else ''}"
+                f"{'' if cached or lazy else f', {stats}'}): {file.filename}",
                 extra={"user_ip": request.remote_addr}
             )
             
             flash("PDF split successfully.", "success")
-            return render_template("download.html", files=output_files)
-            
-        except PdfReadError as e:
+            return render_template("download.html", files=output_files, session_id=session_id)
+
+        except EmptyPdfError:
+            flash("PDF has no pages.", "error")
+        except SplitSpecError as e:
+            flash(str(e), "error")
+        except PreflightError as e:
+            failure = _preflight_failed(e)
+        except PageWriteError as e:
+            logging.error(
+                f"Error writing page {e.page_number}: {e.reason}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash(f"Error splitting page {e.page_number}.", "error")
+        except InvalidPdfError as e:
             logging.error(
-                f"Invalid PDF file: {str(e)}",
+                f"Invalid PDF file: {e.reason}",
                 extra={"user_ip": request.remote_addr}
             )
             flash("The file is not a valid PDF.", "error")
@@ -191,9 +467,178 @@ def split_pdf():
             )
             flash("Failed to split the PDF.", "error")
 
+        # Drop partial output of the failed split in one go
+        expiry_index.expire_session(session_id, bucket)
+        if failure is not None:
+            return failure
+
     return redirect(url_for("main.home"))
 
 
+@main.route("/extract", methods=["POST"])
+def extract_pdf():
+    """Write a selection of pages of one PDF, in the given order, to a new document."""
+    form = ExtractPDFForm()
+    if form.validate_on_submit():
+        # Verify CAPTCHA
+        if form.captcha_answer.data != session.get("extract_captcha_text"):
+            flash("CAPTCHA verification failed.", "error")
+            return redirect(url_for("main.home"))
+
+        file = request.files.get("pdf_file")
+        if not file or not allowed_file(file.filename):
+            flash("Invalid file type or no file uploaded.", "error")
+            return redirect(url_for("main.home"))
+
+        spec = form.pages.data
+        output_filename = _merged_output_filename("extracted")
+        readers = current_app.reader_cache
+        compress = current_app.config["COMPRESS_CONTENT_STREAMS"]
+        stats = WriteStats()
+        pool = current_app.pdf_pool
+        digest = upload_digest(file)
+        try:
+            check_sources([(file.filename, parser_input(file))])
+
+            if current_app.config["JOIN_STREAM_RESPONSE"] and current_app.config["FILE_OFFLOAD"] == "off":
+                spool_limit = current_app.config["JOIN_SPOOL_MAX_MEMORY"]
+                output = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+                try:
+                    pages = pool.write(
+                        output, select_pages, pool.source(parser_input(file)), spec, filename=file.filename,
+                        reader_cache=readers, digest=digest, compress_streams=compress, stats=stats,
+                    )
+                    size = output.tell()
+                    output.seek(0)
+                    if size <= spool_limit:
+                        # Keep small outputs off the sendfile() path, as for joins
+                        in_memory = BytesIO(output.read())
+                        output.close()
+                        output = in_memory
+                except Exception:
+                    output.close()
+                    raise
+                record_pages(pages)
+                logging.info(
+                    f"Successfully extracted {pages} pages, {stats}: {file.filename}",
+                    extra={"user_ip": request.remote_addr}
+                )
+                return send_file(
+                    output, mimetype="application/pdf", as_attachment=True, download_name=output_filename
+                )
+
+            expiry_index = current_app.expiry_index
+            bucket = expiry_index.new_bucket()
+            output_path = os.path.join(expiry_index.output_dir(bucket), output_filename)
+            pages = pool.run(
+                select_pages, pool.source(parser_input(file)), spec, output_path, filename=file.filename,
+                reader_cache=readers, digest=digest, compress_streams=compress, stats=stats,
+            )
+            record_pages(pages)
+            expiry_index.register(bucket, [output_filename])
+            logging.info(
+                f"Successfully extracted {pages} pages, {stats}: {file.filename}",
+                extra={"user_ip": request.remote_addr}
+            )
+            return _send_result(expiry_index.storage.key(bucket, None, output_filename), output_filename)
+
+        except PreflightError as e:
+            return _preflight_failed(e)
+        except EmptyPdfError:
+            flash("PDF has no pages.", "error")
+        except SplitSpecError as e:
+            flash(str(e), "error")
+        except PageWriteError as e:
+            logging.error(
+                f"Error writing extracted pages: {e.reason}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash("Failed to extract pages.", "error")
+        except InvalidPdfError as e:
+            logging.error(
+                f"Invalid PDF file: {e.reason}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash("The file is not a valid PDF.", "error")
+        except Exception as e:
+            logging.error(
+                f"Error extracting pages: {str(e)}",
+                extra={"user_ip": request.remote_addr}
+            )
+            flash("Failed to extract pages.", "error")
+
+    return redirect(url_for("main.home"))
+
+
+def _preflight_failed(error):
+    """
+    Report the inputs that failed the pre-flight check, one entry per file.
+
+    Clients preferring JSON get the full per-file report with status 422.
+    """
+    for report in error.failed:
+        logging.error(
+            f"Invalid PDF file '{report['filename']}': {report['error']}",
+            extra={"user_ip": request.remote_addr}
+        )
+    if request.accept_mimetypes.best == "application/json":
+        response = jsonify({"error": str(error), "files": error.reports})
+        response.status_code = 422
+        return response
+    for report in error.failed:
+        flash(f"Invalid PDF: {report['filename']} ({report['error']})", "error")
+    return redirect(url_for("main.home"))
+
+
+def _write_cached_split(cached, output_dir, session_id, base_name):
+    """Write the outputs of a cached split under this request's names."""
+    output_files = []
+    for (first, last), data in cached.outputs:
+        output_filename = split_output_filename(session_id, base_name, first, last)
+        with open(os.path.join(output_dir, output_filename), "wb") as output_file:
+            output_file.write(data)
+        output_files.append(output_filename)
+    return output_files
+
+
+def _cache_split(cache, cache_key, output_dir, output_files):
+    """Keep the outputs of a split in the result cache if they fit."""
+    paths = [os.path.join(output_dir, name) for name in output_files]
+    if sum(os.path.getsize(path) for path in paths) > cache.max_bytes:
+        return
+    outputs = []
+    for name, path in zip(output_files, paths):
+        with open(path, "rb") as output_file:
+            outputs.append((split_output_range(name), output_file.read()))
+    pages = sum(last - first + 1 for (first, last), _ in outputs)
+    cache.put(cache_key, CachedSplit(outputs, pages))
+
+
+def _split_output_pages(output_files):
+    """Total number of pages in the outputs of a split."""
+    return sum(last - first + 1 for first, last in map(split_output_range, output_files))
+
+
+@main.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Report the status and progress of a queued merge or split job."""
+    job = current_app.job_manager.get(job_id)
+    if job is None:
+        response = jsonify({"error": "Job not found."})
+        response.status_code = 404
+        return response
+
+    if job["status"] == JOB_DONE and job["result"]:
+        job["downloads"] = [
+            url_for("main.download_file", filename=filename)
+            for filename in job["result"]["files"]
+        ]
+        if job["kind"] == "split" and job["result"]["files"]:
+            session_id = job["result"]["files"][0].split("_", 1)[0]
+            job["archive"] = url_for("main.download_archive", session_id=session_id)
+    return jsonify(job)
+
+
 @main.route("/download/<filename>")
 def download_file(filename):
     """Safely download a file with path traversal protection."""
@@ -206,6 +651,48 @@ def download_file(filename):
         flash("Invalid filename.", "error")
         return redirect(url_for("main.home"))
 
+    # The stored source and manifest of a lazy split are registered with its
+    # session so they expire with it, but they are not downloads
+    if is_internal_file(filename):
+        logging.warning(
+            f"Attempted download of a lazy split internal file: {filename}",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash("File does not exist.", "error")
+        return redirect(url_for("main.home"))
+
+    # Generated files resolve through the expiry index without probing the folder
+    key = current_app.expiry_index.lookup(filename)
+    if key is not None:
+        try:
+            response = _send_result(key, filename)
+        except FileNotFoundError:
+            response = None
+        if response is not None:
+            logging.info(
+                f"File downloaded: {filename}",
+                extra={"user_ip": request.remote_addr}
+            )
+            return response
+
+    # Outputs of a lazy split are built on their first download
+    try:
+        data = _lazy_split_output(filename)
+    except PageWriteError as e:
+        logging.error(
+            f"Error writing page {e.page_number}: {e.reason}",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash(str(e), "error")
+        return redirect(url_for("main.home"))
+    if data is not None:
+        logging.info(
+            f"File downloaded: {filename} (generated)",
+            extra={"user_ip": request.remote_addr}
+        )
+        return send_file(BytesIO(data), mimetype="application/pdf", as_attachment=True, download_name=filename)
+
+    # Files written before the expiry index existed live at the top level.
     # Prevent directory traversal by using absolute paths
     file_path = os.path.abspath(os.path.join(current_app.config["UPLOAD_FOLDER"], filename))
     upload_folder = os.path.abspath(current_app.config["UPLOAD_FOLDER"])
@@ -225,11 +712,177 @@ def download_file(filename):
             f"File downloaded: {filename}",
             extra={"user_ip": request.remote_addr}
         )
-        return send_file(file_path, as_attachment=True)
+        return _send_local_file(file_path, filename)
 
     logging.warning(
         f"File not found: {filename}",
         extra={"user_ip": request.remote_addr}
     )
     flash("File does not exist.", "error")
-    return redirect(url_for("main.home"))
\ No newline at end of file
+    return redirect(url_for("main.home"))
+
+
+def _send_local_file(path, filename):
+    """
+    Send a validated file from the upload folder as an attachment.
+
+    With FILE_OFFLOAD set, the body is left to the front-end server:
+    ``x-accel`` answers with X-Accel-Redirect to the internal nginx location
+    FILE_OFFLOAD_PREFIX, ``x-sendfile`` with X-Sendfile and the absolute path.
+
+    Raises:
+        FileNotFoundError: The file does not exist
+    """
+    mode = current_app.config["FILE_OFFLOAD"]
+    if mode == "off":
+        return send_file(path, as_attachment=True, download_name=filename)
+
+    response = werkzeug_send_file(
+        path, request.environ, as_attachment=True, download_name=filename,
+        use_x_sendfile=True, response_class=current_app.response_class,
+    )
+    if mode == "x-accel":
+        upload_folder = os.path.abspath(current_app.config["UPLOAD_FOLDER"])
+        relative_path = os.path.relpath(response.headers.pop("X-Sendfile"), upload_folder)
+        prefix = current_app.config["FILE_OFFLOAD_PREFIX"].rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    return response
+
+
+def _send_result(key, filename):
+    """
+    Send a stored output as an attachment.
+
+    Raises:
+        FileNotFoundError: The object is gone from storage
+    """
+    storage = current_app.expiry_index.storage
+    path = storage.local_path(key)
+    if path is not None:
+        return _send_local_file(path, filename)
+    return send_file(
+        storage.open(key), mimetype="application/pdf", as_attachment=True, download_name=filename
+    )
+
+
+def _lazy_split_output(filename):
+    """
+    Data of an output of a lazy split session, generated if not cached.
+
+    Returns:
+        bytes or None: None if filename is not an output of a live lazy split
+    """
+    session_id = filename.split("_", 1)[0]
+    if not SPLIT_SESSION_ID_PATTERN.match(session_id):
+        return None
+    split = LazySplit.load(current_app.expiry_index, session_id)
+    if split is None:
+        return None
+    try:
+        return split.render(
+            filename, current_app.expiry_index.storage,
+            page_cache=current_app.page_cache, reader_cache=current_app.reader_cache,
+            compress_streams=current_app.config["COMPRESS_CONTENT_STREAMS"], pool=current_app.pdf_pool,
+        )
+    except FileNotFoundError:
+        return None
+
+
+def _split_session_files(session_id):
+    """List (filename, source) of a split session's stored pages in page order."""
+    storage = current_app.expiry_index.storage
+    pages = []
+    for name, key in current_app.expiry_index.session_files(session_id):
+        match = PAGE_NUMBER_PATTERN.search(name)
+        if match:
+            # Local files keep their mtime in the archive; others are streamed
+            source = storage.local_path(key) or (lambda key=key: storage.open(key))
+            pages.append((int(match.group(1)), name, source))
+    return [(name, source) for _, name, source in sorted(pages, key=lambda page: page[:2])]
+
+
+def _lazy_split_archive(split):
+    """
+    Build the ZIP archive of a lazy split session before it is sent.
+
+    Returns:
+        tuple: (file, size) of the complete archive, rewound
+
+    Raises:
+        PageWriteError: An output could not be built
+    """
+    storage = current_app.expiry_index.storage
+    page_cache = current_app.page_cache
+    reader_cache = current_app.reader_cache
+    compress = current_app.config["COMPRESS_CONTENT_STREAMS"]
+    pool = current_app.pdf_pool
+    members = [
+        (name, lambda name=name: BytesIO(split.render(name, storage, page_cache, reader_cache, compress, pool)))
+        for name in split.files
+    ]
+    archive = tempfile.SpooledTemporaryFile(max_size=current_app.config["UPLOAD_SPOOL_MAX_MEMORY"])
+    try:
+        for chunk in iter_zip_stream(members):
+            archive.write(chunk)
+    except BaseException:
+        archive.close()
+        raise
+    size = archive.tell()
+    archive.seek(0)
+    return archive, size
+
+
+@main.route("/download-all/<session_id>")
+def download_archive(session_id):
+    """Stream all pages of a split session as a single ZIP archive."""
+    if not SPLIT_SESSION_ID_PATTERN.match(session_id):
+        logging.warning(
+            f"Invalid split session in archive download: {session_id}",
+            extra={"user_ip": request.remote_addr}
+        )
+        flash("Invalid download.", "error")
+        return redirect(url_for("main.home"))
+
+    members = _split_session_files(session_id)
+    if members:
+        record_pages(len(members))
+        logging.info(
+            f"Archive downloaded: {session_id} ({len(members)} pages)",
+            extra={"user_ip": request.remote_addr}
+        )
+        # No Content-Length: the archive is built while it is sent (chunked)
+        return Response(
+            iter_zip_stream(members),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{session_id}_pages.zip"'},
+        )
+
+    split = LazySplit.load(current_app.expiry_index, session_id)
+    if split is None:
+        flash("File does not exist.", "error")
+        return redirect(url_for("main.home"))
+
+    # Every output is rendered before the first byte, so a failure is an
+    # error response rather than a truncated archive
+    record_pages(split.pages)
+    try:
+        archive, archive_size = _lazy_split_archive(split)
+    except FileNotFoundError:
+        # The session expired while the archive was built
+        abort(404)
+    except PageWriteError as e:
+        logging.error(
+            f"Archive build failed for {session_id}: {e}",
+            extra={"user_ip": request.remote_addr}
+        )
+        abort(500)
+
+    logging.info(
+        f"Archive downloaded: {session_id} ({split.pages} pages, built)",
+        extra={"user_ip": request.remote_addr}
+    )
+    response = send_file(
+        archive, mimetype="application/zip", as_attachment=True, download_name=f"{session_id}_pages.zip"
+    )
+    response.content_length = archive_size
+    return response
@@ -0,0 +1,208 @@
+"""
+Split specifications for Flask PDF Tools.
+
+A split is described by a mode and an optional spec string, resolved
+against the source document into a list of 1-based, inclusive page ranges,
+one per output file:
+
+- ``pages``: one file per page (spec ignored)
+- ``chunks``: every N pages, spec is N (e.g. ``"10"``)
+- ``ranges``: explicit comma-separated ranges, e.g. ``"1-3,4-10,11-"``;
+  ``"5"`` is a single page, ``"-3"`` means ``1-3``, ``"11-"`` runs to the end;
+  each range names its output file, so a range may not be given twice
+- ``outline``: one file per top-level bookmark (spec ignored)
+
+The extract operation takes a page selection in the same syntax, except
+that ranges may run backwards and pages may repeat, so one selection can
+both pick and reorder pages (see parse_selection).
+"""
+
+SPLIT_MODE_PAGES = "pages"
+SPLIT_MODE_CHUNKS = "chunks"
+SPLIT_MODE_RANGES = "ranges"
+SPLIT_MODE_OUTLINE = "outline"
+
+SPLIT_MODES = (SPLIT_MODE_PAGES, SPLIT_MODE_CHUNKS, SPLIT_MODE_RANGES, SPLIT_MODE_OUTLINE)
+
+# Upper bound on the length of a ranges spec accepted from a form
+MAX_SPEC_LENGTH = 1000
+# Upper bound on the number of pages one selection may produce
+MAX_SELECTED_PAGES = 10000
+
+
+class SplitSpecError(ValueError):
+    """The split mode or spec is invalid for the document."""
+
+
+def page_ranges(total_pages):
+    """One range per page."""
+    return [(page, page) for page in range(1, total_pages + 1)]
+
+
+def chunk_ranges(spec, total_pages):
+    """
+    Fixed-size chunks of pages.
+
+    Args:
+        spec (str): Chunk size
+        total_pages (int): Number of pages in the document
+
+    Returns:
+        list: (first, last) page ranges
+    """
+    try:
+        size = int(str(spec).strip())
+    except ValueError:
+        raise SplitSpecError("Chunk size must be a whole number.")
+    if size < 1:
+        raise SplitSpecError("Chunk size must be at least 1.")
+
+    return [
+        (first, min(first + size - 1, total_pages))
+        for first in range(1, total_pages + 1, size)
+    ]
+
+
+def _parse_page(value, total_pages):
+    """Parse one page number and check it is inside the document."""
+    try:
+        page = int(value)
+    except ValueError:
+        raise SplitSpecError(f"Invalid page number: {value}")
+    if not 1 <= page <= total_pages:
+        raise SplitSpecError(f"Page {page} is out of range (1-{total_pages}).")
+    return page
+
+
+def _parse_entries(spec, total_pages):
+    """Parse a comma-separated page list into (entry, first, last) triples."""
+    spec = (spec or "").strip()
+    if not spec:
+        raise SplitSpecError("Enter at least one page range.")
+    if len(spec) > MAX_SPEC_LENGTH:
+        raise SplitSpecError("Page range list is too long.")
+
+    entries = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            raise SplitSpecError("Empty entry in page range list.")
+        if "-" in part:
+            first, _, last = part.partition("-")
+            first = _parse_page(first.strip(), total_pages) if first.strip() else 1
+            last = _parse_page(last.strip(), total_pages) if last.strip() else total_pages
+        else:
+            first = last = _parse_page(part, total_pages)
+        entries.append((part, first, last))
+    return entries
+
+
+def parse_ranges(spec, total_pages):
+    """
+    Parse an explicit range list such as ``"1-3,4-10,11-"``.
+
+    Args:
+        spec (str): Comma-separated pages and ranges
+        total_pages (int): Number of pages in the document
+
+    Returns:
+        list: (first, last) page ranges in the given order
+
+    Raises:
+        SplitSpecError: An entry is invalid, or two entries cover the same
+            range (they would write the same output file)
+    """
+    ranges = []
+    seen = set()
+    for part, first, last in _parse_entries(spec, total_pages):
+        if first > last:
+            raise SplitSpecError(f"Invalid page range: {part}")
+        if (first, last) in seen:
+            raise SplitSpecError(f"Page range given twice: {part}")
+        seen.add((first, last))
+        ranges.append((first, last))
+    return ranges
+
+
+def parse_selection(spec, total_pages):
+    """
+    Parse a page selection such as ``"3,1-2,10-5,3"`` into page numbers.
+
+    Entries are written as for parse_ranges, but a range may run backwards
+    (``"10-5"`` is 10, 9, ..., 5) and pages may repeat.
+
+    Args:
+        spec (str): Comma-separated pages and ranges
+        total_pages (int): Number of pages in the document
+
+    Returns:
+        list: 1-based page numbers in output order
+    """
+    pages = []
+    for _, first, last in _parse_entries(spec, total_pages):
+        step = 1 if first <= last else -1
+        if len(pages) + abs(last - first) + 1 > MAX_SELECTED_PAGES:
+            raise SplitSpecError(f"A selection may produce at most {MAX_SELECTED_PAGES} pages.")
+        pages.extend(range(first, last + step, step))
+    return pages
+
+
+def outline_ranges(reader, total_pages):
+    """
+    One range per top-level bookmark.
+
+    Pages before the first bookmark form their own leading range.
+
+    Args:
+        reader (PdfReader): Open source document
+        total_pages (int): Number of pages in the document
+
+    Returns:
+        list: (first, last) page ranges in page order
+    """
+    starts = set()
+    for item in reader.outline:
+        # Nested lists hold child bookmarks; only top-level entries split
+        if isinstance(item, list):
+            continue
+        try:
+            page_index = reader.get_destination_page_number(item)
+        except Exception:
+            continue
+        if page_index is not None and 0 <= page_index < total_pages:
+            starts.add(page_index + 1)
+
+    if not starts:
+        raise SplitSpecError("PDF has no bookmarks to split on.")
+
+    starts.add(1)
+    starts = sorted(starts)
+    ends = [start - 1 for start in starts[1:]] + [total_pages]
+    return list(zip(starts, ends))
+
+
+def resolve_ranges(mode, spec, reader, total_pages):
+    """
+    Resolve a split mode and spec into output page ranges.
+
+    Args:
+        mode (str): One of SPLIT_MODES
+        spec (str): Mode-specific specification
+        reader (PdfReader): Open source document (used for outlines)
+        total_pages (int): Number of pages in the document
+
+    Returns:
+        list: (first, last) 1-based inclusive page ranges
+
+    Raises:
+        SplitSpecError: The mode or spec is invalid
+    """
+    if mode == SPLIT_MODE_PAGES:
+        return page_ranges(total_pages)
+    if mode == SPLIT_MODE_CHUNKS:
+        return chunk_ranges(spec, total_pages)
+    if mode == SPLIT_MODE_RANGES:
+        return parse_ranges(spec, total_pages)
+    if mode == SPLIT_MODE_OUTLINE:
+        return outline_ranges(reader, total_pages)
+    raise SplitSpecError(f"Unknown split mode: {mode}")
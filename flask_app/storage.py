@@ -0,0 +1,313 @@
+"""
+Result storage backends for Flask PDF Tools.
+
+PyPDF2 and the split process pool write plain files, so merge and split
+outputs are always staged in a local expiry bucket first (see
+flask_app.expiry). Registering them hands each finished file to the
+configured backend:
+
+- LocalStorage keeps files where they were written (single node)
+- MemoryStorage keeps the bytes in process memory, bounded by a size cap
+  with least-recently-used eviction
+- S3Storage uploads them to an S3-compatible object store (AWS, MinIO)
+  shared by every node behind the load balancer
+
+Keys are built by the backend from (bucket, session, filename).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+
+class StorageError(Exception):
+    """A result could not be stored."""
+
+
+class ResultStorage:
+    """
+    Interface for storing finished merge and split outputs.
+    """
+
+    # Every node sees the same objects (downloads may hit any node)
+    shared = False
+    # Objects live inside the local expiry buckets and go away with them
+    expires_with_buckets = False
+
+    def key(self, bucket, session, filename):
+        """Build the storage key of an output file."""
+        return "/".join(part for part in (bucket, session, filename) if part)
+
+    def put(self, key, path, expires):
+        """
+        Store a finished file.
+
+        Args:
+            key (str): Key returned by key()
+            path (str): Local file holding the output; backends may move
+                or delete it
+            expires (float): Epoch second after which the object is stale
+        """
+        raise NotImplementedError
+
+    def open(self, key):
+        """
+        Open a stored object for reading.
+
+        Returns:
+            Binary file object
+
+        Raises:
+            FileNotFoundError: The object does not exist or has expired
+        """
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """Filesystem path of an object on this node, or None."""
+        return None
+
+    def delete(self, keys):
+        """Delete objects; missing keys are ignored."""
+        raise NotImplementedError
+
+    def expire(self, now):
+        """Drop objects that expired before now."""
+
+    def find(self, filename, now=None):
+        """Key of a file written by another node, or None (shared backends only)."""
+        return None
+
+    def find_session(self, session, now=None):
+        """(filename, key) pairs of a session written by another node."""
+        return []
+
+
+class LocalStorage(ResultStorage):
+    """Keep outputs in the expiry buckets under the upload folder."""
+
+    expires_with_buckets = True
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Upload folder holding the expiry buckets
+        """
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key, path, expires):
+        target = self._path(key)
+        if os.path.abspath(path) != target:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+
+    def open(self, key):
+        return open(self._path(key), "rb")
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+class MemoryStorage(ResultStorage):
+    """
+    Keep outputs in process memory with a size cap and LRU eviction.
+
+    Objects are per process: use a single worker, or pin clients to a
+    worker, when downloads must find their outputs.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Total size of stored objects before the least
+                recently used ones are evicted
+        """
+        self.max_bytes = max_bytes
+        self._objects = OrderedDict()  # key -> (data, expires)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    @property
+    def size(self):
+        """Bytes currently stored."""
+        return self._size
+
+    def put(self, key, path, expires):
+        with open(path, "rb") as source:
+            data = source.read()
+        if len(data) > self.max_bytes:
+            raise StorageError(f"{key} is larger than the memory storage limit")
+        os.remove(path)
+
+        with self._lock:
+            self._discard(key)
+            self._objects[key] = (data, expires)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._objects)))
+
+    def open(self, key):
+        with self._lock:
+            entry = self._objects.get(key)
+            if entry is None or entry[1] <= time.time():
+                raise FileNotFoundError(key)
+            self._objects.move_to_end(key)
+        return BytesIO(entry[0])
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._discard(key)
+
+    def expire(self, now):
+        with self._lock:
+            for key in [key for key, (_, expires) in self._objects.items() if expires <= now]:
+                self._discard(key)
+
+    def _discard(self, key):
+        """Remove an object; caller holds the lock."""
+        entry = self._objects.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+
+class S3Storage(ResultStorage):
+    """
+    Store outputs in an S3-compatible object store shared by all nodes.
+
+    Output filenames are unique (split pages start with their session id),
+    so objects are keyed by filename alone and any node can find them.
+    Expired objects are deleted by the expiry sweep of the node that wrote
+    them; a bucket lifecycle rule is a good safety net.
+    """
+
+    shared = True
+
+    def __init__(self, client, bucket, prefix="", ttl=3600):
+        """
+        Args:
+            client: boto3 S3 client
+            bucket (str): Object store bucket name
+            prefix (str): Key prefix for all outputs
+            ttl (int): Seconds an object is served after it was written
+        """
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, ttl=3600):
+        """
+        Create a backend from an s3://bucket/prefix URL.
+
+        An ``endpoint_url`` query parameter selects a non-AWS server such
+        as MinIO; credentials come from the usual AWS environment.
+
+        Raises:
+            RuntimeError: The boto3 package is not installed
+        """
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError(
+                "RESULT_STORAGE_URL points to S3 but the 'boto3' package is not installed."
+            ) from e
+        parsed = urlparse(url)
+        options = {name: values[-1] for name, values in parse_qs(parsed.query).items()}
+        client = boto3.client("s3", **options)
+        prefix = parsed.path.lstrip("/")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        return cls(client, parsed.netloc, prefix=prefix, ttl=ttl)
+
+    def key(self, bucket, session, filename):
+        return f"{self.prefix}{filename}"
+
+    def put(self, key, path, expires):
+        try:
+            self.client.upload_file(
+                path, self.bucket, key,
+                ExtraArgs={"ContentType": "application/pdf", "Metadata": {"expires": str(expires)}},
+            )
+        except Exception as e:
+            raise StorageError(f"Could not upload {key}: {e}") from e
+        os.remove(path)
+
+    def open(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey as e:
+            raise FileNotFoundError(key) from e
+        return response["Body"]
+
+    def delete(self, keys):
+        keys = list(keys)
+        # DeleteObjects accepts at most 1000 keys per call
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+
+    def _is_live(self, last_modified, now):
+        return last_modified.timestamp() + self.ttl > now
+
+    def find(self, filename, now=None):
+        now = time.time() if now is None else now
+        key = self.key(None, None, filename)
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError:
+            return None
+        return key if self._is_live(response["LastModified"], now) else None
+
+    def find_session(self, session, now=None):
+        now = time.time() if now is None else now
+        pages = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{session}_"):
+            for item in page.get("Contents", []):
+                if self._is_live(item["LastModified"], now):
+                    pages.append((item["Key"][len(self.prefix):], item["Key"]))
+        return pages
+
+
+def create_storage(url, root, ttl=3600):
+    """
+    Create a result storage backend from a URL.
+
+    Args:
+        url (str): ``file://`` (the upload folder), ``memory://?max_size=MB``
+            or ``s3://bucket/prefix?endpoint_url=...``
+        root (str): Upload folder
+        ttl (int): Seconds outputs are kept
+
+    Returns:
+        ResultStorage: Configured backend
+    """
+    parsed = urlparse(url or "file://")
+    if parsed.scheme == "file":
+        return LocalStorage(root)
+    if parsed.scheme == "memory":
+        options = parse_qs(parsed.query)
+        max_size = int(options.get("max_size", ["256"])[-1])
+        return MemoryStorage(max_bytes=max_size * 1024 * 1024)
+    if parsed.scheme == "s3":
+        return S3Storage.from_url(url, ttl=ttl)
+    raise ValueError(f"Unsupported result storage: {url}")
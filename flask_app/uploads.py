@@ -0,0 +1,170 @@
+"""
+Upload ingestion for Flask PDF Tools.
+"""
+
+import hashlib
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import UnsupportedMediaType
+
+from flask_app.pdf_ops import MappedFile
+from flask_app.result_cache import hash_stream
+from flask_app.utils import allowed_file
+
+PDF_HEADER = b"%PDF-"
+PDF_EOF_MARKER = b"%%EOF"
+# PDF readers accept a header within the first KiB and look for the end of
+# file marker within the last KiB
+SNIFF_BYTES = 1024
+
+
+class UploadRejected(UnsupportedMediaType):
+    """An upload named .pdf does not look like a PDF."""
+
+    def __init__(self, filename, reason=""):
+        super().__init__(f"Invalid PDF: {filename}")
+        self.filename = filename
+        self.reason = reason
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """
+    Spooled upload stream that hashes, and optionally sniffs, what is written.
+    """
+
+    def __init__(self, max_size, filename=None, sniff=False):
+        """
+        Args:
+            max_size (int): Bytes kept in memory before rolling over to disk
+            filename (str): Client filename, used in errors
+            sniff (bool): Check the PDF header and end of file marker
+        """
+        super().__init__(max_size=max_size, mode="w+b")
+        self.filename = filename
+        self.sniff = sniff
+        self.size = 0
+        self.digest = None
+        self._hash = hashlib.blake2b(digest_size=32)
+        self._head = b""
+        self._tail = b""
+        self._map = None
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        if self.sniff:
+            if len(self._head) < SNIFF_BYTES:
+                self._head = (self._head + data)[:SNIFF_BYTES]
+                if len(self._head) == SNIFF_BYTES and PDF_HEADER not in self._head:
+                    raise UploadRejected(self.filename, "no %PDF- header")
+            self._tail = (self._tail + data)[-SNIFF_BYTES:]
+        return super().write(data)
+
+    def rollover(self):
+        # Roll over to a named file, which other processes can open by path
+        if self._rolled:
+            return
+        memory = self._file
+        self._file = tempfile.NamedTemporaryFile(mode="w+b", prefix="upload-")
+        position = memory.tell()
+        self._file.write(memory.getvalue())
+        self._file.seek(position)
+        self._rolled = True
+
+    def file_path(self):
+        """
+        Path of the upload on disk, rolling a small upload over first.
+
+        The file is removed when the spool is closed.
+        """
+        self.rollover()
+        self._file.flush()
+        return self._file.name
+
+    def seek(self, *args):
+        # The parser rewinds each file once its last chunk has arrived
+        if self.digest is None:
+            self._finish()
+        return super().seek(*args)
+
+    def _finish(self):
+        """Complete the digest and the end of file check."""
+        self.digest = self._hash.hexdigest()
+        if self.sniff:
+            if PDF_HEADER not in self._head:
+                raise UploadRejected(self.filename, "no %PDF- header")
+            if PDF_EOF_MARKER not in self._tail:
+                raise UploadRejected(self.filename, "no %%EOF marker")
+
+    def mapped(self):
+        """
+        Read-only memory map of a spool that rolled over to disk.
+
+        Returns:
+            MappedFile or None: None while the upload is kept in memory
+        """
+        if not self._rolled:
+            return None
+        if self._map is None:
+            self.flush()
+            self._map = MappedFile(self.fileno(), name=self.name)
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        super().close()
+
+
+class UploadRequest(Request):
+    """Request class that spools file uploads through UploadSpool."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(
+            current_app.config["UPLOAD_SPOOL_MAX_MEMORY"],
+            filename=filename,
+            sniff=bool(filename) and allowed_file(filename),
+        )
+
+
+def upload_digest(file):
+    """
+    Content hash of an uploaded file.
+
+    Returns:
+        str: BLAKE2b hex digest, computed while the upload was spooled
+    """
+    stream = file.stream
+    if isinstance(stream, UploadSpool) and stream.digest is not None:
+        return stream.digest
+    return hash_stream(stream)
+
+
+def parser_input(file):
+    """
+    Stream of an uploaded file for PyPDF2.
+
+    Spooled files are memory-mapped so that the OS pages them in as the
+    parser seeks; small uploads are read from memory.
+    """
+    stream = file.stream
+    if isinstance(stream, UploadSpool):
+        mapped = stream.mapped()
+        if mapped is not None:
+            mapped.seek(0)
+            return mapped
+    stream.seek(0)
+    return stream
+
+
+def init_uploads(app):
+    """
+    Spool uploads through UploadSpool for this application.
+
+    Args:
+        app: Flask application instance
+    """
+    app.request_class = UploadRequest
+    return app.request_class
@@ -3,23 +3,41 @@ import os
 import secrets
 import string
 import base64
+import threading
+import time
+import zipfile
+from functools import lru_cache, partial
 from io import BytesIO
 from captcha.image import ImageCaptcha
 
+# ImageCaptcha keeps loaded FreeType fonts; rendering with a shared instance
+# is not guaranteed to be thread-safe.
+_captcha_render_lock = threading.Lock()
+
 
 def generate_captcha_text(length=5):
     """Generate a cryptographically secure random string for CAPTCHA."""
     return "".join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(length))
 
 
-def generate_captcha_image(text):
-    """Generate a CAPTCHA image as a Base64 string."""
-    image_generator = ImageCaptcha(width=280, height=90)
-    image = image_generator.generate_image(text)
+@lru_cache(maxsize=1)
+def _image_captcha():
+    """Return a shared ImageCaptcha instance so fonts are loaded only once."""
+    return ImageCaptcha(width=280, height=90)
+
+
+def render_captcha_png(text):
+    """Render a CAPTCHA image as raw PNG bytes."""
+    with _captcha_render_lock:
+        image = _image_captcha().generate_image(text)
     buffered = BytesIO()
     image.save(buffered, format="PNG")
-    base64_image = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return base64_image
+    return buffered.getvalue()
+
+
+def generate_captcha_image(text):
+    """Generate a CAPTCHA image as a Base64 string."""
+    return base64.b64encode(render_captcha_png(text)).decode("utf-8")
 
 
 def allowed_file(filename, allowed_extensions=None):
@@ -30,13 +48,82 @@ def allowed_file(filename, allowed_extensions=None):
 
 
 def cleanup_uploads(upload_folder, cleanup_interval):
-    """Remove files older than a specified interval from the upload folder."""
-    import time
+    """
+    Remove files older than a specified interval from the top level of the upload folder.
+
+    Hidden files such as the expiry index are left alone; expiry buckets are
+    directories and are removed by ExpiryIndex.sweep().
+    """
     current_time = time.time()
     for filename in os.listdir(upload_folder):
+        if filename.startswith("."):
+            continue
         file_path = os.path.join(upload_folder, filename)
         if os.path.isfile(file_path) and current_time - os.path.getmtime(file_path) > cleanup_interval:
             try:
                 os.remove(file_path)
             except OSError as e:
-                logging.error(f"Error removing file {file_path}: {e}")
\ No newline at end of file
+                logging.error(f"Error removing file {file_path}: {e}")
+
+
+class _ZipSink:
+    """Write-only, non-seekable buffer that ZipFile streams into."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return and forget everything written so far."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip_stream(members, chunk_size=64 * 1024):
+    """
+    Build a ZIP archive on the fly and yield it chunk by chunk.
+
+    Members are stored without recompression and no archive is written to
+    disk, so memory use stays at about one chunk regardless of member count.
+
+    Args:
+        members: Iterable of (archive name, source) pairs; a source is a
+            file path or a callable returning a readable binary file object
+        chunk_size (int): Bytes read from each member at a time
+
+    Yields:
+        bytes: Consecutive pieces of the archive
+    """
+    sink = _ZipSink()
+    # ZipFile detects the sink is not seekable and uses data descriptors
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, member in members:
+            if callable(member):
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                opener = member
+            else:
+                info = zipfile.ZipInfo.from_file(member, arcname)
+                opener = partial(open, member, "rb")
+            info.compress_type = zipfile.ZIP_STORED
+            with opener() as source, archive.open(info, mode="w") as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
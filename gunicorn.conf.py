@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for Flask PDF Tools.
+
+gunicorn reads this file from the working directory, so running
+``gunicorn app:app`` from the project root uses it (the Dockerfile passes
+it explicitly with ``-c``).
+
+The default sync worker spends a whole process on each request for as
+long as its client takes to upload or download, so a few slow clients
+occupy every worker. This profile uses threaded workers (gthread): request
+I/O waits in threads, while the CPU-bound PyPDF2 work of each worker runs
+in its own process pool (PDF_POOL_WORKERS, see flask_app/pdf_pool.py), so
+a merge does not hold the GIL against the worker's other requests.
+
+Sizes derive from the CPU count unless set in the environment:
+
+- GUNICORN_WORKERS: app worker processes, half the CPUs (at least 2)
+- GUNICORN_THREADS: request threads per worker (gthread), 16
+- PDF_POOL_WORKERS: PDF processes per worker, the CPUs shared between the
+  workers (at least 1)
+
+GUNICORN_WORKER_CLASS=gevent selects gevent workers instead (install the
+``gevent`` package); GUNICORN_WORKER_CONNECTIONS then bounds concurrent
+requests per worker. PDF work still goes to the process pool.
+"""
+
+import os
+
+cpus = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", 0)) or max(2, cpus // 2)
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+# Slow mobile uploads of a full MAX_CONTENT_LENGTH body must fit in here
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Workers inherit the environment of the master, which reads this file
+os.environ.setdefault("PDF_POOL_WORKERS", str(max(1, cpus // workers)))
+
+
+def worker_exit(server, worker):
+    """Stop the worker's PDF pool along with the worker."""
+    pool = getattr(getattr(worker, "wsgi", None), "pdf_pool", None)
+    if pool is not None:
+        pool.shutdown(wait=False)
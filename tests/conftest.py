@@ -0,0 +1,52 @@
+"""
+Shared fixtures and helpers for the test suite.
+"""
+
+import os
+import pytest
+from io import BytesIO
+from PyPDF2 import PdfWriter
+
+from flask_app.expiry import init_expiry
+
+
+def make_pdf(pages=1, width=200, height=200, password=None, bookmarks=(), numbered=False):
+    """
+    Build a valid PDF with the given number of blank pages.
+
+    Args:
+        pages (int): Number of pages
+        width (int): Page width
+        height (int): Page height
+        password (str): Encrypt the document with this user password
+        bookmarks (tuple): Page indexes that get a top-level bookmark
+        numbered (bool): Give the pages widths 101, 102, ... so they can be told apart
+    """
+    writer = PdfWriter()
+    for index in range(pages):
+        writer.add_blank_page(width=101 + index if numbered else width, height=height)
+    for index in bookmarks:
+        writer.add_outline_item(f"Chapter at {index}", index)
+    if password is not None:
+        writer.encrypt(password)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Fixture to create a test Flask application writing to a temporary folder."""
+    from flask_app import create_app
+    app = create_app("testing")
+    app.config["UPLOAD_FOLDER"] = str(tmp_path / "uploads")
+    os.makedirs(app.config["UPLOAD_FOLDER"])
+    init_expiry(app)
+    app.result_cache.clear()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """Fixture to create a test client."""
+    return app.test_client()
@@ -0,0 +1,260 @@
+"""
+Tests for the ASGI entry point.
+"""
+
+import asyncio
+import uuid
+import pytest
+from flask import request as flask_request
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.asgi import AsgiApp, FileResponse, build_environ
+
+
+@pytest.fixture
+def asgi(app):
+    asgi = AsgiApp(app, threads=2)
+    yield asgi
+    asgi.shutdown()
+
+
+def session_cookie(app, **values):
+    return app.session_interface.get_signing_serializer(app).dumps(values)
+
+
+def multipart(fields, files):
+    """Multipart body from form fields and (field, filename, data) files."""
+    boundary = uuid.uuid4().hex
+    body = b""
+    for name, value in fields.items():
+        body += f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    for name, filename, data in files:
+        body += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: application/pdf\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+def request(asgi, method, path, body=b"", headers=(), chunk=None, disconnect_after=None, declare_length=True):
+    """
+    Run one request through the ASGI app.
+
+    Returns:
+        tuple: (status, headers dict, body, number of body messages); status
+        is None if no response was started
+    """
+    chunk = chunk or max(len(body), 1)
+    chunks = [body[start:start + chunk] for start in range(0, len(body), chunk)] or [b""]
+    if disconnect_after is not None:
+        chunks = chunks[:disconnect_after]
+    messages = [
+        {"type": "http.request", "body": data, "more_body": index < len(chunks) - 1 or disconnect_after is not None}
+        for index, data in enumerate(chunks)
+    ]
+    if disconnect_after is not None:
+        messages.append({"type": "http.disconnect"})
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(0)
+        if not messages:
+            # Like a server: nothing more until the client disconnects
+            await asyncio.Event().wait()
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers]
+        + ([(b"content-length", str(len(body)).encode())] if body and declare_length else []),
+        "client": ("203.0.113.9", 50000),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(asgi(scope, receive, send))
+
+    if not sent:
+        return None, {}, b"", 0
+    start = sent[0]
+    bodies = [message for message in sent[1:] if message["type"] == "http.response.body"]
+    return (
+        start["status"],
+        {name.decode(): value.decode() for name, value in start["headers"]},
+        b"".join(message.get("body", b"") for message in bodies),
+        len(bodies),
+    )
+
+
+class TestBuildEnviron:
+    """Test the translation of ASGI scopes to WSGI environs."""
+
+    def test_headers_and_paths(self):
+        scope = {
+            "method": "GET", "path": "/download/a b.pdf", "query_string": b"async=1",
+            "headers": [(b"cookie", b"a=1"), (b"cookie", b"b=2"), (b"content-type", b"text/plain")],
+            "client": ("198.51.100.4", 1234), "server": ("example.com", 443), "scheme": "https",
+        }
+        environ = build_environ(scope, BytesIO(), 0)
+        assert environ["PATH_INFO"] == "/download/a b.pdf"
+        assert environ["QUERY_STRING"] == "async=1"
+        assert environ["HTTP_COOKIE"] == "a=1; b=2"
+        assert environ["CONTENT_TYPE"] == "text/plain"
+        assert environ["REMOTE_ADDR"] == "198.51.100.4"
+        assert environ["wsgi.url_scheme"] == "https"
+        assert environ["wsgi.file_wrapper"] is FileResponse
+
+
+class TestAsgiApp:
+    """Test requests served through the ASGI app."""
+
+    def test_home(self, asgi):
+        status, headers, body, _ = request(asgi, "GET", "/")
+        assert status == 200
+        assert headers["content-type"].startswith("text/html")
+        assert b"Extract" in body
+
+    def test_join_with_chunked_upload(self, app, asgi):
+        content_type, body = multipart(
+            {"captcha_answer": "12345"},
+            [("pdf_files", "a.pdf", make_pdf(2)), ("pdf_files", "b.pdf", make_pdf(1))],
+        )
+        cookie = session_cookie(app, join_captcha_text="12345")
+        status, headers, data, messages = request(
+            asgi, "POST", "/join", body, chunk=1000,
+            headers=[("content-type", content_type), ("cookie", f"session={cookie}")],
+        )
+        assert status == 200
+        assert headers["content-type"] == "application/pdf"
+        assert len(PdfReader(BytesIO(data)).pages) == 3
+
+    def test_file_download_is_streamed(self, app, asgi):
+        app.config["JOIN_STREAM_RESPONSE"] = False
+        content_type, body = multipart(
+            {"captcha_answer": "12345"},
+            [("pdf_files", "a.pdf", make_pdf(300)), ("pdf_files", "b.pdf", make_pdf(300))],
+        )
+        cookie = session_cookie(app, join_captcha_text="12345")
+        status, _, data, messages = request(
+            asgi, "POST", "/join", body,
+            headers=[("content-type", content_type), ("cookie", f"session={cookie}")],
+        )
+        assert status == 200
+        assert len(PdfReader(BytesIO(data)).pages) == 600
+        # Sent in chunks from the file, plus the closing message
+        assert messages == -(-len(data) // 65536) + 1
+
+    def test_declared_body_too_large(self, app, asgi):
+        size = app.config["MAX_CONTENT_LENGTH"] + 1
+        status, _, _, _ = request(asgi, "POST", "/join", headers=[("content-length", str(size))])
+        assert status == 413
+
+    def test_body_too_large_while_received(self, app, asgi):
+        asgi.max_content_length = 200
+        content_type, body = multipart({"captcha_answer": "12345"}, [("pdf_files", "a.pdf", make_pdf(1))])
+        # No Content-Length: the limit applies to what arrives
+        status, _, _, _ = request(
+            asgi, "POST", "/join", body, chunk=100, declare_length=False, headers=[("content-type", content_type)],
+        )
+        assert status == 413
+
+    def test_disconnect_during_upload(self, app, asgi):
+        called = []
+        app.before_request(lambda: called.append(True))
+        content_type, body = multipart({"captcha_answer": "12345"}, [("pdf_files", "a.pdf", make_pdf(1))])
+        status, _, _, _ = request(
+            asgi, "POST", "/join", body, chunk=100, disconnect_after=2, headers=[("content-type", content_type)],
+        )
+        assert status is None
+        assert called == []
+
+    def test_large_body_is_read_from_the_connection(self, app, asgi):
+        asgi.spool_max_memory = 1000
+        started = []
+        app.before_request(lambda: started.append(flask_request.environ["wsgi.input"].received))
+        content_type, body = multipart(
+            {"captcha_answer": "12345"}, [("pdf_files", "a.pdf", make_pdf(20)), ("pdf_files", "b.pdf", make_pdf(1))],
+        )
+        cookie = session_cookie(app, join_captcha_text="12345")
+        status, _, data, _ = request(
+            asgi, "POST", "/join", body, chunk=500,
+            headers=[("content-type", content_type), ("cookie", f"session={cookie}")],
+        )
+        assert status == 200
+        assert len(PdfReader(BytesIO(data)).pages) == 21
+        # The application started before the upload was complete
+        assert started == [1000]
+
+    def test_body_too_large_while_read_by_the_app(self, app, asgi):
+        asgi.spool_max_memory = 100
+        asgi.max_content_length = 500
+        content_type, body = multipart({"captcha_answer": "12345"}, [("pdf_files", "a.pdf", make_pdf(3))])
+        status, _, _, _ = request(
+            asgi, "POST", "/join", body, chunk=100, declare_length=False, headers=[("content-type", content_type)],
+        )
+        assert status == 413
+
+    def test_disconnect_while_read_by_the_app(self, app, asgi):
+        asgi.spool_max_memory = 100
+        content_type, body = multipart({"captcha_answer": "12345"}, [("pdf_files", "a.pdf", make_pdf(3))])
+        status, _, _, _ = request(
+            asgi, "POST", "/join", body, chunk=100, disconnect_after=3, headers=[("content-type", content_type)],
+        )
+        assert status is None
+
+    def test_disconnect_stops_streamed_response(self, app, asgi):
+        produced = []
+        closed = []
+
+        def chunks():
+            try:
+                while True:
+                    produced.append(True)
+                    yield b"x" * 1024
+            finally:
+                closed.append(True)
+
+        app.add_url_rule("/endless", "endless", lambda: app.response_class(chunks()))
+        sent = []
+        gone = asyncio.Event()
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 4:
+                gone.set()
+
+        scope = {"type": "http", "method": "GET", "path": "/endless", "headers": []}
+        asyncio.run(asgi(scope, receive, send))
+        assert closed == [True]
+        assert len(produced) < 10
+        assert sent[-1].get("more_body") is True
+
+    def test_lifespan(self, asgi):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(asgi({"type": "lifespan"}, receive, send))
+        assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
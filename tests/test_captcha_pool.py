@@ -0,0 +1,114 @@
+"""
+Tests for the pre-rendered CAPTCHA pool.
+"""
+
+import pytest
+
+from flask_app.captcha_pool import CaptchaPool
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def app(app):
+    """Test application whose CAPTCHA pool is stopped afterwards."""
+    yield app
+    app.captcha_pool.stop()
+
+
+class TestCaptchaPool:
+    """Test pool handout and refill behaviour."""
+
+    def test_fill_renders_up_to_size(self):
+        pool = CaptchaPool(size=3, low_watermark=1)
+        assert pool.fill() == 3
+        assert pool.stats()["available"] == 3
+        assert pool.fill() == 0
+
+    def test_take_hands_out_each_challenge_once(self):
+        pool = CaptchaPool(size=3, low_watermark=0)
+        pool.fill()
+        pool._stopped.set()  # keep the worker from refilling during the test
+        taken = [pool.take() for _ in range(3)]
+        assert len({text for text, _ in taken}) == 3
+        assert all(png.startswith(PNG_SIGNATURE) for _, png in taken)
+        assert pool.stats()["hits"] == 3
+
+    def test_empty_pool_falls_back_to_inline_render(self):
+        pool = CaptchaPool(size=0, low_watermark=0)
+        text, png = pool.take()
+        assert len(text) == 5
+        assert png.startswith(PNG_SIGNATURE)
+        stats = pool.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 0
+
+    def test_refill_latency_is_recorded(self):
+        pool = CaptchaPool(size=2, low_watermark=1)
+        pool.fill()
+        stats = pool.stats()
+        assert stats["refills"] == 1
+        assert stats["rendered"] == 2
+        assert stats["refill_seconds_last"] > 0
+
+    def test_background_worker_refills(self):
+        pool = CaptchaPool(size=2, low_watermark=2)
+        pool.take()
+        for _ in range(100):
+            if pool.stats()["available"] == 2:
+                break
+            pool._stopped.wait(0.05)
+        pool.stop()
+        assert pool.stats()["available"] == 2
+
+
+class TestHomeUsesPool:
+    """Test that the home page draws challenges from the pool."""
+
+    def test_home_consumes_one_challenge_per_form(self, app):
+        client = app.test_client()
+        before = app.captcha_pool.stats()
+        response = client.get("/")
+        assert response.status_code == 200
+        after = app.captcha_pool.stats()
+        served = (after["hits"] + after["misses"]) - (before["hits"] + before["misses"])
+        assert served == 3
+
+
+class TestCaptchaImageEndpoint:
+    """Test serving CAPTCHA images by token."""
+
+    def test_home_references_image_urls(self, app):
+        client = app.test_client()
+        response = client.get("/")
+        assert b"data:image/png;base64" not in response.data
+        with client.session_transaction() as sess:
+            token = sess["join_captcha_token"]
+        assert f"/captcha/{token}.png".encode() in response.data
+
+    def test_issued_image_is_served_with_cache_headers(self, app):
+        client = app.test_client()
+        client.get("/")
+        with client.session_transaction() as sess:
+            token = sess["split_captcha_token"]
+        response = client.get(f"/captcha/{token}.png")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert response.data.startswith(PNG_SIGNATURE)
+        assert "private" in response.headers["Cache-Control"]
+        assert response.headers["ETag"]
+
+    def test_unknown_token_is_rejected(self, app):
+        client = app.test_client()
+        client.get("/")
+        response = client.get("/captcha/not-a-token.png")
+        assert response.status_code == 404
+
+    def test_image_is_rendered_from_session_when_not_in_pool(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["join_captcha_token"] = "other-worker"
+            sess["join_captcha_text"] = "ABCDE"
+        response = client.get("/captcha/other-worker.png")
+        assert response.status_code == 200
+        assert response.data.startswith(PNG_SIGNATURE)
@@ -0,0 +1,153 @@
+"""
+Tests for the expiry index of generated files.
+"""
+
+import os
+
+from flask_app.expiry import INDEX_FILENAME, ExpiryIndex
+from flask_app.utils import cleanup_uploads
+
+
+def write_file(index, bucket, name, session=None):
+    """Create a small file inside a bucket."""
+    path = os.path.join(index.output_dir(bucket, session), name)
+    with open(path, "wb") as output:
+        output.write(b"%PDF")
+    return path
+
+
+class TestExpiryIndex:
+    """Test bucketing, lookups and sweeping."""
+
+    def test_bucket_is_rounded_up_to_expiry(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        assert index.new_bucket(now=1000) == "1140"
+        assert index.new_bucket(now=1019) == "1140"
+        assert index.new_bucket(now=1041) == "1200"
+        assert os.path.isdir(tmp_path / "1140")
+
+    def test_lookup_resolves_registered_files(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        bucket = index.new_bucket(now=1000)
+        path = write_file(index, bucket, "a.pdf")
+        index.register(bucket, ["a.pdf"])
+
+        assert index.lookup("a.pdf", now=1000) == "1140/a.pdf"
+        assert index.storage.local_path("1140/a.pdf") == path
+        assert index.lookup("a.pdf", now=1140) is None
+        assert index.lookup("missing.pdf", now=1000) is None
+
+    def test_lookup_without_index_does_not_create_it(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path))
+        assert index.lookup("a.pdf") is None
+        assert index.session_files("sid") == []
+        assert not os.path.exists(tmp_path / INDEX_FILENAME)
+
+    def test_session_files(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        bucket = index.new_bucket(now=1000)
+        for name in ("s_1.pdf", "s_2.pdf"):
+            write_file(index, bucket, name, session="s")
+        write_file(index, bucket, "t_1.pdf", session="t")
+        index.register(bucket, ["s_1.pdf", "s_2.pdf"], session="s")
+        index.register(bucket, ["t_1.pdf"], session="t")
+        assert sorted(name for name, _ in index.session_files("s", now=1000)) == ["s_1.pdf", "s_2.pdf"]
+
+    def test_sweep_removes_only_expired_buckets(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        old = index.new_bucket(now=1000)
+        live = index.new_bucket(now=2000)
+        write_file(index, old, "old.pdf")
+        live_path = write_file(index, live, "live.pdf")
+        index.register(old, ["old.pdf"])
+        index.register(live, ["live.pdf"])
+        os.makedirs(tmp_path / "jobs")
+
+        assert index.sweep(now=1500) == 1
+        assert not os.path.exists(index.bucket_path(old))
+        assert os.path.exists(live_path)
+        assert os.path.isdir(tmp_path / "jobs")
+        assert index.storage.local_path(index.lookup("live.pdf", now=1500)) == live_path
+        assert index.session_files(None, now=0) == []
+
+    def test_sweeper_thread_runs_sweep(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=0, bucket_seconds=1)
+        bucket = index.new_bucket()
+        write_file(index, bucket, "a.pdf")
+        index.register(bucket, ["a.pdf"])
+        index.start_sweeper()
+        try:
+            index._sweeper.join(timeout=3)
+            assert index._sweeper.is_alive()
+            assert not os.path.exists(index.bucket_path(bucket))
+        finally:
+            index.stop_sweeper()
+
+    def test_legacy_cleanup_keeps_index(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path))
+        bucket = index.new_bucket()
+        write_file(index, bucket, "a.pdf")
+        index.register(bucket, ["a.pdf"])
+        cleanup_uploads(str(tmp_path), cleanup_interval=-1)
+        assert os.path.exists(tmp_path / INDEX_FILENAME)
+
+
+class TestSessionStorage:
+    """Test per-session directories and the in-memory manifest."""
+
+    def register_session(self, index, session, count, now=1000):
+        bucket = index.new_bucket(now=now)
+        directory = index.output_dir(bucket, session)
+        names = [f"{session}_doc_page_{n}.pdf" for n in range(1, count + 1)]
+        for name in names:
+            with open(os.path.join(directory, name), "wb") as output:
+                output.write(b"%PDF-1.4")
+        index.register(bucket, names, session=session, now=now)
+        return bucket, names
+
+    def test_session_outputs_live_in_their_own_directory(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        bucket, names = self.register_session(index, "sid", 2)
+        assert sorted(os.listdir(tmp_path / bucket / "sid")) == names
+        assert index.lookup(names[0], now=1000) == f"{bucket}/sid/{names[0]}"
+        assert index.storage.local_path(f"{bucket}/sid/{names[0]}") == str(tmp_path / bucket / "sid" / names[0])
+
+    def test_manifest_records_sizes_and_expiry(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        bucket, names = self.register_session(index, "sid", 2)
+        entry = index.manifest("sid", now=1000)
+        assert entry["bucket"] == bucket
+        assert entry["expires"] == 1140
+        assert entry["files"] == {name: 8 for name in names}
+        assert index.manifest("sid", now=1140) is None
+
+    def test_manifest_answers_without_the_index(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        _, names = self.register_session(index, "sid", 3)
+        os.remove(tmp_path / INDEX_FILENAME)
+        assert index.lookup(names[1], now=1000) is not None
+        assert sorted(name for name, _ in index.session_files("sid", now=1000)) == names
+
+    def test_other_processes_fall_back_to_the_index(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        _, names = self.register_session(index, "sid", 2)
+        other = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        assert other.manifest("sid", now=1000) is None
+        assert other.lookup(names[0], now=1000) == index.lookup(names[0], now=1000)
+
+    def test_expire_session_removes_directory_and_rows(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        bucket, names = self.register_session(index, "sid", 2)
+        _, kept = self.register_session(index, "other", 1)
+        index.expire_session("sid")
+        assert not os.path.exists(tmp_path / bucket / "sid")
+        assert index.lookup(names[0], now=1000) is None
+        assert ExpiryIndex(str(tmp_path)).session_files("sid", now=1000) == []
+        assert index.lookup(kept[0], now=1000) is not None
+
+    def test_sweep_prunes_manifest(self, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60)
+        self.register_session(index, "old", 1, now=1000)
+        self.register_session(index, "new", 1, now=2000)
+        index.sweep(now=1500)
+        assert list(index._manifest) == ["new"]
@@ -0,0 +1,118 @@
+"""
+Tests for extracting and reordering pages into one document.
+"""
+
+import os
+import pytest
+from flask import get_flashed_messages, url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.pdf_ops import select_pages
+from flask_app.split_spec import SplitSpecError
+
+
+def make_shared_resource_pdf(pages):
+    """Assemble a PDF whose pages all use one 4 KiB form XObject."""
+    shared = pages + 3
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (3 + index) for index in range(pages)), pages
+        ),
+    ]
+    objects += [
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d 200] /Resources << /XObject << /X0 %d 0 R >> >> >>"
+        % (101 + index, shared)
+        for index in range(pages)
+    ]
+    objects.append(b"<< /Type /XObject /Subtype /Form /BBox [0 0 1 1] /Length 4096 >>\nstream\n"
+                   + b"%" * 4096 + b"\nendstream")
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+def widths(data):
+    return [int(page.mediabox.width) for page in PdfReader(BytesIO(data)).pages]
+
+
+class TestSelectPages:
+    """Test writing a page selection from one reader pass."""
+
+    def test_order_is_kept(self):
+        output = BytesIO()
+        assert select_pages(BytesIO(make_pdf(5, numbered=True)), "4,1-2,5-4", output) == 5
+        assert widths(output.getvalue()) == [104, 101, 102, 105, 104]
+
+    def test_shared_resources_are_written_once(self):
+        output = BytesIO()
+        select_pages(BytesIO(make_shared_resource_pdf(4)), "4-1,2", output)
+        assert widths(output.getvalue()) == [104, 103, 102, 101, 102]
+        assert output.getvalue().count(b"%" * 4096) == 1
+
+    def test_path_output(self, tmp_path):
+        output_path = tmp_path / "out.pdf"
+        select_pages(BytesIO(make_pdf(3, numbered=True)), "2", str(output_path))
+        assert widths(output_path.read_bytes()) == [102]
+
+    def test_bad_selection(self):
+        with pytest.raises(SplitSpecError):
+            select_pages(BytesIO(make_pdf(2, numbered=True)), "3", BytesIO())
+
+
+def post_extract(client, data, pages):
+    """Submit an extract request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["extract_captcha_text"] = "XYZ12"
+    return client.post(
+        url_for("main.extract_pdf"),
+        data={"captcha_answer": "XYZ12", "pages": pages, "pdf_file": (BytesIO(data), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+
+
+class TestExtractRoute:
+    """Test the /extract endpoint."""
+
+    def test_extract_streams_one_document(self, app):
+        response = post_extract(app.test_client(), make_pdf(4, numbered=True), "3-1,4")
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        assert "extracted_" in response.headers["Content-Disposition"]
+        assert widths(response.data) == [103, 102, 101, 104]
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+    def test_extract_to_upload_folder(self, app):
+        app.config["JOIN_STREAM_RESPONSE"] = False
+        response = post_extract(app.test_client(), make_pdf(2, numbered=True), "2")
+        assert response.status_code == 200
+        assert widths(response.data) == [102]
+        response.close()
+
+    def test_bad_selection_is_flashed(self, app):
+        client = app.test_client()
+        with client:
+            response = post_extract(client, make_pdf(2, numbered=True), "5")
+            assert response.status_code == 302
+            assert get_flashed_messages() == ["Page 5 is out of range (1-2)."]
+
+    def test_wrong_captcha(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["extract_captcha_text"] = "OTHER"
+        with client:
+            client.post(
+                url_for("main.extract_pdf"),
+                data={"captcha_answer": "XYZ12", "pages": "1", "pdf_file": (BytesIO(make_pdf(1, numbered=True)), "doc.pdf")},
+                content_type="multipart/form-data",
+            )
+            assert get_flashed_messages() == ["CAPTCHA verification failed."]
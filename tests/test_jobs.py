@@ -0,0 +1,180 @@
+"""
+Tests for the background job queue.
+"""
+
+import os
+import threading
+import time
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.jobs import (
+    JOB_DONE, JOB_FAILED, JobManager, JobQueueFull, ProcessPoolBackend, ThreadPoolBackend,
+    init_jobs, prune_job_dirs, run_merge_job,
+)
+
+
+def wait_for(client, status_url, timeout=10):
+    """Poll a job status URL until the job has finished."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(status_url).get_json()
+        if data["status"] in (JOB_DONE, JOB_FAILED):
+            return data
+        time.sleep(0.02)
+    raise AssertionError("job did not finish in time")
+
+
+@pytest.fixture
+def app(app):
+    """Test application with a job manager on its upload folder."""
+    init_jobs(app)
+    yield app
+    app.job_manager.shutdown()
+
+
+class TestAsyncRoutes:
+    """Test queueing merge and split work through the routes."""
+
+    def test_join_returns_job_and_completes(self, client):
+        with client.session_transaction() as sess:
+            sess["join_captcha_text"] = "ABCDE"
+        response = client.post(
+            url_for("main.join_pdfs", **{"async": "1"}),
+            data={
+                "captcha_answer": "ABCDE",
+                "pdf_files": [(BytesIO(make_pdf(2)), "a.pdf"), (BytesIO(make_pdf(1)), "b.pdf")],
+            },
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 202
+        assert response.headers["Location"] == response.get_json()["status_url"]
+
+        data = wait_for(client, response.headers["Location"])
+        assert data["status"] == JOB_DONE
+        assert data["progress"] == {"done": 2, "total": 2}
+        assert data["result"]["pages"] == 3
+
+        download = client.get(data["downloads"][0])
+        assert download.status_code == 200
+        assert len(PdfReader(BytesIO(download.data)).pages) == 3
+        download.close()
+
+    def test_split_reports_page_progress(self, app, client):
+        app.config["ASYNC_JOBS"] = True
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(3)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 202
+
+        data = wait_for(client, response.headers["Location"])
+        assert data["status"] == JOB_DONE
+        assert data["progress"] == {"done": 3, "total": 3}
+        assert len(data["downloads"]) == 3
+        assert data["result"]["files"][0].endswith("_doc_page_1.pdf")
+
+    def test_invalid_pdf_marks_job_failed(self, app, client):
+        app.config["ASYNC_JOBS"] = True
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(b"%PDF-1.4\ngarbage\n%%EOF\n"), "bad.pdf")},
+            content_type="multipart/form-data",
+        )
+        data = wait_for(client, response.headers["Location"])
+        assert data["status"] == JOB_FAILED
+        assert data["error"] == "Invalid PDF: bad.pdf"
+
+    def test_full_queue_returns_503_with_retry_after(self, app, client):
+        app.config["ASYNC_JOBS"] = True
+        app.job_manager.max_queue_depth = 0
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(1)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(app.config["JOB_RETRY_AFTER"])
+
+    def test_unknown_job_returns_404(self, client):
+        assert client.get("/jobs/" + "0" * 32).status_code == 404
+        assert client.get("/jobs/..%2F..%2Fetc").status_code == 404
+
+
+class TestJobManager:
+    """Test the job manager independently of the routes."""
+
+    def test_queue_depth_counts_running_jobs(self, tmp_path):
+        manager = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path), max_queue_depth=1)
+        release = threading.Event()
+        job = manager.create("test")
+        manager.start(job, lambda job_id: release.wait(5))
+        with pytest.raises(JobQueueFull):
+            manager.create("test")
+        release.set()
+        manager.shutdown()
+        assert manager.get(job.id)["status"] == JOB_DONE
+
+    def test_status_is_visible_to_other_processes(self, tmp_path):
+        manager = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path))
+        job = manager.create("test")
+        manager.start(job, lambda job_id: {"files": []})
+        manager.shutdown()
+        other = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path))
+        assert other.get(job.id)["status"] == JOB_DONE
+        other.shutdown()
+
+    def test_expired_jobs_of_other_processes_are_pruned(self, tmp_path):
+        other = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path), result_ttl=60)
+        finished = other.create("test")
+        other.start(finished, lambda job_id: {"files": []})
+        other.shutdown()
+        now = time.time()
+        # The accepting process is gone; its jobs are only on disk
+        assert prune_job_dirs(str(tmp_path), 60, now=now) == 0
+        assert prune_job_dirs(str(tmp_path), 60, now=now + 120) == 1
+        assert os.listdir(tmp_path) == []
+
+    def test_queued_jobs_are_not_pruned(self, tmp_path):
+        other = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path), result_ttl=60)
+        queued = other.create("test")
+        other.shutdown()
+        now = time.time()
+        os.utime(os.path.join(queued.work_dir, "status.json"), (now - 120, now - 120))
+        assert prune_job_dirs(str(tmp_path), 60, now=now + 3600) == 0
+        assert os.path.exists(queued.work_dir)
+
+    def test_create_prunes_jobs_dir(self, tmp_path):
+        other = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path), result_ttl=0)
+        job = other.create("test")
+        other.start(job, lambda job_id: {"files": []})
+        other.shutdown()
+        manager = JobManager(ThreadPoolBackend(max_workers=1), str(tmp_path), result_ttl=0)
+        new_job = manager.create("test")
+        assert os.listdir(tmp_path) == [new_job.id]
+        manager.shutdown()
+
+    def test_process_backend_runs_merge(self, tmp_path):
+        sources = []
+        for index in range(2):
+            path = tmp_path / f"{index}.pdf"
+            path.write_bytes(make_pdf(1))
+            sources.append((path.name, str(path)))
+        output_path = tmp_path / "merged.pdf"
+
+        manager = JobManager(ProcessPoolBackend(max_workers=1), str(tmp_path / "jobs"))
+        job = manager.create("join")
+        manager.start(job, run_merge_job, sources, str(output_path))
+        manager.shutdown()
+        assert manager.get(job.id)["status"] == JOB_DONE
+        assert len(PdfReader(str(output_path)).pages) == 2
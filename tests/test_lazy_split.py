@@ -0,0 +1,164 @@
+"""
+Tests for lazy splits, built page by page on download.
+"""
+
+import os
+import zipfile
+import pytest
+from flask import get_flashed_messages, url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.expiry import init_expiry
+from flask_app.lazy_split import LazySplit
+from flask_app.pdf_ops import PageWriteError
+from flask_app.rate_limiter import RATE_LIMITS
+
+
+@pytest.fixture
+def app(app):
+    """Test application with lazy splits."""
+    app.config["SPLIT_LAZY"] = True
+    return app
+
+
+def post_split(client, data, **form):
+    """Submit a split request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["split_captcha_text"] = "12345"
+    return client.post(
+        url_for("main.split_pdf"),
+        data={"captcha_answer": "12345", "pdf_file": (BytesIO(data), "doc.pdf"), **form},
+        content_type="multipart/form-data",
+    )
+
+
+def output_files(app):
+    """List files written across all expiry buckets."""
+    return [
+        name
+        for _, _, names in os.walk(app.config["UPLOAD_FOLDER"])
+        for name in names
+        if not name.startswith(".")
+    ]
+
+
+def download_links(response):
+    text = response.get_data(as_text=True)
+    return [part.split('"', 1)[0] for part in text.split('href="/download/')[1:]]
+
+
+class TestLazySplit:
+    """Test that split requests store the source and defer page output."""
+
+    def test_split_writes_only_source_and_manifest(self, app):
+        response = post_split(app.test_client(), make_pdf(5, numbered=True))
+        assert response.status_code == 200
+        assert len(download_links(response)) == 5
+        assert sorted(name.split(".", 1)[1] for name in output_files(app)) == ["source.pdf", "split.json"]
+
+    def test_page_is_built_on_first_download(self, app):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(4, numbered=True)))
+
+        response = client.get(url_for("main.download_file", filename=names[2]))
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        reader = PdfReader(BytesIO(response.data))
+        assert [page.mediabox.width for page in reader.pages] == [103]
+        # The source was parsed by the split request
+        assert app.reader_cache.stats()["hits"] == 1
+
+        again = client.get(url_for("main.download_file", filename=names[2]))
+        assert again.data == response.data
+        assert app.page_cache.stats()["hits"] == 1
+        assert len(output_files(app)) == 2
+
+    def test_chunk_mode_ranges(self, app):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(5, numbered=True), split_mode="chunks", split_spec="2"))
+        assert [name.split("_", 2)[2] for name in names] == [
+            "pages_1-2.pdf", "pages_3-4.pdf", "page_5.pdf",
+        ]
+        response = client.get(url_for("main.download_file", filename=names[1]))
+        assert len(PdfReader(BytesIO(response.data)).pages) == 2
+
+    def test_unknown_output_of_lazy_session(self, app):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(2, numbered=True)))
+        missing = names[0].replace("page_1", "page_9")
+        with client:
+            response = client.get(url_for("main.download_file", filename=missing))
+            assert response.status_code == 302
+            assert get_flashed_messages()[-1] == "File does not exist."
+
+    def test_source_and_manifest_are_not_downloadable(self, app):
+        client = app.test_client()
+        post_split(client, make_pdf(2, numbered=True))
+        internal = output_files(app)
+        assert len(internal) == 2
+        with client:
+            for name in internal:
+                response = client.get(url_for("main.download_file", filename=name))
+                assert response.status_code == 302
+                assert get_flashed_messages()[-1] == "File does not exist."
+
+    def test_archive_builds_every_page(self, app):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(3, numbered=True)))
+        session_id = names[0].split("_", 1)[0]
+        response = client.get(url_for("main.download_archive", session_id=session_id))
+        assert response.status_code == 200
+        with zipfile.ZipFile(BytesIO(response.data)) as archive:
+            assert archive.namelist() == names
+            widths = [
+                PdfReader(BytesIO(archive.read(name))).pages[0].mediabox.width for name in names
+            ]
+        assert widths == [101, 102, 103]
+
+    def test_archive_error_is_not_a_truncated_download(self, app, monkeypatch):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(3, numbered=True)))
+        render = LazySplit.render
+
+        def failing_render(self, filename, *args, **kwargs):
+            if filename == names[2]:
+                raise PageWriteError("Could not write page 3")
+            return render(self, filename, *args, **kwargs)
+
+        monkeypatch.setattr(LazySplit, "render", failing_render)
+        response = client.get(url_for("main.download_archive", session_id=names[0].split("_", 1)[0]))
+        assert response.status_code == 500
+        assert response.mimetype != "application/zip"
+
+    def test_archive_is_charged_for_pages(self, app, monkeypatch):
+        app.config["RATELIMIT_ENABLED"] = True
+        monkeypatch.setitem(RATE_LIMITS, "download_archive", {
+            "max_requests": 10, "window_seconds": 60, "cost": {"pages_per_unit": 2},
+        })
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(5, numbered=True)))
+        response = client.get(url_for("main.download_archive", session_id=names[0].split("_", 1)[0]))
+        assert response.status_code == 200
+        assert response.content_length == len(response.data)
+        # One unit for the request, two for five pages
+        assert app.rate_limiter.get_remaining("127.0.0.1", "download_archive", max_requests=10) == 7
+
+    def test_memory_storage(self, app):
+        app.config["RESULT_STORAGE_URL"] = "memory://"
+        init_expiry(app)
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(2, numbered=True)))
+        response = client.get(url_for("main.download_file", filename=names[1]))
+        assert response.status_code == 200
+        assert PdfReader(BytesIO(response.data)).pages[0].mediabox.width == 102
+
+    def test_expired_session(self, app):
+        client = app.test_client()
+        names = download_links(post_split(client, make_pdf(2, numbered=True)))
+        app.expiry_index.expire_session(names[0].split("_", 1)[0])
+        with client:
+            response = client.get(url_for("main.download_file", filename=names[0]))
+            assert response.status_code == 302
+            assert get_flashed_messages()[-1] == "File does not exist."
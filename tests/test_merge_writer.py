@@ -0,0 +1,241 @@
+"""
+Tests for the streaming, bounded-memory merge.
+"""
+
+import pytest
+from contextlib import contextmanager
+from flask import get_flashed_messages, url_for
+from io import BytesIO
+from PyPDF2 import PdfReader, PdfWriter
+
+from conftest import make_pdf
+from flask_app import pdf_ops
+from flask_app.config import Config
+from flask_app.merge_writer import StreamingPdfWriter
+from flask_app.pdf_ops import InvalidPdfError, MergeBudgetError, merge_pdfs
+
+
+def make_raw_pdf(objects):
+    """Assemble a PDF from object bodies; object 1 must be the catalog."""
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+def inherited_pdf():
+    """Two pages inheriting their MediaBox; page 1 links to page 2."""
+    return make_raw_pdf([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 /MediaBox [0 0 300 400] >>",
+        b"<< /Type /Page /Parent 2 0 R /Contents 5 0 R /Annots [6 0 R] >>",
+        b"<< /Type /Page /Parent 2 0 R /Contents 5 0 R >>",
+        b"<< /Length 18 >>\nstream\n0 0 m 10 10 l S\n\nendstream",
+        b"<< /Type /Annot /Subtype /Link /Rect [0 0 10 10] /Dest [4 0 R /Fit] >>",
+    ])
+
+
+def bookmarked_pdf(tag, pages=3):
+    """Pages with a nested outline and a named destination."""
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    part = writer.add_outline_item(f"{tag} part", 0)
+    writer.add_outline_item(f"{tag} detail", pages - 1, parent=part)
+    writer.add_outline_item(f"{tag} end", pages - 1)
+    writer.add_named_destination(f"{tag}-middle", 1)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def outline_pages(reader, items=None):
+    """(title, page index) of an outline, nested lists for children."""
+    result = []
+    for item in reader.outline if items is None else items:
+        if isinstance(item, list):
+            result.append(outline_pages(reader, item))
+        else:
+            result.append((item.title, reader.get_destination_page_number(item)))
+    return result
+
+
+def stream_merge(*documents):
+    output = BytesIO()
+    writer = StreamingPdfWriter(output)
+    for data in documents:
+        writer.add_document(PdfReader(BytesIO(data)))
+    writer.close()
+    return writer.pages, PdfReader(BytesIO(output.getvalue()), strict=True)
+
+
+class TestStreamingPdfWriter:
+    """Test the output of the streaming writer."""
+
+    def test_pages_in_order(self):
+        pages, reader = stream_merge(make_pdf(2, width=100), make_pdf(3, width=300))
+        assert pages == 5
+        assert [page.mediabox.width for page in reader.pages] == [100, 100, 300, 300, 300]
+
+    def test_inherited_attributes_and_links(self):
+        _, reader = stream_merge(make_pdf(1), inherited_pdf())
+        assert [page.mediabox.height for page in reader.pages] == [200, 400, 400]
+        assert reader.pages[1].get_contents().get_data().startswith(b"0 0 m")
+        link = reader.pages[1]["/Annots"][0].get_object()
+        assert link["/Dest"][0].get_object() == reader.pages[2]
+        # Shared objects are written once
+        assert reader.pages[1].raw_get("/Contents") == reader.pages[2].raw_get("/Contents")
+
+    def test_bookmarks_and_named_destinations(self):
+        _, reader = stream_merge(bookmarked_pdf("A"), bookmarked_pdf("B", pages=2))
+        assert outline_pages(reader) == [
+            ("A part", 0), [("A detail", 2)], ("A end", 2),
+            ("B part", 3), [("B detail", 4)], ("B end", 4),
+        ]
+        dests = {name: reader.get_destination_page_number(dest) for name, dest in reader.named_destinations.items()}
+        assert dests == {"A-middle": 1, "B-middle": 4}
+
+    def test_encrypted_source(self):
+        _, reader = stream_merge(make_pdf(1), make_pdf(2, password=""))
+        assert len(reader.pages) == 3
+        assert not reader.is_encrypted
+
+
+class TestMergeBudget:
+    """Test engine selection and the memory budget."""
+
+    def sources(self, *documents):
+        return [(f"file{index}.pdf", BytesIO(data)) for index, data in enumerate(documents)]
+
+    def test_large_merges_release_each_reader(self, monkeypatch):
+        open_readers = []
+        peak = []
+        original = pdf_ops._open_reader
+
+        def tracked(*args, **kwargs):
+            with original(*args, **kwargs) as reader:
+                open_readers.append(reader)
+                peak.append(len(open_readers))
+                yield reader
+                open_readers.remove(reader)
+        monkeypatch.setattr(pdf_ops, "_open_reader", contextmanager(tracked))
+
+        documents = [make_pdf(2) for _ in range(5)]
+        output = BytesIO()
+        assert merge_pdfs(self.sources(*documents), output, memory_budget=len(documents[0])) == 10
+        assert max(peak) == 1
+        assert len(PdfReader(BytesIO(output.getvalue())).pages) == 10
+
+    @pytest.mark.parametrize("over_budget", [False, True])
+    def test_merges_keep_bookmarks(self, over_budget):
+        documents = [bookmarked_pdf("A"), bookmarked_pdf("B")]
+        budget = max(map(len, documents)) if over_budget else 1024 * 1024
+        outputs = {}
+        for memory_budget in (None, budget):
+            output = BytesIO()
+            merge_pdfs(self.sources(*documents), output, memory_budget=memory_budget)
+            reader = PdfReader(BytesIO(output.getvalue()))
+            outputs[memory_budget] = (outline_pages(reader), sorted(reader.named_destinations))
+        # Same bookmarks whether the merge is held in memory or streamed
+        assert outputs[budget] == outputs[None]
+        assert outputs[None][1] == ["A-middle", "B-middle"]
+
+    def test_source_over_budget_is_refused(self):
+        documents = [make_pdf(1), make_pdf(20)]
+        with pytest.raises(MergeBudgetError) as error:
+            merge_pdfs(self.sources(*documents), BytesIO(), memory_budget=len(documents[0]) + 1)
+        assert error.value.filename == "file1.pdf"
+        assert str(error.value) == "File too large to merge: file1.pdf"
+
+    def test_failed_write_leaves_no_partial_output(self, tmp_path, monkeypatch):
+        class FailingWriter(PdfWriter):
+            def write(self, stream):
+                stream.write(b"%PDF-1.3 partial")
+                raise OSError("disk full")
+        monkeypatch.setattr(pdf_ops, "PdfWriter", FailingWriter)
+        output_path = tmp_path / "merged.pdf"
+        with pytest.raises(OSError):
+            merge_pdfs(self.sources(make_pdf(1), make_pdf(1)), str(output_path))
+        assert not output_path.exists()
+
+    def test_failed_merge_leaves_no_partial_output(self, tmp_path):
+        documents = [make_pdf(1), make_pdf(1), b"%PDF-1.4 junk"]
+        output_path = tmp_path / "merged.pdf"
+        with pytest.raises(InvalidPdfError) as error:
+            merge_pdfs(self.sources(*documents), str(output_path), memory_budget=len(documents[0]))
+        assert error.value.filename == "file2.pdf"
+        assert not output_path.exists()
+
+
+def content_pdf(size, seed=0):
+    """One page whose content stream makes the file about size bytes."""
+    content = b"%" + (b"%d" % seed) * (size // len(b"%d" % seed)) + b"\n0 0 m 100 100 l S"
+    return make_raw_pdf([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+    ])
+
+
+def post_join(client, documents):
+    """Submit a join request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["join_captcha_text"] = "ABCDE"
+    files = [(BytesIO(data), f"file{i}.pdf") for i, data in enumerate(documents)]
+    return client.post(
+        url_for("main.join_pdfs"),
+        data={"captcha_answer": "ABCDE", "pdf_files": files},
+        content_type="multipart/form-data",
+    )
+
+
+class TestMergeRoutes:
+    """Test the configurable file limit and budget through the join route."""
+
+    def test_many_files_are_streamed(self, app):
+        documents = [make_pdf(1, width=100 + index) for index in range(30)]
+        app.config["MERGE_MEMORY_BUDGET"] = len(documents[0]) * 4
+        response = post_join(app.test_client(), documents)
+        assert response.status_code == 200
+        reader = PdfReader(BytesIO(response.data))
+        assert [page.mediabox.width for page in reader.pages] == [100 + index for index in range(30)]
+
+    def test_default_budget_streams_large_merges(self, app, monkeypatch):
+        # Production request limit, default budget
+        app.config["MAX_CONTENT_LENGTH"] = Config.MAX_CONTENT_LENGTH
+        assert app.config["MERGE_MEMORY_BUDGET"] == Config.MERGE_MEMORY_BUDGET
+        streamed = []
+        merge_streaming = pdf_ops._merge_streaming
+        monkeypatch.setattr(pdf_ops, "_merge_streaming", lambda *args: streamed.append(True) or merge_streaming(
+            *args
+        ))
+        size = Config.MERGE_MEMORY_BUDGET // 2 + 1024
+        documents = [content_pdf(size, index) for index in range(2)]
+        assert sum(map(len, documents)) < Config.MAX_CONTENT_LENGTH
+        response = post_join(app.test_client(), documents)
+        assert response.status_code == 200
+        assert streamed == [True]
+        assert len(PdfReader(BytesIO(response.data)).pages) == 2
+
+    def test_file_limit_is_configurable(self, app):
+        app.config["MERGE_MAX_FILES"] = 3
+        client = app.test_client()
+        with client:
+            response = post_join(client, [make_pdf(1)] * 4)
+            assert response.status_code == 302
+            assert get_flashed_messages() == ["Maximum 3 files allowed."]
+
+    def test_source_over_budget_is_flashed(self, app):
+        app.config["MERGE_MEMORY_BUDGET"] = 100
+        client = app.test_client()
+        with client:
+            response = post_join(client, [make_pdf(1), make_pdf(1)])
+            assert response.status_code == 302
+            assert get_flashed_messages() == ["File too large to merge: file0.pdf"]
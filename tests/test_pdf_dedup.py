@@ -0,0 +1,176 @@
+"""
+Tests for shared-resource deduplication and stream compression.
+"""
+
+import zlib
+from io import BytesIO
+from PyPDF2 import PdfReader
+from PyPDF2.generic import StreamObject
+
+from flask_app.jobs import run_merge_job
+from flask_app.merge_writer import StreamingPdfWriter
+from flask_app.pdf_dedup import WriteStats, stream_digest
+from flask_app.pdf_ops import merge_pdfs, select_pages
+
+CONTENT = b"q 100 0 0 100 0 0 cm /Im0 Do Q " * 20
+LOGO = bytes(range(256)) * 8
+MASK = b"\xff\x00" * 512
+
+
+def stream(body, entries=b""):
+    return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (entries, len(body), body)
+
+
+def make_raw_pdf(objects):
+    """Assemble a PDF from object bodies; object 1 must be the catalog."""
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+def letterhead_pdf():
+    """
+    Two pages whose content, logo and logo mask are separate but identical
+    objects, as written by tools that embed resources per page.
+    """
+    image = b"/Type /XObject /Subtype /Image /Width 32 /Height 64 /ColorSpace /DeviceGray " \
+            b"/BitsPerComponent 8 /SMask %d 0 R"
+    mask = b"/Type /XObject /Subtype /Image /Width 32 /Height 32 /ColorSpace /DeviceGray /BitsPerComponent 8"
+    page = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents %d 0 R " \
+           b"/Resources << /XObject << /Im0 %d 0 R >> >> >>"
+    return make_raw_pdf([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+        page % (5, 6),
+        page % (8, 9),
+        stream(CONTENT),
+        stream(LOGO, image % 7),
+        stream(MASK, mask),
+        stream(CONTENT),
+        stream(LOGO, image % 10),
+        stream(MASK, mask),
+    ])
+
+
+def stream_objects(data):
+    """Number of stream objects in a written PDF."""
+    reader = PdfReader(BytesIO(data))
+    return sum(
+        isinstance(reader.get_object(number), StreamObject)
+        for number in range(1, reader.trailer["/Size"])
+        if reader.xref[0].get(number) is not None
+    )
+
+
+def page_data(data):
+    """(content, logo, mask) of each page of a written PDF."""
+    reader = PdfReader(BytesIO(data))
+    result = []
+    for page in reader.pages:
+        image = page["/Resources"]["/XObject"]["/Im0"].get_object()
+        result.append((page.get_contents().get_data(), image.get_data(), image["/SMask"].get_object().get_data()))
+    return result
+
+
+class TestStreamDigest:
+    """Test the stream hash used to find duplicates."""
+
+    def test_length_and_key_order_ignored(self):
+        reader = PdfReader(BytesIO(letterhead_pdf()))
+        assert stream_digest(reader.get_object(5)) == stream_digest(reader.get_object(8))
+        assert stream_digest(reader.get_object(5)) != stream_digest(reader.get_object(7))
+
+    def test_references_need_an_identity(self):
+        reader = PdfReader(BytesIO(letterhead_pdf()))
+        assert stream_digest(reader.get_object(6)) is None
+        same = stream_digest(reader.get_object(6), lambda ref: 1)
+        assert same == stream_digest(reader.get_object(9), lambda ref: 1)
+        assert same != stream_digest(reader.get_object(9), lambda ref: ref.idnum)
+
+
+class TestPdfWriterDeduplication:
+    """Test deduplication of outputs written by PdfWriter."""
+
+    def test_identical_streams_written_once(self):
+        output = BytesIO()
+        stats = WriteStats()
+        select_pages(BytesIO(letterhead_pdf()), "1-2", output, stats=stats)
+        # The masks first, then the logos that referred to them
+        assert stats.duplicates == 3
+        assert stats.deduplicated_bytes == len(CONTENT) + len(LOGO) + len(MASK)
+        assert stream_objects(output.getvalue()) == 3
+        assert page_data(output.getvalue()) == [(CONTENT, LOGO, MASK)] * 2
+
+    def test_merge_shares_resources_across_documents(self):
+        output = BytesIO()
+        stats = WriteStats()
+        sources = [("a.pdf", BytesIO(letterhead_pdf())), ("b.pdf", BytesIO(letterhead_pdf()))]
+        assert merge_pdfs(sources, output, stats=stats) == 4
+        assert stats.duplicates == 9
+        assert stream_objects(output.getvalue()) == 3
+        assert page_data(output.getvalue()) == [(CONTENT, LOGO, MASK)] * 4
+
+    def test_compress_content_streams(self):
+        output = BytesIO()
+        stats = WriteStats()
+        select_pages(BytesIO(letterhead_pdf()), "1", output, compress_streams=True, stats=stats)
+        reader = PdfReader(BytesIO(output.getvalue()))
+        contents = reader.pages[0].get_contents()
+        assert reader.pages[0].raw_get("/Contents").get_object()["/Filter"] == "/FlateDecode"
+        assert contents.get_data() == CONTENT
+        assert stats.compressed_bytes > 0
+        assert stats.bytes_saved == stats.deduplicated_bytes + stats.compressed_bytes
+
+    def test_compression_is_opt_in(self):
+        output = BytesIO()
+        select_pages(BytesIO(letterhead_pdf()), "1", output)
+        contents = PdfReader(BytesIO(output.getvalue())).pages[0].raw_get("/Contents").get_object()
+        assert "/Filter" not in contents
+
+
+class TestStreamingDeduplication:
+    """Test deduplication in the streaming merge writer."""
+
+    def write(self, *documents, compress_streams=False):
+        output = BytesIO()
+        writer = StreamingPdfWriter(output, compress_streams=compress_streams)
+        for data in documents:
+            writer.add_document(PdfReader(BytesIO(data)))
+        writer.close()
+        return writer.stats, output.getvalue()
+
+    def test_identical_streams_written_once(self):
+        stats, data = self.write(letterhead_pdf(), letterhead_pdf())
+        assert stats.duplicates == 9
+        assert stream_objects(data) == 3
+        assert page_data(data) == [(CONTENT, LOGO, MASK)] * 4
+        PdfReader(BytesIO(data), strict=True)
+
+    def test_compress_content_streams(self):
+        stats, data = self.write(letterhead_pdf(), compress_streams=True)
+        raw = PdfReader(BytesIO(data)).pages[0].raw_get("/Contents").get_object()
+        assert raw["/Filter"] == "/FlateDecode"
+        assert zlib.decompress(raw._data) == CONTENT
+        assert page_data(data)[0] == (CONTENT, LOGO, MASK)
+        assert stats.compressed_bytes > 0
+
+
+class TestReporting:
+    """Test that saved bytes are reported per operation."""
+
+    def test_merge_job_reports_bytes_saved(self, tmp_path):
+        sources = []
+        for name in ("a.pdf", "b.pdf"):
+            path = tmp_path / name
+            path.write_bytes(letterhead_pdf())
+            sources.append((name, str(path)))
+        result = run_merge_job("job", sources, str(tmp_path / "merged.pdf"))
+        assert result["bytes_saved"] >= 2 * len(LOGO)
+        assert len(PdfReader(str(tmp_path / "merged.pdf")).pages) == 4
@@ -0,0 +1,282 @@
+"""
+Functional tests for PDF merge and split operations using real documents.
+"""
+
+import os
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+
+
+def output_files(app):
+    """List generated files across all expiry buckets."""
+    return [
+        name
+        for _, _, names in os.walk(app.config["UPLOAD_FOLDER"])
+        for name in names
+        if not name.startswith(".")
+    ]
+
+
+def post_join(client, documents):
+    """Submit a join request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["join_captcha_text"] = "ABCDE"
+    files = [(BytesIO(data), f"file{i}.pdf") for i, data in enumerate(documents)]
+    return client.post(
+        url_for("main.join_pdfs"),
+        data={"captcha_answer": "ABCDE", "pdf_files": files},
+        content_type="multipart/form-data",
+    )
+
+
+class TestJoin:
+    """Test merging real PDF documents."""
+
+    def test_join_streams_result_without_touching_upload_folder(self, app, client):
+        response = post_join(client, [make_pdf(2), make_pdf(3)])
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        assert "merged_" in response.headers["Content-Disposition"]
+        assert len(PdfReader(BytesIO(response.data)).pages) == 5
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+    def test_join_spills_large_results_to_disk(self, app, client):
+        app.config["JOIN_SPOOL_MAX_MEMORY"] = 16
+        response = post_join(client, [make_pdf(1), make_pdf(1)])
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.data)).pages) == 2
+        response.close()
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+    def test_join_can_write_result_to_upload_folder(self, app, client):
+        app.config["JOIN_STREAM_RESPONSE"] = False
+        response = post_join(client, [make_pdf(1), make_pdf(1)])
+        assert response.status_code == 200
+        response.close()
+        outputs = output_files(app)
+        assert len(outputs) == 1
+        assert outputs[0].startswith("merged_")
+        assert app.expiry_index.lookup(outputs[0]) is not None
+
+
+class TestParallelSplit:
+    """Test splitting pages across a process pool."""
+
+    def test_partition_covers_all_outputs(self):
+        from flask_app.pdf_ops import _partition
+        assert _partition(list(range(10)), 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+        assert _partition([1, 2], 4) == [[1], [2]]
+
+    def test_parallel_split_matches_serial_naming(self, tmp_path):
+        from flask_app.pdf_ops import split_pdf_pages
+        serial_dir = tmp_path / "serial"
+        parallel_dir = tmp_path / "parallel"
+        serial_dir.mkdir()
+        parallel_dir.mkdir()
+        data = make_pdf(10)
+
+        serial = split_pdf_pages(BytesIO(data), str(serial_dir), "sid", "doc")
+        progress = []
+        parallel = split_pdf_pages(
+            BytesIO(data), str(parallel_dir), "sid", "doc",
+            progress=lambda done, total: progress.append((done, total)), workers=2,
+        )
+
+        assert parallel == serial
+        assert parallel[0] == "sid_doc_page_1.pdf"
+        assert sorted(os.listdir(parallel_dir)) == sorted(serial)
+        assert progress[-1] == (10, 10)
+        for filename in parallel:
+            assert len(PdfReader(str(parallel_dir / filename)).pages) == 1
+
+    def test_split_route_uses_configured_workers(self, app, client):
+        app.config["SPLIT_WORKERS"] = 2
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(9)), "big.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        outputs = output_files(app)
+        assert len(outputs) == 9
+        assert all("_big_page_" in name for name in outputs)
+
+
+class TestMappedInput:
+    """Test reading path sources through a memory map."""
+
+    def test_mapped_file_reads_and_seeks(self, tmp_path):
+        from flask_app.pdf_ops import MappedFile
+        path = tmp_path / "data.bin"
+        path.write_bytes(b"0123456789")
+        with MappedFile.open(str(path)) as mapped:
+            assert len(mapped) == 10
+            assert mapped.read(4) == b"0123"
+            assert mapped.seek(-3, os.SEEK_END) == 7
+            assert mapped.read() == b"789"
+            assert mapped.read(5) == b""
+            mapped.seek(2)
+            assert mapped.readline() == b"23456789"
+            with pytest.raises(OSError):
+                mapped.write(b"x")
+        assert mapped.closed
+
+    def test_empty_file(self, tmp_path):
+        from flask_app.pdf_ops import MappedFile
+        path = tmp_path / "empty.pdf"
+        path.write_bytes(b"")
+        with MappedFile.open(str(path)) as mapped:
+            assert mapped.read() == b""
+
+    def test_path_sources_are_not_read_into_memory(self, tmp_path, monkeypatch):
+        from flask_app import pdf_ops
+        parsed = []
+        original = pdf_ops.PdfReader
+
+        def reader(stream, *args, **kwargs):
+            parsed.append(type(stream))
+            return original(stream, *args, **kwargs)
+        monkeypatch.setattr(pdf_ops, "PdfReader", reader)
+
+        paths = []
+        for index, pages in enumerate((2, 3)):
+            path = tmp_path / f"{index}.pdf"
+            path.write_bytes(make_pdf(pages))
+            paths.append((path.name, str(path)))
+        output = BytesIO()
+        assert pdf_ops.merge_pdfs(paths, output) == 5
+        split_pages = pdf_ops.split_pdf_pages(paths[1][1], str(tmp_path), "sid", "doc")
+        assert len(split_pages) == 3
+        assert parsed == [pdf_ops.MappedFile] * 3
+
+
+class TestArchiveDownload:
+    """Test streaming all split pages as one ZIP archive."""
+
+    def split(self, client, pages):
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        return client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(pages)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+
+    def test_archive_contains_pages_in_order(self, app, client):
+        import re
+        import zipfile
+        response = self.split(client, 12)
+        archive_url = re.search(rb'href="(/download-all/[^"]+)"', response.data).group(1).decode()
+
+        response = client.get(archive_url)
+        assert response.status_code == 200
+        assert response.mimetype == "application/zip"
+        assert response.content_length is None  # streamed, not buffered
+
+        with zipfile.ZipFile(BytesIO(response.data)) as archive:
+            infos = archive.infolist()
+            assert [info.filename.rsplit("_", 1)[1] for info in infos] == [f"{n}.pdf" for n in range(1, 13)]
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in infos)
+            assert len(PdfReader(BytesIO(archive.read(infos[0]))).pages) == 1
+
+    def test_pages_are_stored_per_session(self, app, client):
+        import re
+        response = self.split(client, 2)
+        page_url = re.search(rb'href="(/download/[^"]+)"', response.data).group(1).decode()
+        filename = page_url.rsplit("/", 1)[1]
+        session_id = filename.split("_", 1)[0]
+
+        entry = app.expiry_index.manifest(session_id)
+        assert sorted(entry["files"]) == sorted(output_files(app))
+        session_dir = os.path.join(app.expiry_index.bucket_path(entry["bucket"]), session_id)
+        assert sorted(os.listdir(session_dir)) == sorted(entry["files"])
+
+        response = client.get(page_url)
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.data)).pages) == 1
+        response.close()
+
+    def test_archive_rejects_invalid_session_id(self, client):
+        response = client.get("/download-all/..%2F..")
+        assert response.status_code in (302, 404)
+        response = client.get("/download-all/not-a-session")
+        assert response.status_code == 302
+
+    def test_archive_for_unknown_session_redirects(self, client):
+        response = client.get("/download-all/01234567-89a")
+        assert response.status_code == 302
+
+    def test_zip_stream_yields_bounded_chunks(self, tmp_path):
+        import zipfile
+        from flask_app.utils import iter_zip_stream
+        members = []
+        for index in range(3):
+            path = tmp_path / f"{index}.bin"
+            path.write_bytes(os.urandom(50_000))
+            members.append((path.name, str(path)))
+
+        chunks = list(iter_zip_stream(members, chunk_size=4096))
+        assert max(len(chunk) for chunk in chunks) < 4096 + 512
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as archive:
+            assert archive.testzip() is None
+            assert archive.read("1.bin") == (tmp_path / "1.bin").read_bytes()
+
+
+class TestFileOffload:
+    """Test handing file bodies to the front-end server."""
+
+    def split_page_url(self, client, pages=2):
+        import re
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(pages)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        return re.search(rb'href="(/download/[^"]+)"', response.data).group(1).decode()
+
+    def test_x_accel_redirect(self, app, client):
+        app.config["FILE_OFFLOAD"] = "x-accel"
+        page_url = self.split_page_url(client)
+        filename = page_url.rsplit("/", 1)[1]
+        session_id = filename.split("_", 1)[0]
+
+        response = client.get(page_url)
+        assert response.status_code == 200
+        assert response.data == b""
+        assert "X-Sendfile" not in response.headers
+        bucket = app.expiry_index.manifest(session_id)["bucket"]
+        assert response.headers["X-Accel-Redirect"] == f"/protected-uploads/{bucket}/{session_id}/{filename}"
+        assert filename in response.headers["Content-Disposition"]
+
+    def test_x_sendfile(self, app, client):
+        app.config["FILE_OFFLOAD"] = "x-sendfile"
+        page_url = self.split_page_url(client)
+        response = client.get(page_url)
+        assert response.status_code == 200
+        path = response.headers["X-Sendfile"]
+        assert os.path.isabs(path)
+        assert path.startswith(os.path.abspath(app.config["UPLOAD_FOLDER"]))
+
+    def test_join_is_offloaded(self, app, client):
+        app.config["FILE_OFFLOAD"] = "x-accel"
+        response = post_join(client, [make_pdf(1), make_pdf(1)])
+        assert response.status_code == 200
+        assert response.headers["X-Accel-Redirect"].startswith("/protected-uploads/")
+        assert len(output_files(app)) == 1
+
+    def test_offload_keeps_path_validation(self, app, client):
+        app.config["FILE_OFFLOAD"] = "x-accel"
+        response = client.get("/download/..%2F..%2Fconfig.py")
+        assert response.status_code in (302, 404)
+        assert "X-Accel-Redirect" not in response.headers
+        response = client.get("/download/missing.pdf")
+        assert response.status_code == 302
+        assert "X-Accel-Redirect" not in response.headers
@@ -0,0 +1,167 @@
+"""
+Tests for the process pool running request-time PDF work.
+"""
+
+import os
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.pdf_dedup import WriteStats
+from flask_app.pdf_ops import InvalidPdfError, merge_pdfs, select_pages
+from flask_app.pdf_pool import PdfPool
+from flask_app.reader_cache import ReaderCache
+from flask_app.uploads import UploadSpool
+
+
+CONTENT = b"0 0 m 100 100 l S " * 10
+
+
+def duplicate_content_pdf():
+    """Two pages with separate but identical content streams."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 5 0 R >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 6 0 R >>",
+    ] + [b"<< /Length %d >>\nstream\n%s\nendstream" % (len(CONTENT), CONTENT)] * 2
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = PdfPool(workers=1, reader_cache_bytes=1024 * 1024)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def app(app):
+    """Test application using a PDF pool."""
+    app.config["PDF_POOL_WORKERS"] = 1
+    app.pdf_pool = PdfPool(workers=1)
+    yield app
+    app.pdf_pool.shutdown()
+
+
+class TestPdfPool:
+    """Test that operations run in the pool like they do in the caller."""
+
+    def test_disabled_pool_calls_in_place(self):
+        pool = PdfPool()
+        source = BytesIO(make_pdf(1))
+        assert pool.source(source) is source
+        output = BytesIO()
+        assert pool.write(output, select_pages, source, "1") == 1
+        assert len(PdfReader(BytesIO(output.getvalue())).pages) == 1
+
+    def test_write_copies_output_back(self, pool):
+        output = BytesIO()
+        sources = [("a.pdf", pool.source(BytesIO(make_pdf(2)))), ("b.pdf", pool.source(BytesIO(make_pdf(1))))]
+        assert pool.write(output, merge_pdfs, sources) == 3
+        assert len(PdfReader(BytesIO(output.getvalue())).pages) == 3
+
+    def test_stats_come_back_from_the_worker(self, pool):
+        stats = WriteStats()
+        pool.write(BytesIO(), select_pages, BytesIO(duplicate_content_pdf()), "1-2", stats=stats)
+        assert stats.duplicates == 1
+        assert stats.deduplicated_bytes == len(CONTENT)
+
+    def test_uploads_are_passed_by_path(self, pool):
+        data = make_pdf(2)
+        spool = UploadSpool(1024 * 1024, filename="a.pdf", sniff=True)
+        spool.write(data)
+        spool.seek(0)
+        path = pool.source(spool)
+        with open(path, "rb") as spooled:
+            assert spooled.read() == data
+        # The memory map of a rolled over spool resolves to the same file
+        assert pool.source(spool.mapped()) == path
+        output = BytesIO()
+        assert pool.write(output, select_pages, path, "2") == 1
+        spool.close()
+        assert not os.path.exists(path)
+
+    def test_run_with_paths(self, pool, tmp_path):
+        source = tmp_path / "source.pdf"
+        source.write_bytes(make_pdf(3, width=150))
+        output = tmp_path / "out.pdf"
+        assert pool.run(select_pages, str(source), "3,1", str(output)) == 2
+        assert [page.mediabox.width for page in PdfReader(str(output)).pages] == [150, 150]
+
+    def test_worker_reader_cache_replaces_callers(self, pool):
+        output = BytesIO()
+        readers = ReaderCache(max_bytes=1024 * 1024)
+        data = make_pdf(2)
+        pool.write(output, select_pages, pool.source(BytesIO(data)), "2",
+                   reader_cache=readers, digest="abc")
+        # The parse happened in the pool worker, not against this cache
+        assert readers.stats()["misses"] == 0
+
+    def test_errors_are_reraised(self, pool):
+        with pytest.raises(InvalidPdfError) as excinfo:
+            pool.write(BytesIO(), merge_pdfs, [("bad.pdf", BytesIO(b"not a pdf"))])
+        assert excinfo.value.filename == "bad.pdf"
+
+
+class TestRoutesUsePool:
+    """Test the routes with PDF work offloaded to the pool."""
+
+    def test_join(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["join_captcha_text"] = "12345"
+        with app.test_request_context():
+            response = client.post(
+                url_for("main.join_pdfs"),
+                data={
+                    "captcha_answer": "12345",
+                    "pdf_files": [(BytesIO(make_pdf(2)), "a.pdf"), (BytesIO(make_pdf(1)), "b.pdf")],
+                },
+                content_type="multipart/form-data",
+            )
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.data)).pages) == 3
+
+    def test_split(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        with app.test_request_context():
+            response = client.post(
+                url_for("main.split_pdf"),
+                data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(3)), "doc.pdf")},
+                content_type="multipart/form-data",
+            )
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).count('href="/download/') == 3
+
+    def test_split_does_not_nest_a_process_pool(self, app, monkeypatch):
+        app.config["SPLIT_WORKERS"] = 4
+        calls = []
+        run = app.pdf_pool.run
+        monkeypatch.setattr(app.pdf_pool, "run", lambda fn, *args, **kwargs: calls.append(kwargs) or run(
+            fn, *args, **kwargs
+        ))
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        with app.test_request_context():
+            response = client.post(
+                url_for("main.split_pdf"),
+                data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(10)), "doc.pdf")},
+                content_type="multipart/form-data",
+            )
+        assert response.get_data(as_text=True).count('href="/download/') == 10
+        assert calls[0]["workers"] == 1
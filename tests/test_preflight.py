@@ -0,0 +1,202 @@
+"""
+Tests for the pre-flight validation of PDF inputs.
+"""
+
+import os
+import pickle
+import time
+import pytest
+from flask import get_flashed_messages, url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.jobs import JOB_FAILED
+from flask_app.preflight import PreflightError, check_sources, preflight_pdf
+
+
+def with_update(data):
+    """Append an incremental update whose xref section lists no objects."""
+    previous = int(data.rsplit(b"startxref", 1)[1].split()[0])
+    offset = len(data)
+    return data + (
+        b"xref\n0 1\n0000000000 65535 f \n"
+        b"trailer\n<< /Size 8 /Root 3 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (previous, offset)
+    )
+
+
+def check(data, filename="doc.pdf"):
+    return preflight_pdf(BytesIO(data), filename).to_dict()
+
+
+class TestPreflightPdf:
+    """Test the individual checks."""
+
+    def test_valid_document(self):
+        report = check(make_pdf(4))
+        assert report["error"] is None
+        assert report["version"] == "1.3"
+        assert report["pages"] == 4
+        assert not report["encrypted"]
+
+    def test_page_count_through_incremental_update(self):
+        report = check(with_update(make_pdf(3)))
+        assert report["error"] is None
+        assert report["pages"] == 3
+
+    @pytest.mark.parametrize("data, error", [
+        (b"", "empty file"),
+        (b"GIF89a" + b"\0" * 100, "no %PDF- header"),
+        (b"%PDF-1.4\n1 0 obj\n<< >>\nendobj\n", "no %%EOF marker"),
+        (b"%PDF-1.4\ngarbage\n%%EOF\n", "startxref not found"),
+    ])
+    def test_unrecoverable_problems(self, data, error):
+        assert check(data)["error"] == error
+
+    def test_wrong_startxref_is_only_a_warning(self):
+        data = make_pdf(2)
+        head = data.rsplit(b"startxref", 1)[0]
+        broken = head + b"startxref\n5\n%%EOF\n"
+        report = check(broken)
+        assert report["error"] is None
+        assert report["warnings"]
+        # The reader recovers by rebuilding the table
+        assert len(PdfReader(BytesIO(broken)).pages) == 2
+
+    def test_encrypted_with_empty_password(self):
+        report = check(make_pdf(2, password=""))
+        assert report["encrypted"]
+        assert report["error"] is None
+        assert report["pages"] == 2
+
+    def test_password_protected(self):
+        report = check(make_pdf(1, password="secret"))
+        assert report["encrypted"]
+        assert report["error"] == "password protected"
+
+    def test_path_source(self, tmp_path):
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(make_pdf(2))
+        assert preflight_pdf(str(path)).pages == 2
+
+    def test_stream_is_rewound(self):
+        stream = BytesIO(make_pdf(1))
+        preflight_pdf(stream)
+        assert stream.tell() == 0
+
+
+class TestCheckSources:
+    """Test checking all inputs before a merge."""
+
+    def test_reports_every_file(self):
+        sources = [
+            ("a.pdf", BytesIO(make_pdf(1))),
+            ("b.pdf", BytesIO(b"%PDF-1.4\ngarbage\n%%EOF\n")),
+            ("c.pdf", BytesIO(make_pdf(2))),
+            ("d.pdf", BytesIO(b"")),
+        ]
+        with pytest.raises(PreflightError) as error:
+            check_sources(sources)
+        reports = error.value.reports
+        assert [report["filename"] for report in reports] == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+        assert [report["error"] for report in reports] == [None, "startxref not found", None, "empty file"]
+        assert str(error.value) == "Invalid PDFs: b.pdf, d.pdf"
+        assert error.value.filename == "b.pdf"
+
+    def test_error_survives_pickling(self):
+        with pytest.raises(PreflightError) as error:
+            check_sources([("bad.pdf", BytesIO(b"garbage"))])
+        copy = pickle.loads(pickle.dumps(error.value))
+        assert str(copy) == "Invalid PDF: bad.pdf"
+        assert copy.reports == error.value.reports
+
+    def test_returns_reports(self):
+        reports = check_sources([("a.pdf", BytesIO(make_pdf(2)))])
+        assert reports[0]["pages"] == 2
+
+
+@pytest.fixture
+def app(app):
+    """Test application with a job manager on its upload folder."""
+    from flask_app.jobs import init_jobs
+    init_jobs(app)
+    yield app
+    app.job_manager.shutdown()
+
+
+def post_join(client, files, **kwargs):
+    """Submit a join request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["join_captcha_text"] = "ABCDE"
+    return client.post(
+        url_for("main.join_pdfs"),
+        data={"captcha_answer": "ABCDE", "pdf_files": files},
+        content_type="multipart/form-data",
+        **kwargs,
+    )
+
+
+def broken_files():
+    return [
+        (BytesIO(make_pdf(1)), "a.pdf"),
+        (BytesIO(make_pdf(1, password="secret")), "locked.pdf"),
+        (BytesIO(b"%PDF-1.4\ngarbage\n%%EOF\n"), "broken.pdf"),
+    ]
+
+
+class TestPreflightRoutes:
+    """Test that merges stop before parsing when an input is broken."""
+
+    def test_join_flashes_each_failing_file(self, app, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("merge started")
+        monkeypatch.setattr("flask_app.routes.merge_pdfs", fail)
+        client = app.test_client()
+        with client:
+            response = post_join(client, broken_files())
+            assert response.status_code == 302
+            assert get_flashed_messages() == [
+                "Invalid PDF: locked.pdf (password protected)",
+                "Invalid PDF: broken.pdf (startxref not found)",
+            ]
+
+    def test_join_returns_json_report(self, app):
+        response = post_join(app.test_client(), broken_files(), headers={"Accept": "application/json"})
+        assert response.status_code == 422
+        data = response.get_json()
+        assert data["error"] == "Invalid PDFs: locked.pdf, broken.pdf"
+        assert [report["error"] for report in data["files"]] == [
+            None, "password protected", "startxref not found",
+        ]
+
+    def test_split_reports_failure(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        with client:
+            response = client.post(
+                url_for("main.split_pdf"),
+                data={"captcha_answer": "12345",
+                      "pdf_file": (BytesIO(b"%PDF-1.4\ngarbage\n%%EOF\n"), "doc.pdf")},
+                content_type="multipart/form-data",
+            )
+            assert response.status_code == 302
+            assert get_flashed_messages() == ["Invalid PDF: doc.pdf (startxref not found)"]
+        buckets = [entry for entry in os.listdir(app.config["UPLOAD_FOLDER"]) if entry.isdigit()]
+        assert all(not os.listdir(os.path.join(app.config["UPLOAD_FOLDER"], bucket)) for bucket in buckets)
+
+    def test_job_status_includes_reports(self, app):
+        app.config["ASYNC_JOBS"] = True
+        client = app.test_client()
+        response = post_join(client, broken_files())
+        assert response.status_code == 202
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            data = client.get(response.headers["Location"]).get_json()
+            if data["status"] == JOB_FAILED:
+                break
+            time.sleep(0.02)
+        assert data["status"] == JOB_FAILED
+        assert data["error"] == "Invalid PDFs: locked.pdf, broken.pdf"
+        assert [report["filename"] for report in data["error_details"]] == ["a.pdf", "locked.pdf", "broken.pdf"]
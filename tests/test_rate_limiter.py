@@ -0,0 +1,325 @@
+"""
+Tests for the rate limiter and its storage backends.
+"""
+
+import sys
+import threading
+import pytest
+from flask import url_for
+from io import BytesIO
+
+from conftest import make_pdf
+from flask_app.config import TestingConfig
+from flask_app.rate_limiter import (
+    RATE_LIMITS, MemoryBackend, RateLimiter, RedisBackend, SlidingWindowCounterBackend,
+    TokenBucketBackend, create_backend, get_client_ip, page_cost, upload_cost,
+)
+
+
+def make_redis_backend():
+    """RedisBackend against an in-process fake Redis server."""
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBackend(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+
+
+@pytest.fixture(params=["memory", "token-bucket", "sliding-window-counter", "redis"])
+def limiter(request):
+    """Rate limiter on each backend implementation."""
+    if request.param == "memory":
+        return RateLimiter(MemoryBackend())
+    if request.param == "token-bucket":
+        return RateLimiter(TokenBucketBackend())
+    if request.param == "sliding-window-counter":
+        return RateLimiter(SlidingWindowCounterBackend())
+    return RateLimiter(make_redis_backend())
+
+
+class TestRateLimiterBackends:
+    """Behaviour shared by all backends."""
+
+    def test_limits_after_max_requests(self, limiter):
+        results = [limiter.is_limited("1.2.3.4", "join_pdfs", max_requests=3) for _ in range(4)]
+        assert results == [False, False, False, True]
+
+    def test_get_remaining(self, limiter):
+        limiter.is_limited("1.2.3.4", "join_pdfs", max_requests=5)
+        limiter.is_limited("1.2.3.4", "join_pdfs", max_requests=5)
+        assert limiter.get_remaining("1.2.3.4", "join_pdfs", max_requests=5) == 3
+
+    def test_cost_consumes_budget(self, limiter):
+        assert not limiter.is_limited("1.2.3.4", "split_pdf", max_requests=10, cost=7)
+        assert limiter.is_limited("1.2.3.4", "split_pdf", max_requests=10, cost=4)
+        assert limiter.get_remaining("1.2.3.4", "split_pdf", max_requests=10) == 3
+
+    @pytest.mark.parametrize("backend_class", [MemoryBackend, TokenBucketBackend, SlidingWindowCounterBackend])
+    def test_concurrent_hits_never_exceed_limit(self, backend_class):
+        limiter = RateLimiter(backend_class())
+        admitted = []
+        start = threading.Barrier(8)
+
+        def worker():
+            start.wait()
+            for _ in range(50):
+                if not limiter.is_limited("ip", "ep", max_requests=100, window_seconds=600):
+                    admitted.append(1)
+
+        # Switch threads as often as possible to interleave check and record
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(previous)
+        assert len(admitted) == 100
+
+    def test_window_expiry(self, limiter, monkeypatch):
+        import flask_app.rate_limiter as module
+        now = [1000.0]
+        monkeypatch.setattr(module.time, "time", lambda: now[0])
+        assert not limiter.is_limited("ip", "ep", max_requests=1, window_seconds=10)
+        assert limiter.is_limited("ip", "ep", max_requests=1, window_seconds=10)
+        # Two windows later even the window-counter approximation has forgotten
+        now[0] += 21
+        assert not limiter.is_limited("ip", "ep", max_requests=1, window_seconds=10)
+
+    def test_reset_scopes(self, limiter):
+        for ip in ("a", "b"):
+            for endpoint in ("join_pdfs", "split_pdf"):
+                limiter.is_limited(ip, endpoint, max_requests=1)
+
+        limiter.reset(ip="a", endpoint="join_pdfs")
+        assert limiter.get_remaining("a", "join_pdfs", max_requests=1) == 1
+        assert limiter.get_remaining("a", "split_pdf", max_requests=1) == 0
+
+        limiter.reset(ip="b")
+        assert limiter.get_remaining("b", "split_pdf", max_requests=1) == 1
+
+        limiter.reset(endpoint="split_pdf")
+        assert limiter.get_remaining("a", "split_pdf", max_requests=1) == 1
+
+        limiter.reset()
+        assert limiter.get_remaining("b", "join_pdfs", max_requests=1) == 1
+
+
+class TestCompactBackends:
+    """Constant-time backends: approximation and idle-key eviction."""
+
+    def test_token_bucket_refills_gradually(self, monkeypatch):
+        import flask_app.rate_limiter as module
+        now = [1000.0]
+        monkeypatch.setattr(module.time, "time", lambda: now[0])
+        limiter = RateLimiter(TokenBucketBackend())
+        assert not limiter.is_limited("ip", "ep", max_requests=10, window_seconds=10, cost=10)
+        assert limiter.is_limited("ip", "ep", max_requests=10, window_seconds=10)
+        now[0] += 3  # three tokens back
+        assert limiter.get_remaining("ip", "ep", max_requests=10, window_seconds=10) == 3
+
+    def test_window_counter_weights_previous_window(self, monkeypatch):
+        import flask_app.rate_limiter as module
+        now = [1000.0]
+        monkeypatch.setattr(module.time, "time", lambda: now[0])
+        limiter = RateLimiter(SlidingWindowCounterBackend())
+        for _ in range(10):
+            limiter.is_limited("ip", "ep", max_requests=10, window_seconds=10)
+        now[0] += 15  # half of the previous window still overlaps
+        assert limiter.get_remaining("ip", "ep", max_requests=10, window_seconds=10) == 5
+
+    @pytest.mark.parametrize("backend_class", [TokenBucketBackend, SlidingWindowCounterBackend])
+    def test_idle_keys_are_swept(self, backend_class, monkeypatch):
+        import flask_app.rate_limiter as module
+        now = [1000.0]
+        monkeypatch.setattr(module.time, "time", lambda: now[0])
+        backend = backend_class(sweep_interval=30)
+        for index in range(100):
+            backend.hit("ep", f"10.0.0.{index}", 5, 10)
+        assert len(backend) == 100
+
+        now[0] += 31
+        backend.hit("ep", "192.168.0.1", 5, 10)  # amortized sweep on insert
+        assert len(backend) == 1
+
+    @pytest.mark.parametrize("backend_class", [TokenBucketBackend, SlidingWindowCounterBackend])
+    def test_tracked_keys_are_capped(self, backend_class):
+        backend = backend_class(max_keys=50)
+        for index in range(500):
+            backend.hit("ep", f"10.0.{index // 256}.{index % 256}", 5, 60)
+        assert len(backend) == 50
+        # Most recently seen keys survive
+        assert backend.count("ep", "10.0.1.243", 5, 60) == 1
+
+    def test_create_backend_strategies(self):
+        assert isinstance(create_backend("memory://", strategy="token-bucket"), TokenBucketBackend)
+        assert isinstance(
+            create_backend("memory://", strategy="sliding-window-counter"), SlidingWindowCounterBackend
+        )
+        with pytest.raises(ValueError):
+            create_backend("memory://", strategy="leaky")
+
+
+class TestRedisBackend:
+    """Behaviour specific to the shared backend."""
+
+    def test_limit_is_shared_between_workers(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        workers = [RateLimiter(RedisBackend(fakeredis.FakeRedis(server=server))) for _ in range(4)]
+        results = [worker.is_limited("ip", "join_pdfs", max_requests=4) for worker in workers * 2]
+        assert results.count(False) == 4
+
+    def test_concurrent_hits_never_exceed_limit(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        admitted = []
+        lock = threading.Lock()
+
+        start = threading.Barrier(5)
+
+        def worker():
+            limiter = RateLimiter(RedisBackend(fakeredis.FakeRedis(server=server)))
+            start.wait()
+            for _ in range(10):
+                if not limiter.is_limited("ip", "ep", max_requests=15):
+                    with lock:
+                        admitted.append(1)
+
+        # Interleave the workers' check and add as much as possible
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(previous)
+        # Rejected requests never hold a slot, so exactly the limit is admitted
+        assert len(admitted) == 15
+
+
+class TestCreateBackend:
+    """Test storage URL parsing."""
+
+    def test_memory_url(self):
+        assert isinstance(create_backend("memory://"), MemoryBackend)
+
+    def test_redis_url(self):
+        pytest.importorskip("redis")
+        assert isinstance(create_backend("redis://localhost:6379/0"), RedisBackend)
+
+    def test_unknown_url(self):
+        with pytest.raises(ValueError):
+            create_backend("memcached://localhost")
+
+
+@pytest.fixture
+def app(app):
+    """Test application with rate limiting enforced."""
+    app.config["RATELIMIT_ENABLED"] = True
+    return app
+
+
+def post_split(client, pages):
+    """Submit a split request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["split_captcha_text"] = "12345"
+    return client.post(
+        url_for("main.split_pdf"),
+        data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(pages)), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+
+
+class TestCost:
+    """Test request cost weighting."""
+
+    def test_upload_cost_grows_with_size(self):
+        limit = {"max_requests": 10, "cost": {"bytes_per_unit": 1000}}
+        assert upload_cost(limit, None) == 1
+        assert upload_cost(limit, 999) == 1
+        assert upload_cost(limit, 3500) == 4
+        assert upload_cost(limit, 10 ** 9) == 10  # capped at the budget
+
+    def test_page_cost(self):
+        limit = {"max_requests": 10, "cost": {"pages_per_unit": 50}}
+        assert page_cost(limit, 49) == 0
+        assert page_cost(limit, 500) == 10
+        assert page_cost({"max_requests": 10}, 500) == 0
+
+    def test_free_tiers(self):
+        limit = {"max_requests": 10, "cost": {
+            "free_bytes": 2000, "bytes_per_unit": 1000, "free_pages": 50, "pages_per_unit": 50,
+        }}
+        assert upload_cost(limit, 1999) == 1
+        assert upload_cost(limit, 3000) == 2
+        assert page_cost(limit, 99) == 0
+        assert page_cost(limit, 100) == 1
+
+
+class TestClientIp:
+    """Clients are keyed by address, from trusted proxy hops only."""
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self, app):
+        client = app.test_client()
+        seen = []
+        app.before_request(lambda: seen.append(get_client_ip()))
+        client.get("/", headers={"X-Forwarded-For": "198.51.100.1"})
+        assert seen == ["127.0.0.1"]
+
+    def test_last_hop_of_trusted_proxy(self, monkeypatch):
+        from flask_app import create_app
+        monkeypatch.setattr(TestingConfig, "TRUSTED_PROXIES", 1)
+        app = create_app("testing")
+        seen = []
+        app.before_request(lambda: seen.append(get_client_ip()))
+        # The client sent the first value itself; the proxy appended the second
+        app.test_client().get("/", headers={"X-Forwarded-For": "198.51.100.1, 203.0.113.7"})
+        assert seen == ["203.0.113.7"]
+
+
+class TestRouteLimits:
+    """RATE_LIMITS applied to the blueprint endpoints."""
+
+    def test_download_is_limited(self, app, monkeypatch):
+        monkeypatch.setitem(RATE_LIMITS, "download_file", {"max_requests": 2, "window_seconds": 60})
+        client = app.test_client()
+        for _ in range(3):
+            response = client.get("/download/missing.pdf", follow_redirects=True)
+        assert b"Too many requests" in response.data
+
+    def test_split_is_charged_for_pages(self, app, monkeypatch):
+        monkeypatch.setitem(RATE_LIMITS, "split_pdf", {
+            "max_requests": 10, "window_seconds": 60, "cost": {"pages_per_unit": 4},
+        })
+        client = app.test_client()
+        assert post_split(client, 9).status_code == 200
+        # One unit for the request, two for nine pages
+        assert app.rate_limiter.get_remaining("127.0.0.1", "split_pdf", max_requests=10) == 7
+
+    def test_heavy_requests_exhaust_budget_sooner(self, app, monkeypatch):
+        monkeypatch.setitem(RATE_LIMITS, "split_pdf", {
+            "max_requests": 5, "window_seconds": 60, "cost": {"pages_per_unit": 2},
+        })
+        client = app.test_client()
+        assert post_split(client, 8).status_code == 200
+        response = post_split(client, 1)
+        assert response.status_code == 302
+        assert app.rate_limiter.get_remaining("127.0.0.1", "split_pdf", max_requests=5) == 0
+
+    def test_small_jobs_keep_the_default_budget(self, app):
+        client = app.test_client()
+        # Splits within the free tiers cost one unit each: ten per window
+        statuses = [post_split(client, 3).status_code for _ in range(11)]
+        assert statuses == [200] * 10 + [302]
+
+    def test_disabled_by_config(self, app, monkeypatch):
+        monkeypatch.setitem(RATE_LIMITS, "download_file", {"max_requests": 1, "window_seconds": 60})
+        app.config["RATELIMIT_ENABLED"] = False
+        client = app.test_client()
+        for _ in range(3):
+            client.get("/download/missing.pdf")
+        assert app.rate_limiter.get_remaining("127.0.0.1", "download_file", max_requests=1) == 1
@@ -0,0 +1,198 @@
+"""
+Tests for the parsed-document cache.
+"""
+
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+
+from conftest import make_pdf
+from flask_app import reader_cache
+from flask_app.pdf_ops import InvalidPdfError, MappedFile, merge_pdfs, split_pdf_pages
+from flask_app.reader_cache import ReaderCache
+from flask_app.result_cache import ResultCache, hash_stream
+
+
+def use(cache, data):
+    """Borrow the reader of a document and return its page count."""
+    with cache.reader(hash_stream(BytesIO(data)), BytesIO(data)) as reader:
+        return len(reader.pages)
+
+
+class TestReaderCache:
+    """Test reuse, eviction and expiry."""
+
+    def test_second_use_skips_parsing(self):
+        cache = ReaderCache()
+        data = make_pdf(3)
+        with cache.reader("a", BytesIO(data)) as first:
+            assert len(first.pages) == 3
+        with cache.reader("a", BytesIO(b"not read on a hit")) as second:
+            assert second is first
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_reader_is_borrowed_exclusively(self):
+        cache = ReaderCache()
+        data = make_pdf(1)
+        with cache.reader("a", BytesIO(data)) as first:
+            with cache.reader("a", BytesIO(data)) as second:
+                assert second is not first
+        assert cache.stats()["entries"] == 1
+
+    def test_size_counts_resolved_objects(self):
+        cache = ReaderCache()
+        data = make_pdf(4)
+        use(cache, data)
+        assert cache.stats()["bytes"] > len(data)
+
+    def test_evicts_least_recently_used(self):
+        small = [make_pdf(1, width=100 + n) for n in range(3)]
+        cache = ReaderCache(max_bytes=2 * len(small[0]) + 4096)
+        use(cache, small[0])
+        use(cache, small[1])
+        use(cache, small[0])
+        use(cache, small[2])
+
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] <= cache.max_bytes
+        misses = stats["misses"]
+        use(cache, small[0])
+        assert cache.stats()["misses"] == misses
+
+    def test_documents_larger_than_cache_are_not_kept(self):
+        cache = ReaderCache(max_bytes=10)
+        assert use(cache, make_pdf(2)) == 2
+        assert cache.stats()["entries"] == 0
+
+    def test_entries_expire(self):
+        cache = ReaderCache(ttl=-1)
+        data = make_pdf(1)
+        use(cache, data)
+        use(cache, data)
+        assert cache.stats()["hits"] == 0
+
+    def test_files_on_disk_are_mapped_not_copied(self, tmp_path, monkeypatch):
+        opened = []
+        monkeypatch.setattr(reader_cache, "PdfReader", lambda stream: opened.append(stream) or PdfReader(stream))
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(make_pdf(2))
+        cache = ReaderCache()
+        with cache.reader("a", str(path)) as reader:
+            assert len(reader.pages) == 2
+        with open(path, "rb") as source:
+            with cache.reader("b", source):
+                pass
+        assert [type(stream) for stream in opened] == [MappedFile, MappedFile]
+
+        # The entry keeps its map after the file is gone, until it is evicted
+        path.unlink()
+        with cache.reader("a", str(path)) as reader:
+            assert len(reader.pages) == 2
+        cache.clear()
+        assert all(stream.closed for stream in opened)
+
+    def test_documents_larger_than_cache_are_mapped(self, tmp_path, monkeypatch):
+        opened = []
+        monkeypatch.setattr(reader_cache, "PdfReader", lambda stream: opened.append(stream) or PdfReader(stream))
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(make_pdf(2))
+        with ReaderCache(max_bytes=10).reader("a", str(path)) as reader:
+            assert len(reader.pages) == 2
+        assert isinstance(opened[0], MappedFile)
+        assert opened[0].closed
+
+    def test_invalid_pdf_is_not_cached(self):
+        cache = ReaderCache()
+        with pytest.raises(PdfReadError):
+            with cache.reader("a", BytesIO(b"not a pdf")):
+                pass
+        assert cache.stats()["entries"] == 0
+
+
+class TestOperationsWithCache:
+    """Test merge and split on cached readers."""
+
+    def test_split_then_merge_reuses_reader(self, tmp_path):
+        cache = ReaderCache()
+        data = make_pdf(3)
+        digest = hash_stream(BytesIO(data))
+        split_pdf_pages(BytesIO(data), str(tmp_path), "sid", "doc", reader_cache=cache, digest=digest)
+
+        other = make_pdf(2)
+        sources = [("a.pdf", BytesIO(data)), ("b.pdf", BytesIO(other))]
+        output = BytesIO()
+        pages = merge_pdfs(sources, output, reader_cache=cache,
+                           digests=[digest, hash_stream(BytesIO(other))])
+        assert pages == 5
+        assert len(PdfReader(BytesIO(output.getvalue())).pages) == 5
+        assert cache.stats()["hits"] == 1
+
+    def test_same_document_twice_in_one_merge(self):
+        cache = ReaderCache()
+        data = make_pdf(2)
+        digest = hash_stream(BytesIO(data))
+        output = BytesIO()
+        pages = merge_pdfs([("a.pdf", BytesIO(data)), ("a.pdf", BytesIO(data))], output,
+                           reader_cache=cache, digests=[digest, digest])
+        assert pages == 4
+
+    def test_invalid_source_reports_filename(self):
+        cache = ReaderCache()
+        sources = [("a.pdf", BytesIO(make_pdf(1))), ("bad.pdf", BytesIO(b"junk"))]
+        with pytest.raises(InvalidPdfError) as error:
+            merge_pdfs(sources, BytesIO(), reader_cache=cache, digests=["a", "b"])
+        assert error.value.filename == "bad.pdf"
+
+
+@pytest.fixture
+def app(app):
+    """Test application with the result cache off, so every request parses."""
+    app.result_cache = ResultCache(max_bytes=0)
+    return app
+
+
+def test_routes_share_parsed_documents(app):
+    client = app.test_client()
+    data = make_pdf(3)
+    with client.session_transaction() as sess:
+        sess["split_captcha_text"] = "12345"
+        sess["join_captcha_text"] = "ABCDE"
+    response = client.post(
+        url_for("main.split_pdf"),
+        data={"captcha_answer": "12345", "pdf_file": (BytesIO(data), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        url_for("main.join_pdfs"),
+        data={"captcha_answer": "ABCDE",
+              "pdf_files": [(BytesIO(data), "doc.pdf"), (BytesIO(make_pdf(1)), "cover.pdf")]},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert len(PdfReader(BytesIO(response.data)).pages) == 4
+    assert app.reader_cache.stats()["hits"] == 1
+
+
+def test_spooled_uploads_are_mapped(app, monkeypatch):
+    opened = []
+    monkeypatch.setattr(reader_cache, "PdfReader", lambda stream: opened.append(stream) or PdfReader(stream))
+    app.config["UPLOAD_SPOOL_MAX_MEMORY"] = 256
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["split_captcha_text"] = "12345"
+    response = client.post(
+        url_for("main.split_pdf"),
+        data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(3)), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert [type(stream) for stream in opened] == [MappedFile]
+    # The spool file is gone; the cached reader still works from its map
+    with app.reader_cache.reader(hash_stream(BytesIO(make_pdf(3))), BytesIO(b"unused")) as reader:
+        assert len(reader.pages) == 3
@@ -0,0 +1,151 @@
+"""
+Tests for the content-hash result cache.
+"""
+
+import re
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.result_cache import (
+    CachedMerge, ResultCache, hash_stream, merge_key, split_key,
+)
+
+
+class TestResultCache:
+    """Test keys, eviction and expiry."""
+
+    def test_hash_stream_rewinds(self):
+        stream = BytesIO(b"abc" * 1000)
+        stream.seek(10)
+        digest = hash_stream(stream, chunk_size=7)
+        assert stream.tell() == 0
+        assert digest == hash_stream(BytesIO(b"abc" * 1000))
+
+    def test_keys_depend_on_order_and_parameters(self):
+        assert merge_key(["a", "b"]) != merge_key(["b", "a"])
+        assert merge_key(["ab", "c"]) != merge_key(["a", "bc"])
+        assert split_key("a", "pages", "") != split_key("a", "chunks", "2")
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_bytes=20)
+        cache.put("a", CachedMerge(b"x" * 8, 1))
+        cache.put("b", CachedMerge(b"x" * 8, 1))
+        assert cache.get("a") is not None
+        cache.put("c", CachedMerge(b"x" * 8, 1))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["bytes"] == 16
+        assert stats["evictions"] == 1
+
+    def test_rejects_results_larger_than_cache(self):
+        cache = ResultCache(max_bytes=4)
+        assert not cache.put("a", CachedMerge(b"x" * 5, 1))
+        assert cache.stats()["rejected"] == 1
+
+    def test_entries_expire(self):
+        cache = ResultCache(ttl=-1)
+        cache.put("a", CachedMerge(b"x", 1))
+        assert cache.get("a") is None
+        assert cache.stats()["bytes"] == 0
+
+    def test_stats_count_hits_and_misses(self):
+        cache = ResultCache()
+        cache.get("a")
+        cache.put("a", CachedMerge(b"x", 1))
+        cache.get("a")
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def post_join(client, documents):
+    """Submit a join request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["join_captcha_text"] = "ABCDE"
+    files = [(BytesIO(data), f"file{i}.pdf") for i, data in enumerate(documents)]
+    return client.post(
+        url_for("main.join_pdfs"),
+        data={"captcha_answer": "ABCDE", "pdf_files": files},
+        content_type="multipart/form-data",
+    )
+
+
+def post_split(client, data, filename="doc.pdf", **fields):
+    """Submit a split request with a valid CAPTCHA."""
+    with client.session_transaction() as sess:
+        sess["split_captcha_text"] = "12345"
+    return client.post(
+        url_for("main.split_pdf"),
+        data={"captcha_answer": "12345", "pdf_file": (BytesIO(data), filename), **fields},
+        content_type="multipart/form-data",
+    )
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("PDF was parsed again")
+
+
+class TestCachedRoutes:
+    """Test serving repeated merges and splits from the cache."""
+
+    def test_repeated_merge_skips_pypdf(self, app, client, monkeypatch):
+        documents = [make_pdf(2), make_pdf(1)]
+        first = post_join(client, documents)
+        assert first.status_code == 200
+
+        monkeypatch.setattr("flask_app.routes.merge_pdfs", fail)
+        second = post_join(client, documents)
+        assert second.status_code == 200
+        assert second.data == first.data
+        assert app.result_cache.stats()["hits"] == 1
+
+    def test_merge_order_is_part_of_the_key(self, app, client):
+        post_join(client, [make_pdf(2), make_pdf(1)])
+        response = post_join(client, [make_pdf(1), make_pdf(2)])
+        assert response.status_code == 200
+        assert app.result_cache.stats()["hits"] == 0
+
+    def test_cached_merge_written_to_upload_folder(self, app, client, monkeypatch):
+        app.config["JOIN_STREAM_RESPONSE"] = False
+        documents = [make_pdf(1), make_pdf(1)]
+        post_join(client, documents).close()
+
+        monkeypatch.setattr("flask_app.routes.merge_pdfs", fail)
+        response = post_join(client, documents)
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.data)).pages) == 2
+        response.close()
+
+    def test_repeated_split_uses_new_names(self, app, client, monkeypatch):
+        data = make_pdf(5)
+        post_split(client, data, split_mode="chunks", split_spec="2")
+
+        monkeypatch.setattr("flask_app.routes.split_pdf_pages", fail)
+        response = post_split(client, data, filename="copy.pdf", split_mode="chunks", split_spec="2")
+        assert response.status_code == 200
+        links = re.findall(rb'href="/download/([^"]+)"', response.data)
+        names = [link.decode() for link in links]
+        assert [name.split("_copy_")[1] for name in names] == [
+            "pages_1-2.pdf", "pages_3-4.pdf", "page_5.pdf",
+        ]
+
+        download = client.get(f"/download/{names[0]}")
+        assert len(PdfReader(BytesIO(download.data)).pages) == 2
+        download.close()
+
+    def test_split_spec_is_part_of_the_key(self, app, client):
+        data = make_pdf(4)
+        post_split(client, data, split_mode="chunks", split_spec="2")
+        post_split(client, data, split_mode="chunks", split_spec="3")
+        assert app.result_cache.stats()["hits"] == 0
+
+    def test_disabled_cache(self, app, client):
+        app.result_cache = ResultCache(max_bytes=0)
+        documents = [make_pdf(1), make_pdf(1)]
+        post_join(client, documents)
+        post_join(client, documents)
+        assert app.result_cache.stats()["entries"] == 0
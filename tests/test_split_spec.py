@@ -0,0 +1,141 @@
+"""
+Tests for split specifications and range-based splitting.
+"""
+
+import os
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.pdf_ops import split_pdf_pages
+from flask_app.split_spec import (
+    MAX_SELECTED_PAGES, SplitSpecError, chunk_ranges, outline_ranges, parse_ranges, parse_selection,
+    resolve_ranges,
+)
+
+
+class TestParseRanges:
+    """Test the explicit range list parser."""
+
+    def test_open_and_closed_ranges(self):
+        assert parse_ranges("1-3,4-10,11-", 12) == [(1, 3), (4, 10), (11, 12)]
+
+    def test_single_pages_and_leading_open_range(self):
+        assert parse_ranges(" 5 , -2 ", 6) == [(5, 5), (1, 2)]
+
+    @pytest.mark.parametrize("spec", ["", "0", "1-99", "3-1", "a-b", "1,,2", "1-2-3"])
+    def test_invalid_specs_are_rejected(self, spec):
+        with pytest.raises(SplitSpecError):
+            parse_ranges(spec, 10)
+
+    @pytest.mark.parametrize("spec", ["1-3,1-3", "5,5-5", "8-,8-10"])
+    def test_duplicate_ranges_are_rejected(self, spec):
+        with pytest.raises(SplitSpecError, match="given twice"):
+            parse_ranges(spec, 10)
+
+    def test_overlapping_ranges_are_kept(self):
+        assert parse_ranges("1-3,2-4", 10) == [(1, 3), (2, 4)]
+
+
+class TestParseSelection:
+    """Test the page selection parser used by extract."""
+
+    def test_reorder_reverse_and_repeat(self):
+        assert parse_selection("3,1-2,6-4,3", 6) == [3, 1, 2, 6, 5, 4, 3]
+
+    def test_open_ranges(self):
+        assert parse_selection("-2,5-", 6) == [1, 2, 5, 6]
+
+    @pytest.mark.parametrize("spec", ["", "0", "1-99", "a", "1,,2"])
+    def test_invalid_selections_are_rejected(self, spec):
+        with pytest.raises(SplitSpecError):
+            parse_selection(spec, 10)
+
+    def test_selection_size_is_capped(self):
+        with pytest.raises(SplitSpecError):
+            parse_selection(",".join(["1-"] * 3), MAX_SELECTED_PAGES // 2)
+
+
+class TestChunkAndOutlineRanges:
+    """Test chunked and bookmark-based splitting."""
+
+    def test_chunks_cover_document(self):
+        assert chunk_ranges("4", 10) == [(1, 4), (5, 8), (9, 10)]
+
+    @pytest.mark.parametrize("spec", ["0", "-1", "x", ""])
+    def test_invalid_chunk_size(self, spec):
+        with pytest.raises(SplitSpecError):
+            chunk_ranges(spec, 10)
+
+    def test_outline_ranges_include_front_matter(self):
+        reader = PdfReader(BytesIO(make_pdf(6, bookmarks=(1, 4))))
+        assert outline_ranges(reader, 6) == [(1, 1), (2, 4), (5, 6)]
+
+    def test_outline_without_bookmarks(self):
+        reader = PdfReader(BytesIO(make_pdf(2)))
+        with pytest.raises(SplitSpecError):
+            outline_ranges(reader, 2)
+
+    def test_unknown_mode(self):
+        with pytest.raises(SplitSpecError):
+            resolve_ranges("everything", "", None, 3)
+
+
+class TestRangeSplitting:
+    """Test writing range outputs."""
+
+    def test_ranges_produce_one_file_per_range(self, tmp_path):
+        files = split_pdf_pages(
+            BytesIO(make_pdf(5)), str(tmp_path), "sid", "doc", mode="ranges", spec="1-2,3,4-",
+        )
+        assert files == ["sid_doc_pages_1-2.pdf", "sid_doc_page_3.pdf", "sid_doc_pages_4-5.pdf"]
+        assert [len(PdfReader(str(tmp_path / name)).pages) for name in files] == [2, 1, 2]
+
+    def test_parallel_chunks_match_serial(self, tmp_path):
+        serial = split_pdf_pages(
+            BytesIO(make_pdf(12)), str(tmp_path), "a", "doc", mode="chunks", spec="3",
+        )
+        parallel = split_pdf_pages(
+            BytesIO(make_pdf(12)), str(tmp_path), "b", "doc", mode="chunks", spec="3", workers=2,
+        )
+        assert [name[2:] for name in parallel] == [name[2:] for name in serial]
+        assert len(parallel) == 4
+
+    def test_split_route_with_chunks(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={
+                "captcha_answer": "12345",
+                "pdf_file": (BytesIO(make_pdf(5)), "doc.pdf"),
+                "split_mode": "chunks",
+                "split_spec": "2",
+            },
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        outputs = [name for _, _, names in os.walk(app.config["UPLOAD_FOLDER"]) for name in names]
+        assert sorted(name.split("_doc_")[1] for name in outputs if name.endswith(".pdf")) == [
+            "page_5.pdf", "pages_1-2.pdf", "pages_3-4.pdf",
+        ]
+
+    def test_split_route_rejects_bad_spec(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={
+                "captcha_answer": "12345",
+                "pdf_file": (BytesIO(make_pdf(2)), "doc.pdf"),
+                "split_mode": "ranges",
+                "split_spec": "1-9",
+            },
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 302
+        assert [names for _, _, names in os.walk(app.config["UPLOAD_FOLDER"]) if names] == []
@@ -0,0 +1,250 @@
+"""
+Tests for the result storage backends.
+"""
+
+import os
+import re
+import time
+import zipfile
+import pytest
+from flask import url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.expiry import ExpiryIndex, init_expiry
+from flask_app.storage import (
+    LocalStorage, MemoryStorage, S3Storage, StorageError, create_storage,
+)
+
+
+@pytest.fixture
+def s3_client():
+    """boto3 client against an in-process moto S3 server."""
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="results")
+        yield client
+
+
+@pytest.fixture(params=["local", "memory", "s3"])
+def storage(request, tmp_path):
+    """Each storage backend rooted at a temporary upload folder."""
+    if request.param == "local":
+        return LocalStorage(str(tmp_path))
+    if request.param == "memory":
+        return MemoryStorage(max_bytes=1024 * 1024)
+    return S3Storage(request.getfixturevalue("s3_client"), "results", prefix="out/")
+
+
+def stage(tmp_path, name, data=b"%PDF-1.4 data"):
+    """Write a file into a staging bucket directory."""
+    directory = tmp_path / "9999999999"
+    directory.mkdir(exist_ok=True)
+    path = directory / name
+    path.write_bytes(data)
+    return str(path)
+
+
+class TestStorageBackends:
+    """Behaviour shared by all backends."""
+
+    def test_put_then_open(self, storage, tmp_path):
+        key = storage.key("9999999999", None, "a.pdf")
+        storage.put(key, stage(tmp_path, "a.pdf"), time.time() + 60)
+        with storage.open(key) as stream:
+            assert stream.read() == b"%PDF-1.4 data"
+
+    def test_delete(self, storage, tmp_path):
+        key = storage.key("9999999999", None, "a.pdf")
+        storage.put(key, stage(tmp_path, "a.pdf"), time.time() + 60)
+        storage.delete([key, storage.key("9999999999", None, "missing.pdf")])
+        with pytest.raises(FileNotFoundError):
+            storage.open(key)
+
+    def test_open_missing(self, storage):
+        with pytest.raises(FileNotFoundError):
+            storage.open(storage.key("1", None, "missing.pdf"))
+
+
+class TestMemoryStorage:
+    """Test the size cap and LRU eviction."""
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        storage = MemoryStorage(max_bytes=30)
+        expires = time.time() + 60
+        for name in ("a", "b"):
+            storage.put(name, stage(tmp_path, name, b"x" * 10), expires)
+        storage.open("a")  # a is now more recent than b
+        storage.put("c", stage(tmp_path, "c", b"x" * 15), expires)
+
+        assert storage.size == 25
+        assert storage.open("a").read() == b"x" * 10
+        with pytest.raises(FileNotFoundError):
+            storage.open("b")
+
+    def test_rejects_oversized_objects(self, tmp_path):
+        storage = MemoryStorage(max_bytes=4)
+        path = stage(tmp_path, "big", b"x" * 5)
+        with pytest.raises(StorageError):
+            storage.put("big", path, time.time() + 60)
+        assert os.path.exists(path)
+
+    def test_expired_objects_are_hidden_and_expired(self, tmp_path):
+        storage = MemoryStorage()
+        storage.put("old", stage(tmp_path, "old"), time.time() - 1)
+        with pytest.raises(FileNotFoundError):
+            storage.open("old")
+        storage.expire(time.time())
+        assert len(storage) == 0
+
+
+class TestS3Storage:
+    """Test lookups across nodes sharing one bucket."""
+
+    def test_other_node_finds_outputs(self, s3_client, tmp_path):
+        writer = ExpiryIndex(str(tmp_path / "a"), storage=S3Storage(s3_client, "results"))
+        bucket = writer.new_bucket()
+        directory = writer.output_dir(bucket, "sid")
+        for name in ("sid_doc_page_1.pdf", "sid_doc_page_2.pdf"):
+            with open(os.path.join(directory, name), "wb") as output:
+                output.write(b"%PDF")
+        writer.register(bucket, ["sid_doc_page_1.pdf", "sid_doc_page_2.pdf"], session="sid")
+        assert os.listdir(directory) == []
+
+        reader = ExpiryIndex(str(tmp_path / "b"), storage=S3Storage(s3_client, "results"))
+        assert reader.lookup("sid_doc_page_1.pdf") == "sid_doc_page_1.pdf"
+        assert reader.lookup("sid_doc_page_9.pdf") is None
+        assert sorted(name for name, _ in reader.session_files("sid")) == [
+            "sid_doc_page_1.pdf", "sid_doc_page_2.pdf",
+        ]
+
+        writer.expire_session("sid")
+        assert reader.lookup("sid_doc_page_1.pdf") is None
+
+    def test_sweep_deletes_expired_objects(self, s3_client, tmp_path):
+        index = ExpiryIndex(str(tmp_path), ttl=100, bucket_seconds=60,
+                            storage=S3Storage(s3_client, "results"))
+        bucket = index.new_bucket(now=1000)
+        with open(os.path.join(index.output_dir(bucket), "merged_x.pdf"), "wb") as output:
+            output.write(b"%PDF")
+        index.register(bucket, ["merged_x.pdf"], now=1000)
+
+        index.sweep(now=2000)
+        assert s3_client.list_objects_v2(Bucket="results").get("KeyCount") == 0
+
+    def test_create_storage_from_url(self, s3_client, tmp_path):
+        storage = create_storage("s3://results/pdfs?region_name=us-east-1", str(tmp_path))
+        assert isinstance(storage, S3Storage)
+        assert storage.bucket == "results"
+        assert storage.key("1", "sid", "sid_a.pdf") == "pdfs/sid_a.pdf"
+
+
+def test_create_storage(tmp_path):
+    assert isinstance(create_storage("file://", str(tmp_path)), LocalStorage)
+    storage = create_storage("memory://?max_size=2", str(tmp_path))
+    assert storage.max_bytes == 2 * 1024 * 1024
+    with pytest.raises(ValueError):
+        create_storage("ftp://host", str(tmp_path))
+
+
+@pytest.fixture(params=["memory://", "s3://results"])
+def app(app, request):
+    """Test application storing results outside the upload folder."""
+    from flask_app.jobs import init_jobs
+    if request.param.startswith("s3"):
+        request.getfixturevalue("s3_client")
+    app.config["RESULT_STORAGE_URL"] = request.param
+    init_expiry(app)
+    init_jobs(app)
+    yield app
+    app.job_manager.shutdown()
+
+
+class TestRoutesWithStorage:
+    """Test merge, split and downloads through a non-local backend."""
+
+    def test_split_download_and_archive(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(3)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        outputs = [name for _, _, names in os.walk(app.config["UPLOAD_FOLDER"]) for name in names]
+        assert not any(name.endswith(".pdf") for name in outputs)
+
+        page_url = re.search(rb'href="(/download/[^"]+)"', response.data).group(1).decode()
+        download = client.get(page_url)
+        assert download.status_code == 200
+        assert len(PdfReader(BytesIO(download.data)).pages) == 1
+
+        archive_url = re.search(rb'href="(/download-all/[^"]+)"', response.data).group(1).decode()
+        archive = client.get(archive_url)
+        with zipfile.ZipFile(BytesIO(archive.data)) as members:
+            assert len(members.namelist()) == 3
+
+    def test_offload_falls_back_with_a_warning(self, app, caplog):
+        app.config["FILE_OFFLOAD"] = "x-accel"
+        init_expiry(app)
+        assert "FILE_OFFLOAD=x-accel has no effect" in caplog.text
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(2)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        page_url = re.search(rb'href="(/download/[^"]+)"', response.data).group(1).decode()
+        download = client.get(page_url)
+        assert "X-Accel-Redirect" not in download.headers
+        assert len(PdfReader(BytesIO(download.data)).pages) == 1
+
+    def test_join_to_storage(self, app):
+        app.config["JOIN_STREAM_RESPONSE"] = False
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["join_captcha_text"] = "ABCDE"
+        response = client.post(
+            url_for("main.join_pdfs"),
+            data={
+                "captcha_answer": "ABCDE",
+                "pdf_files": [(BytesIO(make_pdf(1)), "a.pdf"), (BytesIO(make_pdf(2)), "b.pdf")],
+            },
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert "merged_" in response.headers["Content-Disposition"]
+        assert len(PdfReader(BytesIO(response.data)).pages) == 3
+
+    def test_async_split_registers_outputs(self, app):
+        app.config["ASYNC_JOBS"] = True
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(2)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 202
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            data = client.get(response.headers["Location"]).get_json()
+            if data["status"] == "done":
+                break
+            time.sleep(0.02)
+        assert data["status"] == "done"
+        download = client.get(data["downloads"][0])
+        assert download.status_code == 200
+        assert len(PdfReader(BytesIO(download.data)).pages) == 1
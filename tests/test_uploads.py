@@ -0,0 +1,130 @@
+"""
+Tests for upload spooling, hashing and sniffing.
+"""
+
+import pytest
+from flask import get_flashed_messages, url_for
+from io import BytesIO
+from PyPDF2 import PdfReader
+
+from conftest import make_pdf
+from flask_app.pdf_ops import MappedFile
+from flask_app.result_cache import hash_stream
+from flask_app.uploads import SNIFF_BYTES, UploadRejected, UploadSpool, parser_input
+
+
+def spool(data, max_size=1024 * 1024, sniff=True, chunk_size=64):
+    """Feed data to a spool in chunks, as the multipart parser does."""
+    stream = UploadSpool(max_size, filename="doc.pdf", sniff=sniff)
+    for start in range(0, len(data), chunk_size):
+        stream.write(data[start:start + chunk_size])
+    stream.seek(0)
+    return stream
+
+
+class TestUploadSpool:
+    """Test hashing, rollover and the PDF sniff."""
+
+    def test_digest_matches_hash_stream(self):
+        data = make_pdf(2)
+        stream = spool(data)
+        assert stream.digest == hash_stream(BytesIO(data))
+        assert stream.read() == data
+
+    def test_large_upload_is_memory_mapped(self):
+        data = make_pdf(3)
+        stream = spool(data, max_size=100)
+        mapped = stream.mapped()
+        assert isinstance(mapped, MappedFile)
+        assert len(PdfReader(mapped).pages) == 3
+        stream.close()
+        assert mapped.closed
+
+    def test_small_upload_stays_in_memory(self):
+        stream = spool(make_pdf(1))
+        assert stream.mapped() is None
+
+    def test_missing_header_is_rejected_after_first_kib(self):
+        stream = UploadSpool(1024 * 1024, filename="doc.pdf", sniff=True)
+        stream.write(b"x" * (SNIFF_BYTES - 1))
+        with pytest.raises(UploadRejected) as error:
+            stream.write(b"x" * 64)
+        assert error.value.filename == "doc.pdf"
+
+    def test_header_after_leading_bytes_is_accepted(self):
+        data = b"\n" * 100 + make_pdf(1)
+        assert spool(data).size == len(data)
+
+    def test_missing_eof_marker_is_rejected(self):
+        with pytest.raises(UploadRejected):
+            spool(make_pdf(1) + b"\n" * (2 * SNIFF_BYTES))
+
+    def test_short_garbage_is_rejected(self):
+        with pytest.raises(UploadRejected):
+            spool(b"garbage")
+
+    def test_sniff_disabled(self):
+        assert spool(b"garbage", sniff=False).digest == hash_stream(BytesIO(b"garbage"))
+
+    def test_parser_input_rewinds_memory_spool(self):
+        class Upload:
+            stream = spool(make_pdf(1))
+        Upload.stream.read(10)
+        assert parser_input(Upload).tell() == 0
+
+
+class TestUploadRoutes:
+    """Test ingestion through the join and split routes."""
+
+    def test_non_pdf_upload_stops_parsing(self, app, monkeypatch):
+        created = []
+        original = UploadSpool.__init__
+
+        def track(self, *args, **kwargs):
+            original(self, *args, **kwargs)
+            created.append(self.filename)
+        monkeypatch.setattr(UploadSpool, "__init__", track)
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["join_captcha_text"] = "ABCDE"
+        files = [
+            (BytesIO(b"MZ" + b"\0" * 4096), "fake.pdf"),
+            (BytesIO(make_pdf(1)), "b.pdf"),
+        ]
+        with client:
+            response = client.post(
+                url_for("main.join_pdfs"),
+                data={"captcha_answer": "ABCDE", "pdf_files": files},
+                content_type="multipart/form-data",
+            )
+            assert response.status_code == 302
+            assert get_flashed_messages() == ["Invalid PDF: fake.pdf"]
+        assert created == ["fake.pdf"]
+
+    def test_spooled_uploads_are_merged(self, app):
+        app.config["UPLOAD_SPOOL_MAX_MEMORY"] = 256
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["join_captcha_text"] = "ABCDE"
+        response = client.post(
+            url_for("main.join_pdfs"),
+            data={"captcha_answer": "ABCDE",
+                  "pdf_files": [(BytesIO(make_pdf(2)), "a.pdf"), (BytesIO(make_pdf(3)), "b.pdf")]},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.data)).pages) == 5
+
+    def test_spooled_upload_is_split(self, app):
+        app.config["UPLOAD_SPOOL_MAX_MEMORY"] = 256
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["split_captcha_text"] = "12345"
+        response = client.post(
+            url_for("main.split_pdf"),
+            data={"captcha_answer": "12345", "pdf_file": (BytesIO(make_pdf(3)), "doc.pdf")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert response.data.count(b'href="/download/') == 3